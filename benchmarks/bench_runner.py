@@ -0,0 +1,45 @@
+import resource
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+
+
+def get_peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(name: str, latencies: list[float], ops_per_call: int = 1, extra: dict = None) -> dict:
+    """Reduce per-call latencies (seconds) to the machine readable benchmark record."""
+    latencies_array = np.asarray(latencies, dtype=float)
+    total_seconds = float(latencies_array.sum())
+    record = {
+        "name": name,
+        "calls": len(latencies),
+        "ops": len(latencies) * ops_per_call,
+        "ops_per_sec": len(latencies) * ops_per_call / total_seconds if total_seconds > 0 else None,
+        "p50_ms": float(np.percentile(latencies_array, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies_array, 99) * 1000),
+        "mean_ms": float(latencies_array.mean() * 1000),
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+    if extra:
+        record.update(extra)
+    return record
+
+
+def measure(name: str, func: Callable[[int], object], iterations: int, warmup: int = 1, ops_per_call: int = 1, extra: dict = None) -> dict:
+    """Time func(i) for every iteration after a few warmup calls."""
+    for i in range(warmup):
+        func(i)
+
+    latencies = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - started)
+    return summarize(name, latencies, ops_per_call, extra)
@@ -0,0 +1,422 @@
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_runner import measure, summarize
+from benchmarks.synthetic_data import make_tickers, generate_news_csvs, generate_price_csvs, generate_scraped_pages
+from common.logger import configure_logging
+from common.ticker_registry import TickerRegistry
+
+NEWS_DATE_FROM = "2025-01-06"
+NEWS_DATE_TO = "2025-03-28"
+PRICE_DATE_FROM = "2024-12-02"
+PRICE_DATE_TO = "2025-05-30"
+
+
+def _setup_worker(workdir: str):
+    """Point every cache at the synthetic data, the price downloader reads data_stock_price relative to cwd."""
+    from news_downloader.news_downloader_na import NewsCache
+
+    os.chdir(workdir)
+    NewsCache.CACHE_DIR = os.path.join(workdir, "news")
+
+
+def bench_news_cache_load(workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    from news_downloader.news_downloader_na import NewsCache
+
+    tickers = list(companies)
+    cache = NewsCache()
+    return measure("news_cache.load_from_cache",
+                   lambda i: cache.load_from_cache(tickers[i % len(tickers)], NEWS_DATE_FROM, NEWS_DATE_TO),
+                   iterations)
+
+
+def bench_trading_hour(workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    from stock_price.trading_date_calculator import TradingDateCalculator
+
+    rng = np.random.default_rng(1)
+    start, end = pd.Timestamp(NEWS_DATE_FROM).value, pd.Timestamp(NEWS_DATE_TO).value
+    timestamps = pd.to_datetime(rng.integers(start, end, size=iterations + 1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return measure("trading_date_calculator.get_trading_hour",
+                   lambda i: TradingDateCalculator.get_trading_hour(timestamps[i]), iterations)
+
+
+def _random_windows(count: int, days: int = 14) -> list[tuple[str, str]]:
+    rng = np.random.default_rng(2)
+    starts = pd.bdate_range(NEWS_DATE_FROM, NEWS_DATE_TO)
+    picked = starts[rng.integers(0, len(starts), size=count)]
+    return [(start.strftime("%Y-%m-%d"), (start + pd.Timedelta(days=days)).strftime("%Y-%m-%d")) for start in picked]
+
+
+def bench_price_range(workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    from stock_price.stock_price_data_downloader import StockPriceDataDownloader
+
+    tickers = list(companies)
+    windows = _random_windows(iterations + 1)
+
+    def run(i):
+        start, end = windows[i]
+        StockPriceDataDownloader(tickers[i % len(tickers)], start, end).get_price_data_in_range(start, end)
+
+    return measure("stock_price_data_downloader.get_price_data_in_range", run, iterations)
+
+
+def bench_price_range_panel(workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    """Same lookups as price_range, served from the memory-mapped price panel."""
+    from stock_price.price_panel import PricePanel
+    from stock_price.stock_price_data_downloader import StockPriceDataDownloader
+
+    panel_path = os.path.join(workdir, "price_panel")
+    PricePanel.from_csv_folder(os.path.join(workdir, "data_stock_price")).save(panel_path)
+    price_panel = PricePanel.load(panel_path)
+    tickers = list(companies)
+    windows = _random_windows(iterations + 1)
+
+    def run(i):
+        start, end = windows[i]
+        StockPriceDataDownloader(tickers[i % len(tickers)], start, end, price_panel).get_price_data_in_range(start, end)
+
+    return measure("stock_price_data_downloader.get_price_data_in_range[panel]", run, iterations)
+
+
+def bench_backtest(workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    from stock_price.back_tester import BacktestRunner
+    from stock_price.trading_date_calculator import TradingHourStatus
+
+    ticker = next(iter(companies))
+    prices = pd.read_csv(os.path.join(workdir, "data_stock_price", f"{ticker}.csv"), index_col="Date", parse_dates=True)
+    frames = [prices.loc[start:end] for start, end in _random_windows(iterations + 1)]
+    status = TradingHourStatus(next_trading_open=datetime.datetime(2025, 1, 6, 9, 30), is_in_trading_hour=False,
+                               is_same_day_before_trading_hour=False, is_same_day_after_trading_hour=True,
+                               is_in_weekend=False, is_in_holiday=False, hours_before_open=16)
+
+    def run(i):
+        frame = frames[i]
+        BacktestRunner(frame).run(impact_weight=5, maximum_impact_days=4, minimum_impact_days=2,
+                                  position_movement="long" if i % 2 else "short",
+                                  start_trading_date=frame.index[0].date(), trading_hour_status=status)
+
+    return measure("back_tester.BacktestRunner.run", run, iterations)
+
+
+def bench_text_composer(workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    from embedding_kits.model_news_impact_analysis import NewsAnalysisDoc
+    from ui.text_composer import LLMTextComposer
+
+    rng = np.random.default_rng(3)
+    doc_sets = [[NewsAnalysisDoc(title=f"Related news {i}-{j}", pnl_ratio=float(rng.normal(0, 0.02)),
+                                 impact_days_min=int(rng.integers(1, 5)), impact_days_max=int(rng.integers(5, 10)))
+                 for j in range(5)] for i in range(iterations + 1)]
+
+    def run(i):
+        LLMTextComposer.calculate_related_news_pnl_ratio(doc_sets[i])
+        LLMTextComposer.compose_related_news_pnl_ratio_for_llm(doc_sets[i])
+
+    return measure("text_composer.related_news", run, iterations)
+
+
+def bench_text_preparation(workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    """
+    Latency versus accuracy of the token budgets on long scraped pages, with the fake embedding.
+    Accuracy is the cosine to the embedding of the whole cleaned page and the recall@1 of a query made of
+    sentences from the second half of the page, for truncation (LLM path) and chunk averaging (embedding path).
+    """
+    from config import Config
+    from llm_backends.fake_embedding import FakeEmbedding
+    from llm_backends.text_preparation import clean_boilerplate, embed_text, prepare_for_llm, token_counter
+
+    pages = generate_scraped_pages(max(iterations, 20))
+    embedding = FakeEmbedding()
+    full_vectors = np.asarray([embedding.get_text_embedding(clean_boilerplate(page)) for page in pages])
+    queries = np.asarray([embedding.get_text_embedding(" ".join(page.splitlines()[-12:-6])) for page in pages])
+
+    def accuracy(vectors: np.ndarray) -> tuple[float, float]:
+        cosine = float(np.mean(np.sum(vectors * full_vectors, axis=1)))
+        recall = float(np.mean(np.argmax(queries @ vectors.T, axis=1) == np.arange(len(pages))))
+        return round(cosine, 4), round(recall, 4)
+
+    budgets = []
+    for budget in (128, 256, 512, 1024, 2048):
+        started = time.perf_counter()
+        truncated = np.asarray([embedding.get_text_embedding(prepare_for_llm(page, max_tokens=budget)) for page in pages])
+        truncate_ms = (time.perf_counter() - started) * 1000 / len(pages)
+        started = time.perf_counter()
+        chunked = np.asarray([embed_text(embedding, page, chunk_tokens=budget, max_chunks=Config.EMBEDDING_MAX_CHUNKS) for page in pages])
+        chunk_ms = (time.perf_counter() - started) * 1000 / len(pages)
+        truncated_cosine, truncated_recall = accuracy(truncated)
+        chunked_cosine, chunked_recall = accuracy(chunked)
+        budgets.append({"tokens": budget, "truncate_ms": round(truncate_ms, 3), "truncate_cosine": truncated_cosine,
+                        "truncate_recall_at_1": truncated_recall, "chunk_ms": round(chunk_ms, 3),
+                        "chunk_cosine": chunked_cosine, "chunk_recall_at_1": chunked_recall})
+
+    page_tokens = float(np.mean([token_counter.count(page) for page in pages]))
+    return measure("text_preparation.prepare_for_llm", lambda i: prepare_for_llm(pages[i % len(pages)]), iterations,
+                   extra={"page_tokens": page_tokens, "tiktoken": token_counter.encoding is not None, "budgets": budgets})
+
+
+def bench_vector_compression(workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    """
+    Recall@10 against exact float32 search and bytes per vector of the compressed layouts, on synthetic 4096-dim
+    embeddings with a decaying spectrum like real ones. One op is one exact query, the layouts are in "compressed".
+    """
+    from embedding_kits.vector_compression import (EMBEDDING_DIMENSIONS, BinaryQuantizer, PCAReducer, ScalarQuantizer,
+                                                   TruncationReducer, search_compressed)
+
+    rng = np.random.default_rng(4)
+    doc_count, top_k = 5000, 10
+    latent_dimensions = 512
+    basis = np.linalg.qr(rng.normal(size=(EMBEDDING_DIMENSIONS, latent_dimensions)))[0].T.astype(np.float32)
+    latent = rng.normal(size=(doc_count, latent_dimensions)) / np.sqrt(np.arange(1, latent_dimensions + 1))
+    vectors = (latent.astype(np.float32) @ basis) + rng.normal(scale=0.002, size=(doc_count, EMBEDDING_DIMENSIONS)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.integers(0, doc_count, iterations)] + rng.normal(scale=0.005, size=(iterations, EMBEDDING_DIMENSIONS)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = [set(np.argsort(-(vectors @ query))[:top_k]) for query in queries]
+
+    variants = []
+    for name, reducer, quantizer, oversampling in [
+        ("scalar", None, ScalarQuantizer(), 4), ("binary", None, BinaryQuantizer(), 4), ("binary", None, BinaryQuantizer(), 10),
+        ("float32", PCAReducer.fit(vectors[:2000], 1024), None, 1), ("scalar", PCAReducer.fit(vectors[:2000], 1024), ScalarQuantizer(), 4),
+        ("float32", TruncationReducer(1024), None, 1),
+    ]:
+        stored = reducer.transform(vectors) if reducer else vectors
+        reduced_queries = reducer.transform(queries) if reducer else queries
+        codes = quantizer.fit(stored).encode(stored) if quantizer else None
+        latencies, recalls = [], []
+        for query, expected in zip(reduced_queries, exact):
+            started = time.perf_counter()
+            if quantizer:
+                top, _ = search_compressed(query, codes, quantizer, stored, top_k, oversampling)
+            else:
+                top = np.argsort(-(stored @ query))[:top_k]
+            latencies.append(time.perf_counter() - started)
+            recalls.append(len(expected.intersection(top.tolist())) / top_k)
+        dimensions = stored.shape[1]
+        variants.append({"layout": f"{reducer.name + str(dimensions) + '+' if reducer else ''}{name}", "oversampling": oversampling,
+                         "bytes_per_vector": quantizer.get_bytes_per_vector(dimensions) if quantizer else dimensions * 4,
+                         "recall_at_10": round(float(np.mean(recalls)), 4), "mean_ms": round(float(np.mean(latencies)) * 1000, 3)})
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        np.argsort(-(vectors @ query))[:top_k]
+        latencies.append(time.perf_counter() - started)
+    return summarize("vector_search.exact_float32", latencies,
+                     extra={"documents": doc_count, "bytes_per_vector": EMBEDDING_DIMENSIONS * 4, "compressed": variants})
+
+
+def bench_full_feed(workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    """Whole feed with the fake LLM and the in-memory search manager, one article is one op."""
+    from config import Config, DataFeedConfig
+    from embedding_kits.local_search_manager import LocalSearchManager
+    from feeder.news_price_data_feeder import start_data_feed
+    from llm_backends.fake_embedding import FakeEmbedding
+    from new_analyzer.news_analyzer import NewsAnalyzer
+    from news_downloader.news_downloader_na import NewsCache
+
+    Config.FEED_LLM_BACKEND = "fake"
+    DataFeedConfig.EMBEDDING_DATE_FROM = NEWS_DATE_FROM
+    DataFeedConfig.EMBEDDING_DATE_TO = NEWS_DATE_TO
+
+    article_count = sum(len(NewsCache().load_from_cache(ticker, NEWS_DATE_FROM, NEWS_DATE_TO)) for ticker in companies)
+    latencies, indexed_count = [], 0
+    for _ in range(iterations):
+        search_manager = LocalSearchManager(FakeEmbedding())
+        started = time.perf_counter()
+        asyncio.run(start_data_feed(search_manager=search_manager, news_cache=NewsCache(),
+                                    news_analyzer=NewsAnalyzer(), companies=companies))
+        latencies.append(time.perf_counter() - started)
+        indexed_count = search_manager.get_total_document_count()
+    # near duplicates are not indexed, so an op is a fed article rather than an indexed document
+    return summarize("feeder.start_data_feed[fake]", latencies, ops_per_call=max(article_count, 1),
+                     extra={"articles": article_count, "indexed_documents": indexed_count,
+                            "near_duplicate_enabled": Config.NEAR_DUPLICATE_ENABLED,
+                            "fake_llm_latency_ms": Config.FAKE_LLM_LATENCY_MS})
+
+
+def _patch_chat_pipeline(pages: list[str]):
+    """Serve scraped pages from memory and search an in-memory index, the LLM is the fake backend."""
+    from embedding_kits.local_search_manager import LocalSearchManager
+    from embedding_kits.stock_news_embedding_plugin import RelatedNewsPlugin
+    from llm_backends.fake_embedding import FakeEmbedding
+    from news_downloader.news_downloader_plugin import NewsDownloader3kPlugin
+
+    async def fetch_page(url: str) -> str:
+        await asyncio.sleep(0.02)  # a cached page fetch
+        return pages[int(url.rsplit("/", 1)[-1]) % len(pages)]
+
+    search_manager = LocalSearchManager(FakeEmbedding(dimensions=256))
+    search_manager.add_documents([{"id": f"doc_{i}", "title": page[:80], "content": page[:500], "pnl_ratio": 0.01 * i,
+                                   "impact_days_min": 1, "impact_days_max": 3} for i, page in enumerate(pages)],
+                                 [search_manager.generate_embedding(page[:500]) for page in pages])
+    NewsDownloader3kPlugin.fetch_news_from_url_wrapper = staticmethod(fetch_page)
+    RelatedNewsPlugin._get_search_manager = staticmethod(lambda: search_manager)
+
+
+def bench_chat_sessions(workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    """
+    Concurrent chat sessions pasting article urls, fake LLM with a fixed latency. One op is one answered request,
+    the throughput per session count shows how the pipelines overlap.
+    """
+    from config import Config
+
+    Config.CHAT_LLM_BACKEND = "fake"
+    Config.FAKE_LLM_LATENCY_MS = 50
+    Config.SEARCH_MODE = "vector"
+    _patch_chat_pipeline(generate_scraped_pages(32, paragraphs=8))
+    from ui.chatbot_sk import ChatbotSK
+
+    requests_per_session = max(2, min(iterations, 8))
+    throughput, latencies = {}, []
+    for sessions in (1, 4, 16):
+        chatbot = ChatbotSK(max_concurrent_requests=16)
+
+        async def session(session_id: int):
+            for request in range(requests_per_session):
+                started = time.perf_counter()
+                await chatbot.get_response_from_chat_bot(f"Analyze https://news.example.com/{session_id * 100 + request}",
+                                                         [], session_id=f"session-{session_id}")
+                latencies.append(time.perf_counter() - started)
+
+        async def run_sessions():
+            await asyncio.gather(*(session(session_id) for session_id in range(sessions)))
+
+        started = time.perf_counter()
+        asyncio.run(run_sessions())
+        throughput[sessions] = round(sessions * requests_per_session / (time.perf_counter() - started), 2)
+    return summarize("chat.sessions[fake]", latencies,
+                     extra={"requests_per_sec_by_sessions": throughput, "fake_llm_latency_ms": Config.FAKE_LLM_LATENCY_MS})
+
+
+def bench_chat_pipeline(workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    """
+    Time from url paste to answer with a fake LLM of fixed latency and a slow embedding service: the sequential
+    pipeline with the url extracted by the LLM against the speculative one.
+    """
+    from config import Config
+    from embedding_kits.stock_news_embedding_plugin import RelatedNewsPlugin
+
+    Config.CHAT_LLM_BACKEND = "fake"
+    Config.FAKE_LLM_LATENCY_MS = 100
+    Config.SEARCH_MODE = "vector"
+    _patch_chat_pipeline(generate_scraped_pages(32, paragraphs=8))
+    search_manager = RelatedNewsPlugin._get_search_manager()
+    search_similar_documents = search_manager.search_similar_documents
+
+    def slow_search(query: str, top_k: int = 5):
+        time.sleep(0.1)  # embedding round trip
+        return search_similar_documents(query, top_k)
+
+    search_manager.search_similar_documents = slow_search
+    import ui.chatbot_sk as chatbot_sk
+    regex_extract_url = chatbot_sk.extract_url
+
+    calls = max(3, min(iterations, 20))
+    latency_by_mode = {}
+    for mode in ("sequential", "speculative"):
+        Config.CHAT_SPECULATIVE_PIPELINE = mode == "speculative"
+        chatbot_sk.extract_url = regex_extract_url if mode == "speculative" else (lambda message: None)
+        chatbot = chatbot_sk.ChatbotSK()
+        latencies = []
+
+        async def run():
+            for i in range(calls):
+                started = time.perf_counter()
+                await chatbot.get_response_from_chat_bot(f"What about https://news.example.com/{i} ?", [])
+                latencies.append(time.perf_counter() - started)
+
+        asyncio.run(run())
+        latency_by_mode[mode] = latencies
+        if mode == "speculative":
+            # the same urls again, answered from the response cache
+            latencies = []
+            asyncio.run(run())
+            latency_by_mode["cached"] = latencies
+    return summarize("chat.pipeline[fake,speculative]", latency_by_mode["speculative"],
+                     extra={"sequential_p50_ms": float(np.percentile(latency_by_mode["sequential"], 50) * 1000),
+                            "cached_p50_ms": float(np.percentile(latency_by_mode["cached"], 50) * 1000),
+                            "fake_llm_latency_ms": Config.FAKE_LLM_LATENCY_MS, "search_latency_ms": 100})
+
+
+BENCHMARKS = {
+    "news_cache": bench_news_cache_load,
+    "trading_hour": bench_trading_hour,
+    "price_range": bench_price_range,
+    "price_range_panel": bench_price_range_panel,
+    "backtest": bench_backtest,
+    "text_composer": bench_text_composer,
+    "text_preparation": bench_text_preparation,
+    "vector_compression": bench_vector_compression,
+    "full_feed": bench_full_feed,
+    "chat_sessions": bench_chat_sessions,
+    "chat_pipeline": bench_chat_pipeline,
+}
+
+
+def _run_isolated(name: str, workdir: str, companies: TickerRegistry, iterations: int) -> dict:
+    """
+    Entry point of the benchmark subprocess, one process per benchmark keeps peak RSS per benchmark.
+    A benchmark whose optional dependency is missing is reported as skipped, the others still run.
+    """
+    _setup_worker(workdir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return BENCHMARKS[name](workdir, companies, iterations)
+    except ImportError as e:
+        return {"name": name, "skipped": f"{type(e).__name__}: {e}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis hot paths on synthetic data.")
+    parser.add_argument("--tickers", type=int, default=8, help="number of synthetic tickers")
+    parser.add_argument("--articles", type=int, default=50, help="articles per ticker")
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per micro benchmark")
+    parser.add_argument("--feed-iterations", type=int, default=1, help="full feed runs")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), help="run a subset of the benchmarks")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON report")
+    args = parser.parse_args()
+
+    companies = make_tickers(args.tickers)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="stock-news-bench-") as workdir:
+        generate_news_csvs(os.path.join(workdir, "news"), companies, args.articles, NEWS_DATE_FROM, NEWS_DATE_TO)
+        generate_price_csvs(os.path.join(workdir, "data_stock_price"), companies, PRICE_DATE_FROM, PRICE_DATE_TO)
+
+        context = multiprocessing.get_context("spawn")
+        for name in args.only or BENCHMARKS:
+            iterations = args.feed_iterations if name == "full_feed" else args.iterations
+            with context.Pool(1) as pool:
+                record = pool.apply(_run_isolated, (name, workdir, companies, iterations))
+            print(json.dumps(record))
+            results.append(record)
+
+    report = {
+        "meta": {
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tickers": args.tickers,
+            "articles_per_ticker": args.articles,
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Benchmark report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from common.ticker_registry import TickerInfo, TickerRegistry
+
+HEADLINE_TEMPLATES = [
+    "{name} beats quarterly earnings estimates as revenue climbs",
+    "{name} shares slide after guidance cut",
+    "Analysts upgrade {name} on strong demand outlook",
+    "{name} announces new product line and share buyback",
+    "Regulators open probe into {name} business practices",
+    "{name} misses revenue expectations amid weak sales",
+    "Level Financial Advisors purchases 688 shares of {name}",
+]
+
+
+def make_tickers(ticker_count: int) -> TickerRegistry:
+    """Synthetic ticker registry."""
+    sectors = ["Technology", "Consumer Discretionary", "Communication Services", "Health Care", "Financials"]
+    return TickerRegistry(TickerInfo(ticker=f"SYN{i:04d}", name=f"Synthetic Company {i}", sector=sectors[i % len(sectors)])
+                          for i in range(ticker_count))
+
+
+def generate_news_csvs(folder: str, companies: TickerRegistry, articles_per_ticker: int, date_from: str, date_to: str, seed: int = 0) -> None:
+    """Write one NewsCache compatible csv per ticker."""
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    start, end = pd.Timestamp(date_from).value, pd.Timestamp(date_to).value
+
+    for ticker, info in companies.items():
+        published_at = pd.to_datetime(np.sort(rng.integers(start, end, size=articles_per_ticker)))
+        titles = [HEADLINE_TEMPLATES[i].format(name=info.name)
+                  for i in rng.integers(0, len(HEADLINE_TEMPLATES), size=articles_per_ticker)]
+        df = pd.DataFrame({
+            "source": rng.choice(["Reuters", "Bloomberg", "Yahoo Entertainment", "Biztoc.com"], size=articles_per_ticker),
+            "author": "Synthetic Author",
+            "title": [f"{title} #{i}" for i, title in enumerate(titles)],
+            "description": titles,
+            "url": [f"https://example.com/{ticker.lower()}/{i}" for i in range(articles_per_ticker)],
+            "published_at": published_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "content": [f"{title}. {info.name} ({ticker}) said on the call that the outlook for the {info.sector} "
+                        f"sector remains mixed while investors weigh margins and demand." for title in titles],
+        })
+        df["key"] = df["title"].str[:25]
+        df.to_csv(os.path.join(folder, f"{ticker}.csv"), index=False)
+
+
+def generate_price_csvs(folder: str, companies: TickerRegistry, date_from: str, date_to: str, seed: int = 0) -> None:
+    """Write one OHLCV csv per ticker in the StockPriceDataDownloader cache format (business days, random walk)."""
+    from stock_price.corporate_actions import get_price_cache_format
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(date_from, date_to)
+
+    for ticker in companies:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, size=len(dates))))
+        open_ = close * np.exp(rng.normal(0, 0.005, size=len(dates)))
+        high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, size=len(dates)))
+        low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, size=len(dates)))
+        pd.DataFrame({
+            "Date": dates.strftime("%Y-%m-%d"),
+            "open": open_, "high": high, "low": low, "close": close,
+            "volume": rng.integers(1_000_000, 50_000_000, size=len(dates)),
+            "adj_close": close,
+        }).to_csv(os.path.join(folder, f"{ticker}.csv"), index=False)
+    get_price_cache_format(folder).mark_raw(list(companies))
+
+
+BOILERPLATE_LINES = ["Advertisement", "Subscribe now for unlimited access", "We use cookies to improve your experience",
+                     "Share this article", "Read more: markets wrap", "All rights reserved."]
+
+
+def generate_scraped_pages(page_count: int, paragraphs: int = 40, seed: int = 0) -> list[str]:
+    """Long newspaper3k-like pages: boilerplate lines between paragraphs, each page has its own topic words."""
+    rng = np.random.default_rng(seed)
+    common_words = [f"word{i}" for i in range(2000)]
+    pages = []
+    for page in range(page_count):
+        topic_words = [f"topic{page}x{i}" for i in range(30)]
+        lines = []
+        for paragraph in range(paragraphs):
+            words = list(rng.choice(common_words, size=60)) + list(rng.choice(topic_words, size=6))
+            rng.shuffle(words)
+            lines.append(" ".join(words) + ".")
+            if paragraph % 3 == 0:
+                lines.append(BOILERPLATE_LINES[int(rng.integers(0, len(BOILERPLATE_LINES)))])
+        pages.append("\n".join(lines))
+    return pages
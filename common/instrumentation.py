@@ -0,0 +1,241 @@
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from config import Config
+
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed pipeline stage, exported in an OpenTelemetry-like JSON shape."""
+
+    def __init__(self, instrumentation: "Instrumentation", name: str, attributes: dict):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.attributes = attributes
+        self.parent: Optional[Span] = _current_span.get()
+        self.trace_id = self.parent.trace_id if self.parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.status = "OK"
+        self.start_ns = 0
+        self.end_ns = 0
+        self._token = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.status = "ERROR"
+            self.attributes["error"] = repr(exc)
+        self.instrumentation.finish_span(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+
+class Instrumentation:
+    """
+    Spans, latency histograms and counters for the analysis pipeline.
+    When disabled every call returns immediately, span() hands out a shared no-op object.
+    """
+
+    def __init__(self, enabled: bool = False, export_path: str = None, flush_every: int = 200):
+        self.enabled = enabled
+        self.export_path = export_path
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._pending_spans: list[dict] = []
+        self.histograms: dict[str, Histogram] = defaultdict(Histogram)
+        self.counters: dict[tuple, float] = defaultdict(float)
+        self._server: Optional[ThreadingHTTPServer] = None
+        atexit.register(self.flush)
+
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def traced(self, name: str = None):
+        """Decorator wrapping a sync or async function in a span."""
+        def decorator(func):
+            span_name = name or func.__qualname__
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def finish_span(self, span: Span) -> None:
+        with self._lock:
+            self.histograms[span.name].observe((span.end_ns - span.start_ns) / 1e6)
+            if self.export_path:
+                self._pending_spans.append(span.to_dict())
+                if len(self._pending_spans) >= self.flush_every:
+                    self._flush_locked()
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def record_cache(self, cache_name: str, hit: bool) -> None:
+        self.increment("cache_requests_total", cache=cache_name, result="hit" if hit else "miss")
+
+    def record_llm_usage(self, stage: str, response) -> None:
+        """Count prompt / completion tokens reported by the chat completion service."""
+        if not self.enabled or response is None:
+            return
+        usage = (getattr(response, "metadata", None) or {}).get("usage")
+        prompt_tokens = self._read_usage(usage, "prompt_tokens", "prompt_eval_count")
+        completion_tokens = self._read_usage(usage, "completion_tokens", "eval_count")
+        self.increment("llm_calls_total", stage=stage)
+        self.increment("llm_prompt_tokens_total", prompt_tokens, stage=stage)
+        self.increment("llm_completion_tokens_total", completion_tokens, stage=stage)
+        span = _current_span.get()
+        if span is not None:
+            span.set_attribute("llm.prompt_tokens", prompt_tokens)
+            span.set_attribute("llm.completion_tokens", completion_tokens)
+
+    @staticmethod
+    def _read_usage(usage, *keys) -> int:
+        for key in keys:
+            value = usage.get(key) if isinstance(usage, dict) else getattr(usage, key, None)
+            if value is not None:
+                return int(value)
+        return 0
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending_spans or not self.export_path:
+            return
+        os.makedirs(os.path.dirname(self.export_path) or ".", exist_ok=True)
+        with open(self.export_path, "a", encoding="utf-8") as file:
+            for span in self._pending_spans:
+                file.write(json.dumps(span, default=str) + "\n")
+        self._pending_spans.clear()
+
+    def render_metrics(self) -> str:
+        """Prometheus text exposition of the histograms and counters."""
+        lines = ["# TYPE stage_latency_ms histogram"]
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f'stage_latency_ms_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'stage_latency_ms_bucket{{stage="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'stage_latency_ms_sum{{stage="{name}"}} {histogram.sum}')
+                lines.append(f'stage_latency_ms_count{{stage="{name}"}} {histogram.count}')
+            family = None
+            for (name, labels), value in sorted(self.counters.items()):
+                if name != family:
+                    lines.append(f"# TYPE {name} counter")
+                    family = name
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f"{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start_metrics_server(self, port: int = Config.METRICS_PORT, host: str = Config.METRICS_HOST) -> None:
+        """Serve GET /metrics from a daemon thread, on localhost unless METRICS_HOST opens it to the scraper."""
+        if not self.enabled or not port or self._server is not None:
+            return
+        instrumentation = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = instrumentation.render_metrics().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"Metrics served at http://{host}:{port}/metrics")
+
+
+instrumentation = Instrumentation(enabled=Config.TRACING_ENABLED, export_path=Config.TRACING_EXPORT_PATH)
@@ -0,0 +1,97 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+
+from config import Config
+
+_configure_lock = threading.Lock()
+_listener = None
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of DEBUG records so hot loops can log at debug level cheaply."""
+
+    def __init__(self, debug_sample_rate: float):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.debug_sample_rate >= 1:
+            return True
+        return random.random() < self.debug_sample_rate
+
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record, either JSON or key=value text, with the fields passed as extra={"fields": {...}}."""
+
+    def __init__(self, output_format: str = "text"):
+        super().__init__()
+        self.output_format = output_format
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        if self.output_format == "json":
+            payload = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                       "message": record.getMessage(), **fields}
+            if record.exc_info:
+                payload["exception"] = self.formatException(record.exc_info)
+            return json.dumps(payload, default=str)
+
+        line = f"{self.formatTime(record)} {record.levelname} {record.name}: {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def parse_module_levels(spec: str) -> dict[str, str]:
+    """Parse "stock_price.back_tester=WARNING,feeder=DEBUG" into a dict."""
+    levels = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            module, level = item.split("=", 1)
+            levels[module.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level: str = Config.LOG_LEVEL, module_levels: str = Config.LOG_MODULE_LEVELS,
+                      output_format: str = Config.LOG_FORMAT, debug_sample_rate: float = Config.LOG_DEBUG_SAMPLE_RATE) -> None:
+    """
+    Route every record through a queue to a background thread writing to stderr,
+    so callers never wait on terminal I/O. Safe to call more than once.
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(StructuredFormatter(output_format))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(debug_sample_rate))
+
+        root = logging.getLogger()
+        root.setLevel(level.upper())
+        root.addHandler(queue_handler)
+        for module, module_level in parse_module_levels(module_levels).items():
+            logging.getLogger(module).setLevel(module_level)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Module logger, use lazy %-style arguments: logger.debug("price %s", price).
+    Importing a module configures nothing, entry points (__main__ blocks, the UI, feed workers) call configure_logging().
+    """
+    return logging.getLogger(name)
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Hashable
+
+from common.instrumentation import instrumentation
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key so only one of them does the work.
+
+    Callers arriving while a call for the same key is in flight wait for its result instead of starting their own.
+    Nothing is cached once the call finishes. Async calls are coalesced per event loop, their futures are bound to it.
+    """
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._async_calls: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[Hashable, _AsyncCall]]" = \
+            weakref.WeakKeyDictionary()
+        self._sync_calls: dict[Hashable, "_SyncCall"] = {}
+        self._sync_lock = threading.Lock()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Await func() once for all concurrent callers of the same key, it is cancelled when every caller is."""
+        calls = self._async_calls.setdefault(asyncio.get_running_loop(), {})
+        call = calls.get(key)
+        instrumentation.record_cache(f"single_flight.{self.name}", call is not None)
+        if call is None:
+            call = _AsyncCall(asyncio.ensure_future(func()))
+            calls[key] = call
+            call.future.add_done_callback(lambda _: calls.pop(key, None))
+
+        call.waiters += 1
+        try:
+            # shield: one caller being cancelled must not cancel the call the others wait for
+            return await asyncio.shield(call.future)
+        except asyncio.CancelledError:
+            if call.waiters == 1:
+                call.future.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def do_sync(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """Thread safe variant of do() for blocking calls."""
+        with self._sync_lock:
+            call = self._sync_calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _SyncCall()
+                self._sync_calls[key] = call
+
+        instrumentation.record_cache(f"single_flight.{self.name}", not is_leader)
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._sync_lock:
+                self._sync_calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+
+class _SyncCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _AsyncCall:
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.waiters = 0
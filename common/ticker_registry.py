@@ -0,0 +1,108 @@
+import csv
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+
+from config import Config
+
+NEWSAPI_QUERY_MAX_LENGTH = 500
+
+
+@dataclass(frozen=True)
+class TickerInfo:
+    ticker: str
+    name: str
+    sector: str = ""
+    industry: str = ""
+    exchange: str = ""
+    aliases: tuple = ()
+    active: bool = True
+
+    def get_name_variants(self) -> list[str]:
+        """Company name first, then the aliases, without duplicates."""
+        variants = []
+        for variant in (self.name, *self.aliases):
+            if variant and variant not in variants:
+                variants.append(variant)
+        return variants
+
+
+class TickerRegistry:
+    """
+    The tradable universe: O(1) lookups by ticker or by any name / alias, iteration over active tickers only
+    and stable sharding so parallel workers split the universe without coordination.
+    """
+
+    def __init__(self, infos: Iterable[TickerInfo]):
+        self._by_ticker = {}
+        self._by_alias = {}
+        for info in infos:
+            self._by_ticker[info.ticker] = info
+            for variant in (info.ticker, *info.get_name_variants()):
+                self._by_alias.setdefault(variant.lower(), info)
+
+    @classmethod
+    def from_csv(cls, path: str = Config.TICKER_REGISTRY_PATH) -> "TickerRegistry":
+        """Columns: ticker, name, sector, industry, exchange, aliases ("|" separated), active."""
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls(TickerInfo(
+                ticker=row["ticker"].strip().upper(),
+                name=row["name"].strip(),
+                sector=row.get("sector", "").strip(),
+                industry=row.get("industry", "").strip(),
+                exchange=row.get("exchange", "").strip(),
+                aliases=tuple(alias.strip() for alias in (row.get("aliases") or "").split("|") if alias.strip()),
+                active=(row.get("active") or "true").strip().lower() in ("true", "1", "yes"),
+            ) for row in csv.DictReader(f))
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self._by_ticker
+
+    def __getitem__(self, ticker: str) -> TickerInfo:
+        return self._by_ticker[ticker]
+
+    def __iter__(self) -> Iterator[str]:
+        return (ticker for ticker, info in self._by_ticker.items() if info.active)
+
+    def __len__(self) -> int:
+        return sum(1 for info in self._by_ticker.values() if info.active)
+
+    def get(self, ticker: str) -> Optional[TickerInfo]:
+        return self._by_ticker.get(ticker)
+
+    def items(self) -> Iterator[tuple[str, TickerInfo]]:
+        """(ticker, info) of the active tickers, in file order."""
+        return ((ticker, info) for ticker, info in self._by_ticker.items() if info.active)
+
+    def resolve(self, name_or_alias: str) -> Optional[TickerInfo]:
+        """Ticker info for a ticker symbol, company name or alias, case-insensitive."""
+        return self._by_alias.get(name_or_alias.strip().lower())
+
+    @staticmethod
+    def get_shard(ticker: str, shard_count: int) -> int:
+        """Stable across processes and runs, unlike hash()."""
+        return zlib.crc32(ticker.encode("utf-8")) % shard_count
+
+    def shard(self, shard_index: int, shard_count: int) -> "TickerRegistry":
+        """Active tickers of one shard, every ticker belongs to exactly one of the shard_count shards."""
+        if shard_count <= 1:
+            return self
+        return TickerRegistry(info for _, info in self.items() if self.get_shard(info.ticker, shard_count) == shard_index)
+
+    def get_news_query(self, ticker: str) -> str:
+        """NewsAPI q parameter: the quoted name variants joined with OR, within the 500 character limit."""
+        query = ""
+        for variant in self._by_ticker[ticker].get_name_variants():
+            term = f'"{variant}"'
+            candidate = f"{query} OR {term}" if query else term
+            if len(candidate) > NEWSAPI_QUERY_MAX_LENGTH:
+                break
+            query = candidate
+        return query
+
+
+@lru_cache(maxsize=1)
+def get_ticker_registry() -> TickerRegistry:
+    """Registry loaded once per process from TICKER_REGISTRY_PATH."""
+    return TickerRegistry.from_csv(Config.TICKER_REGISTRY_PATH)
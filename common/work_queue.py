@@ -0,0 +1,159 @@
+import contextlib
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from config import Config
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+@dataclass
+class WorkUnit:
+    id: int
+    key: str
+    payload: dict
+    attempts: int
+    lease_owner: str
+
+
+class SQLiteWorkQueue:
+    """
+    Durable at-least-once work queue in a SQLite file, shared by any number of worker processes.
+
+    A worker leases a unit for visibility_timeout seconds and acks it when done. A unit whose lease expires
+    (crashed or stuck worker) becomes visible again, and failed units are retried with exponential backoff
+    until max_attempts. Units are keyed, so enqueueing the same key twice is a no-op.
+    The file must be on storage every worker can lock, i.e. one host or a filesystem with working POSIX locks.
+    """
+
+    def __init__(self, db_path: str = Config.WORK_QUEUE_DB, queue_name: str = "feed",
+                 visibility_timeout: float = Config.WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS,
+                 max_attempts: int = Config.WORK_QUEUE_MAX_ATTEMPTS,
+                 retry_delay: float = Config.WORK_QUEUE_RETRY_DELAY_SECONDS):
+        self.db_path = db_path
+        self.queue_name = queue_name
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        # autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS work_units ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, queue TEXT NOT NULL, unit_key TEXT NOT NULL, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL, "
+            "lease_owner TEXT, lease_expires_at REAL, last_error TEXT, updated_at REAL NOT NULL, "
+            "UNIQUE (queue, unit_key))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_work_units_status ON work_units(queue, status, available_at)")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Write transaction taking the database lock up front, so two workers never lease the same unit."""
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def enqueue(self, units: Iterable[tuple[str, dict]]) -> int:
+        """Add (key, payload) units, returns how many were new."""
+        now = time.time()
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO work_units (queue, unit_key, payload, status, available_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(self.queue_name, key, json.dumps(payload), STATUS_PENDING, now, now) for key, payload in units])
+            return connection.total_changes - before
+
+    def lease(self, worker_id: str) -> Optional[WorkUnit]:
+        """Take the oldest visible unit, None when nothing is available right now."""
+        now = time.time()
+        with self._transaction() as connection:
+            # expired leases that used up their attempts are given up on
+            connection.execute(
+                "UPDATE work_units SET status = ?, last_error = COALESCE(last_error, 'lease expired'), updated_at = ? "
+                "WHERE queue = ? AND status = ? AND lease_expires_at <= ? AND attempts >= ?",
+                (STATUS_FAILED, now, self.queue_name, STATUS_LEASED, now, self.max_attempts))
+            row = connection.execute(
+                "SELECT id, unit_key, payload, attempts FROM work_units "
+                "WHERE queue = ? AND ((status = ? AND available_at <= ?) OR (status = ? AND lease_expires_at <= ?)) "
+                "ORDER BY available_at, id LIMIT 1",
+                (self.queue_name, STATUS_PENDING, now, STATUS_LEASED, now)).fetchone()
+            if row is None:
+                return None
+            unit_id, key, payload, attempts = row
+            connection.execute(
+                "UPDATE work_units SET status = ?, attempts = ?, lease_owner = ?, lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (STATUS_LEASED, attempts + 1, worker_id, now + self.visibility_timeout, now, unit_id))
+        return WorkUnit(unit_id, key, json.loads(payload), attempts + 1, worker_id)
+
+    def extend_lease(self, unit: WorkUnit) -> bool:
+        """Heartbeat of a long running unit, False when the lease was lost to another worker."""
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE work_units SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (now + self.visibility_timeout, now, unit.id, STATUS_LEASED, unit.lease_owner))
+            return cursor.rowcount == 1
+
+    def ack(self, unit: WorkUnit) -> bool:
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE work_units SET status = ?, lease_owner = NULL, lease_expires_at = NULL, last_error = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (STATUS_DONE, now, unit.id, STATUS_LEASED, unit.lease_owner))
+            return cursor.rowcount == 1
+
+    def fail(self, unit: WorkUnit, error: str) -> None:
+        """Schedule a retry with exponential backoff, or mark the unit failed after max_attempts."""
+        now = time.time()
+        retry = unit.attempts < self.max_attempts
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE work_units SET status = ?, available_at = ?, lease_owner = NULL, lease_expires_at = NULL, "
+                "last_error = ?, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (STATUS_PENDING if retry else STATUS_FAILED, now + self.retry_delay * 2 ** (unit.attempts - 1),
+                 error[-2000:], now, unit.id, STATUS_LEASED, unit.lease_owner))
+
+    def requeue_failed(self) -> int:
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE work_units SET status = ?, attempts = 0, available_at = ?, updated_at = ? WHERE queue = ? AND status = ?",
+                (STATUS_PENDING, now, now, self.queue_name, STATUS_FAILED))
+            return cursor.rowcount
+
+    def get_stats(self) -> dict[str, int]:
+        stats = {STATUS_PENDING: 0, STATUS_LEASED: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        stats.update(self.connection.execute(
+            "SELECT status, COUNT(*) FROM work_units WHERE queue = ? GROUP BY status", (self.queue_name,)))
+        return stats
+
+    def is_drained(self) -> bool:
+        """No unit is waiting or in progress."""
+        stats = self.get_stats()
+        return stats[STATUS_PENDING] == 0 and stats[STATUS_LEASED] == 0
+
+    def get_failures(self, limit: int = 20) -> list[tuple[str, int, str]]:
+        return self.connection.execute(
+            "SELECT unit_key, attempts, last_error FROM work_units WHERE queue = ? AND status = ? ORDER BY updated_at DESC LIMIT ?",
+            (self.queue_name, STATUS_FAILED, limit)).fetchall()
+
+    def close(self):
+        self.connection.close()
@@ -6,17 +6,128 @@ dotenv.load_dotenv()
 class Config:
     AZURE_SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
     AZURE_SEARCH_KEY = os.getenv("AZURE_SEARCH_KEY")
-    AZURE_SEARCH_INDEX = "stock-news-index-dev"
+    AZURE_SEARCH_INDEX = "stock-news-index-dev"  # alias of the index versions
+    # index versions and aliases: "search" keeps them in INDEX_REGISTRY_INDEX of the search service, shared by every
+    # host, "sqlite" in INDEX_REGISTRY_DB for a single host (imported into the search registry when it is created)
+    INDEX_REGISTRY_BACKEND = os.getenv("INDEX_REGISTRY_BACKEND", "search")
+    INDEX_REGISTRY_INDEX = os.getenv("INDEX_REGISTRY_INDEX", "index-registry")
+    INDEX_REGISTRY_DB = os.getenv("INDEX_REGISTRY_DB", "data_index_registry/index_versions.sqlite")
+    INDEX_MIGRATION_BATCH_SIZE = int(os.getenv("INDEX_MIGRATION_BATCH_SIZE", "64"))
     OLLAMA_MODEL_EMBEDDING = os.getenv("OLLAMA_MODEL_EMBEDDING", "mistral")
+    # Vector storage: compression "none", "scalar" (int8) or "binary", top k * oversampling candidates are rescored
+    # with full precision. Reduction "none", "pca" (fit with python -m embedding_kits.vector_compression) or
+    # "truncate" (Matryoshka models only) to VECTOR_DIMENSIONS. Changing the dimensions needs a new index.
+    VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none")
+    VECTOR_OVERSAMPLING = float(os.getenv("VECTOR_OVERSAMPLING", "4"))
+    VECTOR_REDUCTION = os.getenv("VECTOR_REDUCTION", "none")
+    VECTOR_DIMENSIONS = int(os.getenv("VECTOR_DIMENSIONS", "1024"))
+    VECTOR_PCA_PATH = os.getenv("VECTOR_PCA_PATH", "data_vector_reduction/pca.npz")
+
+    # LLM backends: "ollama", "azure_openai" or "fake"
+    CHAT_LLM_BACKEND = os.getenv("CHAT_LLM_BACKEND", "azure_openai")
+    CHAT_LLM_MODEL = os.getenv("CHAT_LLM_MODEL", "llama3.2")
+    FEED_LLM_BACKEND = os.getenv("FEED_LLM_BACKEND", "ollama")
+    FEED_LLM_MODEL = os.getenv("FEED_LLM_MODEL", "llama3.2")
+    FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+    # Chat UI sessions: pipelines running at once (the others queue), sessions kept and their idle expiry
+    CHAT_MAX_CONCURRENT_REQUESTS = int(os.getenv("CHAT_MAX_CONCURRENT_REQUESTS", "8"))
+    CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+    CHAT_SESSION_TTL_SECONDS = float(os.getenv("CHAT_SESSION_TTL_SECONDS", "3600"))
+    # content check and pre-analysis run concurrently, related news are searched with the page text meanwhile
+    CHAT_SPECULATIVE_PIPELINE = os.getenv("CHAT_SPECULATIVE_PIPELINE", "true").lower() == "true"
+    # the page text results are only used when the summary search takes longer (or fails)
+    CHAT_SUMMARY_SEARCH_TIMEOUT_SECONDS = float(os.getenv("CHAT_SUMMARY_SEARCH_TIMEOUT_SECONDS", "2"))
+    # answers of analyzed urls, keyed by the normalized url and the hash of the fetched page
+    CHAT_RESPONSE_CACHE_SIZE = int(os.getenv("CHAT_RESPONSE_CACHE_SIZE", "256"))
+    CHAT_RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("CHAT_RESPONSE_CACHE_TTL_SECONDS", "3600"))
+
+    # Article text budgets, scraped pages are cleaned and truncated per chat model and chunked for embeddings
+    TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+    LLM_TOKEN_BUDGETS = os.getenv("LLM_TOKEN_BUDGETS", "llama3.2=3000,default=6000")
+    EMBEDDING_CHUNK_TOKENS = int(os.getenv("EMBEDDING_CHUNK_TOKENS", "512"))
+    EMBEDDING_CHUNK_OVERLAP_TOKENS = int(os.getenv("EMBEDDING_CHUNK_OVERLAP_TOKENS", "64"))
+    EMBEDDING_MAX_CHUNKS = int(os.getenv("EMBEDDING_MAX_CHUNKS", "8"))
 
     NEWSAPI_BASE_URL = os.getenv("NEWSAPI_BASE_URL")
     NEWSAPI_API_KEY = os.getenv("NEWSAPI_API_KEY")
     NEWSAPI_CACHE_DIR = os.getenv("NEWSAPI_CACHE_DIR")
 
+    # Article scraping
+    NEWS_PAGE_CACHE_DIR = os.getenv("NEWS_PAGE_CACHE_DIR", "data_news_pages")
+    NEWS_DOMAIN_SUPPORT_TTL_HOURS = float(os.getenv("NEWS_DOMAIN_SUPPORT_TTL_HOURS", "24"))
+    NEWS_DOMAIN_MAX_FAILURES = int(os.getenv("NEWS_DOMAIN_MAX_FAILURES", "3"))
+    NEWS_HTTP_MAX_CONNECTIONS = int(os.getenv("NEWS_HTTP_MAX_CONNECTIONS", "20"))
+    NEWS_HTTP_MAX_PER_DOMAIN = int(os.getenv("NEWS_HTTP_MAX_PER_DOMAIN", "4"))
+    NEWS_HTTP_TIMEOUT_SECONDS = float(os.getenv("NEWS_HTTP_TIMEOUT_SECONDS", "15"))
+    NEWS_EXTRACT_WORKERS = int(os.getenv("NEWS_EXTRACT_WORKERS", "4"))
+
     ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
     ALPHA_VANTAGE_LIMIT = os.getenv("ALPHA_VANTAGE_LIMIT")
 
-    BROKER_STARTING_CASH = int(os.getenv("BROKER_STARTING_CASH"))
+    # Precomputed related news
+    RELATED_NEWS_AGGREGATE_DB = os.getenv("RELATED_NEWS_AGGREGATE_DB", "data_related_news/aggregates.sqlite")
+    RELATED_NEWS_TOP_K = int(os.getenv("RELATED_NEWS_TOP_K", "5"))
+    # Index snapshots (Parquet fields + float32 vector blobs) for bootstrapping environments without a refeed
+    SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "data_index_snapshot")
+    SNAPSHOT_PART_SIZE = int(os.getenv("SNAPSHOT_PART_SIZE", "1000"))
+    SNAPSHOT_UPLOAD_BATCH_SIZE = int(os.getenv("SNAPSHOT_UPLOAD_BATCH_SIZE", "200"))
+    SNAPSHOT_UPLOAD_WORKERS = int(os.getenv("SNAPSHOT_UPLOAD_WORKERS", "8"))
+    # Related news search: "hybrid" (BM25 + vector, reciprocal rank fusion), "vector" or "lexical" (no embedding call)
+    SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")
+    LEXICAL_INDEX_DB = os.getenv("LEXICAL_INDEX_DB", "data_lexical_index/bm25.sqlite")
+    # the BM25 index is per host, the chat UI syncs it from the search index at startup
+    LEXICAL_INDEX_SYNC_ON_START = os.getenv("LEXICAL_INDEX_SYNC_ON_START", "true").lower() == "true"
+    SEARCH_RRF_K = int(os.getenv("SEARCH_RRF_K", "60"))
+    # slower vector searches are dropped for the lexical results, and vector search is skipped for the retry period
+    SEARCH_EMBEDDING_TIMEOUT_SECONDS = float(os.getenv("SEARCH_EMBEDDING_TIMEOUT_SECONDS", "3"))
+    SEARCH_VECTOR_RETRY_SECONDS = float(os.getenv("SEARCH_VECTOR_RETRY_SECONDS", "30"))
+
+    # Near-duplicate (syndicated) articles are analyzed once per cluster
+    NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true"
+    NEAR_DUPLICATE_DB = os.getenv("NEAR_DUPLICATE_DB", "data_near_duplicates/signatures.sqlite")
+    NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+    # Relevance pre-filter, articles scoring below the threshold are not sent to the LLM
+    RELEVANCE_FILTER_ENABLED = os.getenv("RELEVANCE_FILTER_ENABLED", "false").lower() == "true"
+    RELEVANCE_MODEL_PATH = os.getenv("RELEVANCE_MODEL_PATH", "data_relevance_model/relevance_model.npz")
+    RELEVANCE_SKIP_THRESHOLD = float(os.getenv("RELEVANCE_SKIP_THRESHOLD", "0.2"))
+    # training label: indexed documents with at least this impact_weight are material
+    RELEVANCE_MATERIAL_IMPACT_WEIGHT = int(os.getenv("RELEVANCE_MATERIAL_IMPACT_WEIGHT", "4"))
+
+    # Logging
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_MODULE_LEVELS = os.getenv("LOG_MODULE_LEVELS", "stock_price.back_tester=WARNING")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text or json
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+    # Tracing and metrics
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACING_EXPORT_PATH = os.getenv("TRACING_EXPORT_PATH", "traces/spans.jsonl")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # 0.0.0.0 exposes the metrics to other hosts
+
+    BROKER_STARTING_CASH = int(os.getenv("BROKER_STARTING_CASH", "100000"))
+    # Memory-mapped [ticker x date x field] price panel, built by stock_price/price_panel.py
+    PRICE_PANEL_PATH = os.getenv("PRICE_PANEL_PATH", "data_stock_price_panel")
+    # Split / dividend events, adjusted prices are computed on read
+    CORPORATE_ACTIONS_FOLDER = os.getenv("CORPORATE_ACTIONS_FOLDER", "data_corporate_actions")
+    ADJUSTED_PRICE_CACHE_SIZE = int(os.getenv("ADJUSTED_PRICE_CACHE_SIZE", "64"))
+    # Tradable universe, see data_tickers/tickers.csv for the columns
+    TICKER_REGISTRY_PATH = os.getenv("TICKER_REGISTRY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_tickers", "tickers.csv"))
+    # the feeder only processes the tickers of its shard, run FEED_SHARD_COUNT feeders with different indexes
+    FEED_SHARD_INDEX = int(os.getenv("FEED_SHARD_INDEX", "0"))
+    FEED_SHARD_COUNT = int(os.getenv("FEED_SHARD_COUNT", "1"))
+    # Distributed feed work queue
+    WORK_QUEUE_DB = os.getenv("WORK_QUEUE_DB", "data_work_queue/feed_queue.sqlite")
+    WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS = float(os.getenv("WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS", "900"))
+    WORK_QUEUE_MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+    WORK_QUEUE_RETRY_DELAY_SECONDS = float(os.getenv("WORK_QUEUE_RETRY_DELAY_SECONDS", "30"))
+    FEED_WINDOW_DAYS = int(os.getenv("FEED_WINDOW_DAYS", "7"))
+    # Intraday bars for in-trading-hour entries
+    INTRADAY_PRICE_FOLDER = os.getenv("INTRADAY_PRICE_FOLDER", "data_stock_price_intraday")
+    INTRADAY_INTERVAL = os.getenv("INTRADAY_INTERVAL", "1m")
+    # max open notional of one ticker in the portfolio backtest, as a fraction of equity
+    PORTFOLIO_MAX_TICKER_EXPOSURE = float(os.getenv("PORTFOLIO_MAX_TICKER_EXPOSURE", "0.2"))
 
     aoi_deployment_name = os.getenv('AZURE_DEPLOYMENT_NAME')
     aoi_api_key = os.getenv('AZURE_OPENAI_KEY')
@@ -29,15 +140,3 @@ class DataFeedConfig:
 
     BACKTEST_DATE_FROM = "2025-03-01"
     BACKTEST_DATE_TO = "2025-03-14"
-
-
-significant_companies = {
-    "AAPL": {"name": "Apple Inc.", "sector": "Technology"},
-    "GOOGL": {"name": "Alphabet Inc.", "sector": "Technology"},
-    "AMZN": {"name": "Amazon.com Inc.", "sector": "Consumer Discretionary"},
-    "MSFT": {"name": "Microsoft Corporation", "sector": "Technology"},
-    "META": {"name": "Meta Platforms Inc.", "sector": "Communication Services"},
-    "TSLA": {"name": "Tesla Inc.", "sector": "Consumer Discretionary"},
-    "NVDA": {"name": "NVIDIA Corporation", "sector": "Technology"},
-    "NFLX": {"name": "Netflix Inc.", "sector": "Communication Services"},
-}
@@ -0,0 +1,157 @@
+import argparse
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from common.logger import configure_logging, get_logger
+from config import Config
+from embedding_kits.index_versions import get_index_registry, get_index_signature
+from embedding_kits.stock_news_embedding import iter_index_pages
+
+logger = get_logger(__name__)
+
+VECTOR_FIELD = "combined_fields_vector"
+MANIFEST_FILE = "manifest.json"
+SNAPSHOT_VERSION = 2  # 2: the manifest has the index signature
+
+
+def _get_part_paths(path: str, part: int) -> tuple[str, str]:
+    return os.path.join(path, f"part-{part:05d}.parquet"), os.path.join(path, f"part-{part:05d}.vectors.npy")
+
+
+def write_snapshot(pages: Iterator[List[dict]], path: str, index_name: str = None, signature: dict = None) -> dict:
+    """
+    One part per page: the fields as zstd Parquet and the vectors as a float32 .npy blob, rows in the same order.
+    The manifest is written last, a snapshot without one is incomplete. signature is the index signature
+    (embedding model, reduction, compression) the vectors were built with, see embedding_kits/index_versions.py.
+    """
+    os.makedirs(path, exist_ok=True)
+    parts, dimensions, total = [], None, 0
+    for part, docs in enumerate(pages):
+        vectors = np.asarray([doc.pop(VECTOR_FIELD) for doc in docs], dtype=np.float32)
+        dimensions = vectors.shape[1] if vectors.ndim == 2 else dimensions
+        parquet_path, vector_path = _get_part_paths(path, part)
+        pd.DataFrame(docs).to_parquet(parquet_path, compression="zstd", index=False)
+        np.save(vector_path, vectors)
+        parts.append({"part": part, "rows": len(docs)})
+        total += len(docs)
+        logger.info("Snapshot part %s: %s documents (%s total)", part, len(docs), total)
+
+    manifest = {"version": SNAPSHOT_VERSION, "index_name": index_name, "signature": signature, "documents": total,
+                "dimensions": dimensions, "parts": parts, "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+    with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(path: str) -> dict:
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"{path} is not a complete snapshot, {MANIFEST_FILE} is missing")
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _to_records(frame: pd.DataFrame) -> List[dict]:
+    """Parquet rows back to index documents, missing values as None like the service returns them."""
+    return [{key: (None if isinstance(value, float) and np.isnan(value) else value.item() if isinstance(value, np.generic) else value)
+             for key, value in row.items()} for row in frame.to_dict(orient="records")]
+
+
+def iter_snapshot(path: str) -> Iterator[tuple[List[dict], np.ndarray]]:
+    """(documents, vectors) per part, vectors are memory-mapped."""
+    for part in read_manifest(path)["parts"]:
+        parquet_path, vector_path = _get_part_paths(path, part["part"])
+        yield _to_records(pd.read_parquet(parquet_path)), np.load(vector_path, mmap_mode="r")
+
+
+def export_snapshot(search_manager, path: str, page_size: int = Config.SNAPSHOT_PART_SIZE) -> dict:
+    started = time.perf_counter()
+    manifest = write_snapshot(iter_index_pages(search_manager.search_client, page_size), path, search_manager.index_name,
+                              search_manager.get_signature())
+    print(f"Exported {manifest['documents']} documents of {search_manager.index_name} to {path} "
+          f"in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+def get_snapshot_signature(manifest: dict, signature: dict = None) -> dict:
+    """Signature of the snapshot vectors, snapshots written before signatures need it given."""
+    if manifest.get("signature") is None and signature is None:
+        raise ValueError("The snapshot has no index signature, give the embedding model it was exported with")
+    return manifest.get("signature") or signature
+
+
+def import_snapshot(search_manager, path: str, batch_size: int = Config.SNAPSHOT_UPLOAD_BATCH_SIZE,
+                    workers: int = Config.SNAPSHOT_UPLOAD_WORKERS, lexical_index=None, signature: dict = None) -> int:
+    """
+    Bulk load a snapshot with parallel mergeOrUpload batches into search_manager's index (created when missing),
+    or into a LocalSearchManager. Documents are also added to lexical_index when given. Returns the loaded count.
+    A snapshot built with another signature than the target is refused, queries would be embedded with the
+    wrong model. signature is the one of a snapshot written before manifests had it.
+    """
+    manifest = read_manifest(path)
+    snapshot_signature = get_snapshot_signature(manifest, signature)
+    target_signature = search_manager.get_signature()
+    if snapshot_signature != target_signature:
+        raise ValueError(f"The snapshot was built with {snapshot_signature} but the target index is {target_signature}, "
+                         f"import it into an index of the snapshot's configuration")
+    started = time.perf_counter()
+    is_local = hasattr(search_manager, "documents")
+    if not is_local:
+        get_index_registry().register(search_manager.alias, search_manager.index_name, snapshot_signature)
+
+    def upload(docs: List[dict], vectors: np.ndarray) -> int:
+        batch = [dict(doc, **{"@search.action": "mergeOrUpload", VECTOR_FIELD: vector.tolist()}) for doc, vector in zip(docs, vectors)]
+        results = search_manager.search_client.upload_documents(documents=batch)
+        failed = [result.key for result in results if not result.succeeded]
+        if failed:
+            raise RuntimeError(f"{len(failed)} documents failed to upload, first: {failed[0]}")
+        return len(batch)
+
+    loaded = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for docs, vectors in iter_snapshot(path):
+            if not is_local:
+                futures = [executor.submit(upload, docs[start:start + batch_size], vectors[start:start + batch_size])
+                           for start in range(0, len(docs), batch_size)]
+                loaded += sum(future.result() for future in futures)
+            else:
+                search_manager.add_documents(docs, np.asarray(vectors))
+                loaded += len(docs)
+            if lexical_index is not None:
+                lexical_index.add_documents(docs)
+            logger.info("Imported %s / %s documents", loaded, manifest["documents"])
+    print(f"Imported {loaded} documents from {path} in {time.perf_counter() - started:.1f}s")
+    return loaded
+
+
+def main():
+    from embedding_kits.lexical_index import get_lexical_index
+    from embedding_kits.stock_news_embedding import AzureSearchManager
+
+    parser = argparse.ArgumentParser(description="Export the search index to a local snapshot, or bulk load one.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("--path", default=Config.SNAPSHOT_PATH, help="snapshot directory")
+    parser.add_argument("--index", default=Config.AZURE_SEARCH_INDEX, help="index to export from / import into")
+    parser.add_argument("--workers", type=int, default=Config.SNAPSHOT_UPLOAD_WORKERS)
+    parser.add_argument("--embedding-model", help="embedding model of a snapshot written before manifests had the index "
+                                                  "signature, with the configured reduction and compression")
+    args = parser.parse_args()
+
+    search_manager = AzureSearchManager(Config.AZURE_SEARCH_ENDPOINT, Config.AZURE_SEARCH_KEY, args.index)
+    if args.command == "export":
+        export_snapshot(search_manager, args.path)
+    else:
+        signature = get_index_signature(args.embedding_model) if args.embedding_model else None
+        import_snapshot(search_manager, args.path, workers=args.workers, lexical_index=get_lexical_index(), signature=signature)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
@@ -0,0 +1,432 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import List, Optional
+
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ResourceNotFoundError
+from azure.search.documents import SearchClient
+from azure.search.documents.indexes import SearchIndexClient
+from azure.search.documents.indexes.models import SearchFieldDataType, SearchIndex, SimpleField
+
+from common.logger import configure_logging, get_logger
+from config import Config
+from embedding_kits.vector_compression import get_index_dimensions
+
+logger = get_logger(__name__)
+
+# bump when the fields of AzureSearchManager.create_index change, existing indexes then need a migration
+INDEX_SCHEMA_VERSION = 1
+VECTOR_FIELD = "combined_fields_vector"
+STATUS_BUILDING = "building"
+STATUS_ACTIVE = "active"
+STATUS_RETIRED = "retired"
+REGISTRY_BACKEND_SEARCH = "search"
+REGISTRY_BACKEND_SQLITE = "sqlite"
+
+
+def get_index_signature(embedding_model: str = Config.OLLAMA_MODEL_EMBEDDING) -> dict:
+    """What the fields and vectors of an index built with the current configuration depend on."""
+    return {"schema_version": INDEX_SCHEMA_VERSION, "embedding_model": embedding_model, "dimensions": get_index_dimensions(),
+            "compression": Config.VECTOR_COMPRESSION, "reduction": Config.VECTOR_REDUCTION}
+
+
+class IndexRegistry:
+    """
+    Versions of the search index with the signature they were built with, and the alias readers and writers resolve.
+    The GA search SDK has no index aliases or index metadata, this registry keeps both in SQLite for a single host
+    (INDEX_REGISTRY_BACKEND=sqlite), swapping the alias is a single-row update. SearchIndexRegistry shares them.
+    """
+
+    def __init__(self, db_path: str = Config.INDEX_REGISTRY_DB):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS index_versions (index_name TEXT PRIMARY KEY, alias TEXT NOT NULL, "
+                "version INTEGER NOT NULL, signature TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS aliases (alias TEXT PRIMARY KEY, index_name TEXT NOT NULL, updated_at REAL NOT NULL)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS migration_checkpoints (target_index TEXT PRIMARY KEY, source_index TEXT NOT NULL, "
+                "last_id TEXT, migrated INTEGER NOT NULL, updated_at REAL NOT NULL)")
+
+    def resolve(self, alias: str) -> str:
+        """Index the alias points to, an unregistered name is an index name."""
+        with self._lock:
+            row = self.connection.execute("SELECT index_name FROM aliases WHERE alias = ?", (alias,)).fetchone()
+        return row[0] if row else alias
+
+    @staticmethod
+    def _to_version(row) -> dict:
+        index_name, alias, version, signature, status, created_at = row
+        return {"index_name": index_name, "alias": alias, "version": version, "signature": json.loads(signature),
+                "status": status, "created_at": created_at}
+
+    def get_version(self, index_name: str) -> Optional[dict]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT index_name, alias, version, signature, status, created_at FROM index_versions WHERE index_name = ?",
+                (index_name,)).fetchone()
+        return self._to_version(row) if row else None
+
+    def list_versions(self, alias: str) -> List[dict]:
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT index_name, alias, version, signature, status, created_at FROM index_versions WHERE alias = ? "
+                "ORDER BY version", (alias,)).fetchall()
+        return [self._to_version(row) for row in rows]
+
+    def _insert_version(self, alias: str, index_name: Optional[str], signature: dict, status: str) -> str:
+        version = self.connection.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM index_versions WHERE alias = ?",
+                                          (alias,)).fetchone()[0]
+        index_name = index_name or f"{alias}-v{version}"
+        self.connection.execute(
+            "INSERT INTO index_versions (index_name, alias, version, signature, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (index_name, alias, version, json.dumps(signature, sort_keys=True), status, time.time()))
+        return index_name
+
+    def register(self, alias: str, index_name: str, signature: dict) -> dict:
+        """Record a created (or adopted) index as the active version of alias, unless it is known already."""
+        with self._lock, self.connection:
+            known = self.connection.execute("SELECT 1 FROM index_versions WHERE index_name = ?", (index_name,)).fetchone()
+            if not known:
+                self._insert_version(alias, index_name, signature, STATUS_ACTIVE)
+                self.connection.execute("INSERT OR IGNORE INTO aliases (alias, index_name, updated_at) VALUES (?, ?, ?)",
+                                        (alias, index_name, time.time()))
+        return self.get_version(index_name)
+
+    def create_version(self, alias: str, signature: dict) -> str:
+        """Name and record the next version of alias, it is building until the alias is swapped to it."""
+        with self._lock, self.connection:
+            return self._insert_version(alias, None, signature, STATUS_BUILDING)
+
+    def swap_alias(self, alias: str, index_name: str) -> str:
+        """Point alias to index_name in one transaction, returns the previous index."""
+        with self._lock, self.connection:
+            row = self.connection.execute("SELECT index_name FROM aliases WHERE alias = ?", (alias,)).fetchone()
+            previous = row[0] if row else alias
+            self.connection.execute("INSERT OR REPLACE INTO aliases (alias, index_name, updated_at) VALUES (?, ?, ?)",
+                                    (alias, index_name, time.time()))
+            self.connection.execute("UPDATE index_versions SET status = ? WHERE index_name = ?", (STATUS_RETIRED, previous))
+            self.connection.execute("UPDATE index_versions SET status = ? WHERE index_name = ?", (STATUS_ACTIVE, index_name))
+        return previous
+
+    def save_checkpoint(self, target_index: str, source_index: str, last_id: str, migrated: int) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO migration_checkpoints (target_index, source_index, last_id, migrated, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)", (target_index, source_index, last_id, migrated, time.time()))
+
+    def load_checkpoint(self, target_index: str) -> tuple[Optional[str], int]:
+        """(last migrated key, migrated count) of a migration into target_index, (None, 0) when not started."""
+        with self._lock:
+            row = self.connection.execute("SELECT last_id, migrated FROM migration_checkpoints WHERE target_index = ?",
+                                          (target_index,)).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+
+class SearchIndexRegistry:
+    """
+    IndexRegistry kept as documents of a small index in the search service, so an alias swap reaches every host.
+    Each version, alias and checkpoint is one document keyed by kind and name, swapping the alias is a single-document
+    write. The first time the registry index is created, the versions of a SQLite registry at INDEX_REGISTRY_DB are
+    imported so the aliases keep pointing to the same indexes.
+    """
+
+    def __init__(self, endpoint: str = Config.AZURE_SEARCH_ENDPOINT, key: str = Config.AZURE_SEARCH_KEY,
+                 index_name: str = Config.INDEX_REGISTRY_INDEX, search_client=None, index_client=None,
+                 sqlite_db_path: str = Config.INDEX_REGISTRY_DB):
+        self.index_name = index_name
+        self.index_client = index_client or SearchIndexClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+        self.search_client = search_client or SearchClient(endpoint=endpoint, index_name=index_name,
+                                                           credential=AzureKeyCredential(key))
+        self._lock = threading.Lock()  # serializes version numbering within the process
+        self._ensure_index_exists(sqlite_db_path)
+
+    def _ensure_index_exists(self, sqlite_db_path: str):
+        try:
+            self.index_client.get_index(self.index_name)
+            return
+        except ResourceNotFoundError:
+            pass
+        fields = [SimpleField(name="id", type=SearchFieldDataType.String, key=True),
+                  SimpleField(name="kind", type=SearchFieldDataType.String, filterable=True),
+                  SimpleField(name="alias", type=SearchFieldDataType.String, filterable=True),
+                  SimpleField(name="index_name", type=SearchFieldDataType.String),
+                  SimpleField(name="version", type=SearchFieldDataType.Int32, sortable=True),
+                  SimpleField(name="signature", type=SearchFieldDataType.String),
+                  SimpleField(name="status", type=SearchFieldDataType.String),
+                  SimpleField(name="source_index", type=SearchFieldDataType.String),
+                  SimpleField(name="last_id", type=SearchFieldDataType.String),
+                  SimpleField(name="migrated", type=SearchFieldDataType.Int64),
+                  SimpleField(name="created_at", type=SearchFieldDataType.Double),
+                  SimpleField(name="updated_at", type=SearchFieldDataType.Double)]
+        self.index_client.create_index(SearchIndex(name=self.index_name, fields=fields))
+        logger.info("Created the index registry %s", self.index_name)
+        if sqlite_db_path != ":memory:" and os.path.exists(sqlite_db_path):
+            self.import_registry(IndexRegistry(sqlite_db_path))
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        return value.replace("'", "''")
+
+    def _get(self, doc_id: str) -> Optional[dict]:
+        try:
+            return self.search_client.get_document(key=doc_id)
+        except ResourceNotFoundError:
+            return None
+
+    def _upload(self, docs: List[dict]) -> None:
+        failed = [result.key for result in self.search_client.upload_documents(documents=docs) if not result.succeeded]
+        if failed:
+            raise RuntimeError(f"Failed to write {failed} to the index registry {self.index_name}")
+
+    @staticmethod
+    def _to_version(doc: dict) -> dict:
+        return {"index_name": doc["index_name"], "alias": doc["alias"], "version": doc["version"],
+                "signature": json.loads(doc["signature"]), "status": doc["status"], "created_at": doc["created_at"]}
+
+    @staticmethod
+    def _version_doc(alias: str, index_name: str, version: int, signature: dict, status: str, created_at: float) -> dict:
+        return {"id": f"version-{index_name}", "kind": "version", "alias": alias, "index_name": index_name, "version": version,
+                "signature": json.dumps(signature, sort_keys=True), "status": status, "created_at": created_at}
+
+    def resolve(self, alias: str) -> str:
+        """Index the alias points to, an unregistered name is an index name."""
+        doc = self._get(f"alias-{alias}")
+        return doc["index_name"] if doc else alias
+
+    def get_version(self, index_name: str) -> Optional[dict]:
+        doc = self._get(f"version-{index_name}")
+        return self._to_version(doc) if doc else None
+
+    def list_versions(self, alias: str) -> List[dict]:
+        docs = self.search_client.search(search_text="*", filter=f"kind eq 'version' and alias eq '{self._quote(alias)}'",
+                                         order_by=["version asc"])
+        return [self._to_version(doc) for doc in docs]
+
+    def _insert_version(self, alias: str, index_name: Optional[str], signature: dict, status: str) -> str:
+        version = max((known["version"] for known in self.list_versions(alias)), default=0) + 1
+        index_name = index_name or f"{alias}-v{version}"
+        self._upload([self._version_doc(alias, index_name, version, signature, status, time.time())])
+        return index_name
+
+    def register(self, alias: str, index_name: str, signature: dict) -> dict:
+        """Record a created (or adopted) index as the active version of alias, unless it is known already."""
+        with self._lock:
+            if self.get_version(index_name) is None:
+                self._insert_version(alias, index_name, signature, STATUS_ACTIVE)
+                if self._get(f"alias-{alias}") is None:
+                    self._upload([{"id": f"alias-{alias}", "kind": "alias", "alias": alias, "index_name": index_name,
+                                   "updated_at": time.time()}])
+        return self.get_version(index_name)
+
+    def create_version(self, alias: str, signature: dict) -> str:
+        """Name and record the next version of alias, it is building until the alias is swapped to it."""
+        with self._lock:
+            return self._insert_version(alias, None, signature, STATUS_BUILDING)
+
+    def swap_alias(self, alias: str, index_name: str) -> str:
+        """Point alias to index_name with one document write, returns the previous index."""
+        previous = self.resolve(alias)
+        self._upload([{"id": f"alias-{alias}", "kind": "alias", "alias": alias, "index_name": index_name,
+                       "updated_at": time.time()}])
+        self.search_client.merge_documents(documents=[
+            {"id": f"version-{name}", "status": status}
+            for name, status in ((previous, STATUS_RETIRED), (index_name, STATUS_ACTIVE)) if self._get(f"version-{name}")])
+        return previous
+
+    def save_checkpoint(self, target_index: str, source_index: str, last_id: str, migrated: int) -> None:
+        self._upload([{"id": f"checkpoint-{target_index}", "kind": "checkpoint", "index_name": target_index,
+                       "source_index": source_index, "last_id": last_id, "migrated": migrated, "updated_at": time.time()}])
+
+    def load_checkpoint(self, target_index: str) -> tuple[Optional[str], int]:
+        """(last migrated key, migrated count) of a migration into target_index, (None, 0) when not started."""
+        doc = self._get(f"checkpoint-{target_index}")
+        return (doc["last_id"], doc["migrated"]) if doc else (None, 0)
+
+    def import_registry(self, registry: IndexRegistry) -> int:
+        """Copy the versions, aliases and checkpoints of a SQLite registry, returns the number of versions."""
+        with registry._lock:
+            versions = registry.connection.execute(
+                "SELECT index_name, alias, version, signature, status, created_at FROM index_versions").fetchall()
+            aliases = registry.connection.execute("SELECT alias, index_name, updated_at FROM aliases").fetchall()
+            checkpoints = registry.connection.execute(
+                "SELECT target_index, source_index, last_id, migrated, updated_at FROM migration_checkpoints").fetchall()
+        docs = [self._version_doc(alias, index_name, version, json.loads(signature), status, created_at)
+                for index_name, alias, version, signature, status, created_at in versions]
+        docs += [{"id": f"alias-{alias}", "kind": "alias", "alias": alias, "index_name": index_name, "updated_at": updated_at}
+                 for alias, index_name, updated_at in aliases]
+        docs += [{"id": f"checkpoint-{target_index}", "kind": "checkpoint", "index_name": target_index, "source_index": source_index,
+                  "last_id": last_id, "migrated": migrated, "updated_at": updated_at}
+                 for target_index, source_index, last_id, migrated, updated_at in checkpoints]
+        if docs:
+            self._upload(docs)
+            logger.info("Imported %s index versions and %s aliases into %s", len(versions), len(aliases), self.index_name)
+        return len(versions)
+
+
+@lru_cache(maxsize=1)
+def get_index_registry():
+    if Config.INDEX_REGISTRY_BACKEND == REGISTRY_BACKEND_SQLITE:
+        return IndexRegistry(Config.INDEX_REGISTRY_DB)
+    if Config.INDEX_REGISTRY_BACKEND != REGISTRY_BACKEND_SEARCH:
+        raise ValueError(f"Unknown index registry backend: {Config.INDEX_REGISTRY_BACKEND}")
+    return SearchIndexRegistry()
+
+
+def get_embedding_text(doc: dict) -> str:
+    """Text the document vector was computed from, the stored title and content (NewsAPIArticle.get_content_for_embedding)."""
+    return f"{doc.get('title')}\n\n{doc.get('content')}"
+
+
+class IndexMigration:
+    """
+    Online re-embedding of the index an alias points to into a new version built with the current configuration.
+    Documents are streamed in key order, their stored text re-embedded in batches and uploaded to the new version,
+    the last migrated key is checkpointed per batch so an interrupted run resumes. Readers keep using the old index
+    until the alias is swapped, documents written meanwhile are copied by a catch-up pass before and after the swap.
+    """
+
+    def __init__(self, alias: str = Config.AZURE_SEARCH_INDEX, registry: IndexRegistry = None,
+                 batch_size: int = Config.INDEX_MIGRATION_BATCH_SIZE):
+        self.alias = alias
+        self.registry = registry or get_index_registry()
+        self.batch_size = batch_size
+
+    def _get_target(self, source_index: str) -> str:
+        """The building version of alias, resumed, or the next one."""
+        building = [version for version in self.registry.list_versions(self.alias) if version["status"] == STATUS_BUILDING]
+        if building:
+            return building[-1]["index_name"]
+        if self.registry.get_version(source_index)["signature"] == get_index_signature():
+            logger.warning("%s already matches the configured index signature, migrating anyway", source_index)
+        return self.registry.create_version(self.alias, get_index_signature())
+
+    def _get_source_fields(self, source) -> List[str]:
+        """Stored fields without the vector, the new vector is computed from the text."""
+        return [field.name for field in source.index_client.get_index(source.index_name).fields if field.name != VECTOR_FIELD]
+
+    def _migrate_batch(self, target, docs: List[dict]) -> int:
+        from llm_backends.text_preparation import embed_texts
+        from embedding_kits.vector_compression import reduce_vector
+
+        docs = [{key: value for key, value in doc.items() if key != VECTOR_FIELD and not key.startswith("@")} for doc in docs]
+        vectors = embed_texts(target.embedding_model, [get_embedding_text(doc) for doc in docs])
+        batch = [dict(doc, **{"@search.action": "mergeOrUpload", VECTOR_FIELD: reduce_vector(vector)})
+                 for doc, vector in zip(docs, vectors)]
+        failed = [result.key for result in target.search_client.upload_documents(documents=batch) if not result.succeeded]
+        if failed:
+            raise RuntimeError(f"{len(failed)} documents failed to upload to {target.index_name}, first: {failed[0]}")
+        return len(batch)
+
+    def _get_ids(self, search_manager) -> set[str]:
+        from embedding_kits.stock_news_embedding import iter_index_pages
+        return {doc["id"] for page in iter_index_pages(search_manager.search_client, 1000, select=["id"]) for doc in page}
+
+    def catch_up(self, source, target) -> int:
+        """Copy documents of the source that the key-ordered scan missed (written behind its position)."""
+        missing = sorted(self._get_ids(source) - self._get_ids(target))
+        fields = self._get_source_fields(source)
+        migrated = 0
+        for start in range(0, len(missing), self.batch_size):
+            docs = [source.search_client.get_document(key=doc_id, selected_fields=fields) for doc_id in missing[start:start + self.batch_size]]
+            migrated += self._migrate_batch(target, docs)
+        if migrated:
+            logger.info("Caught up %s documents written to %s during the migration", migrated, source.index_name)
+        return migrated
+
+    def run(self, swap: bool = True) -> str:
+        """Migrate (or resume migrating) into the next version, swap the alias to it when swap. Returns its name."""
+        from embedding_kits.stock_news_embedding import AzureSearchManager, iter_index_pages
+
+        source = AzureSearchManager(index_name=self.alias)
+        if self.registry.get_version(source.index_name) is None:
+            raise ValueError(f"{source.index_name} is not registered, record the embedding model it was built with first: "
+                             f"python -m embedding_kits.index_versions adopt --embedding-model <model>")
+        target_index = self._get_target(source.index_name)
+        if target_index == source.index_name:
+            raise ValueError(f"{self.alias} already points to {target_index}")
+        target = AzureSearchManager(index_name=target_index)
+        last_id, migrated = self.registry.load_checkpoint(target_index)
+        started = time.perf_counter()
+        logger.info("Migrating %s -> %s from %s (%s done)", source.index_name, target_index, last_id or "the start", migrated)
+
+        for docs in iter_index_pages(source.search_client, self.batch_size, after_id=last_id, select=self._get_source_fields(source)):
+            migrated += self._migrate_batch(target, docs)
+            self.registry.save_checkpoint(target_index, source.index_name, docs[-1]["id"], migrated)
+            logger.info("Migrated %s documents to %s, %.1f docs/s", migrated, target_index,
+                        migrated / max(time.perf_counter() - started, 1e-9))
+        self.catch_up(source, target)
+
+        if swap:
+            previous = self.registry.swap_alias(self.alias, target_index)
+            # writers opened before the swap still write to the previous index until they reopen the alias
+            self.catch_up(source, target)
+            print(f"{self.alias} now points to {target_index} (was {previous})")
+        return target_index
+
+
+def main():
+    from embedding_kits.related_news_aggregates import RelatedNewsAggregateStore, RelatedNewsAggregator
+    from embedding_kits.stock_news_embedding import AzureSearchManager
+
+    parser = argparse.ArgumentParser(description="Search index versions: status, re-embedding migration and alias swap.")
+    parser.add_argument("--alias", default=Config.AZURE_SEARCH_INDEX)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="versions of the alias and the progress of a running migration")
+    migrate = commands.add_parser("migrate", help="re-embed into a new version with the current configuration")
+    migrate.add_argument("--batch-size", type=int, default=Config.INDEX_MIGRATION_BATCH_SIZE)
+    migrate.add_argument("--no-swap", action="store_true", help="leave the alias on the current version, migrate again to swap")
+    adopt = commands.add_parser("adopt", help="register the index created before versioning as the first version")
+    adopt.add_argument("--embedding-model", default=Config.OLLAMA_MODEL_EMBEDDING, help="model its vectors were computed with")
+    swap = commands.add_parser("swap", help="point the alias to a version, e.g. back to the previous one")
+    swap.add_argument("index")
+    args = parser.parse_args()
+
+    registry = get_index_registry()
+    if args.command == "status":
+        current, signature = registry.resolve(args.alias), get_index_signature()
+        for version in registry.list_versions(args.alias):
+            last_id, migrated = registry.load_checkpoint(version["index_name"])
+            print(f"{'*' if version['index_name'] == current else ' '} v{version['version']} {version['index_name']} "
+                  f"[{version['status']}] {version['signature']}" + (f", {migrated} migrated up to {last_id}" if migrated else ""))
+        if registry.get_version(current) is None:
+            print(f"{current} is not registered, run the adopt command with the embedding model it was built with.")
+        elif registry.get_version(current)["signature"] != signature:
+            print(f"The configuration ({signature}) differs from {current}, run the migrate command.")
+        return
+
+    if args.command == "adopt":
+        version = registry.register(args.alias, registry.resolve(args.alias), get_index_signature(args.embedding_model))
+        print(f"v{version['version']} {version['index_name']} [{version['status']}] {version['signature']}")
+        return
+
+    if args.command == "migrate":
+        IndexMigration(args.alias, registry, args.batch_size).run(swap=not args.no_swap)
+        if args.no_swap:
+            return
+    else:
+        if registry.get_version(args.index) is None:
+            parser.error(f"{args.index} is not a version of {args.alias}")
+        print(f"{args.alias} now points to {args.index} (was {registry.swap_alias(args.alias, args.index)})")
+
+    # the related news table keeps a copy of the vectors, rebuild it from the new version
+    RelatedNewsAggregateStore().clear()
+    RelatedNewsAggregator(AzureSearchManager(index_name=args.alias)).refresh()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import copy
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import List, Optional
+
+from common.instrumentation import instrumentation
+from common.logger import configure_logging, get_logger
+from config import Config
+from embedding_kits.model_news_impact_analysis import NewsAnalysisDoc
+
+logger = get_logger(__name__)
+
+SEARCH_MODE_HYBRID = "hybrid"
+SEARCH_MODE_VECTOR = "vector"
+SEARCH_MODE_LEXICAL = "lexical"
+MAX_QUERY_TERMS = 32
+_TOKEN = re.compile(r"[a-z0-9]+(?:['.][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be been but by for from has have he her his in into is it its of on or our over said she "
+    "than that the their there they this to was we were what when which while who will with would you".split())
+# title and ticker matches count more than body matches, by repeating their terms
+TITLE_WEIGHT = 2
+TICKER_WEIGHT = 3
+# fields of the search index kept in the BM25 index, the rest (vector, trading hour flags) isn't shown in related news
+LEXICAL_FIELDS = ["id", "sector", "ticker", "title", "content", "publish_at", "url", "source",
+                  "position_movement", "impact_days_min", "impact_days_max", "impact_weight", "pnl_ratio"]
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN.findall((text or "").lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+def get_document_terms(doc: dict) -> Counter:
+    terms = Counter(tokenize(doc.get("content")))
+    for term in tokenize(doc.get("title")):
+        terms[term] += TITLE_WEIGHT
+    if doc.get("ticker"):
+        terms[doc["ticker"].lower()] += TICKER_WEIGHT
+    return terms
+
+
+class BM25Index:
+    """
+    Inverted index over title / content / ticker in SQLite, scored with Okapi BM25.
+    Documents are upserted by id as they are indexed, the collection statistics are kept in the same
+    transaction, so the chat process always reads a consistent index written by the feeders.
+    """
+
+    def __init__(self, db_path: str = Config.LEXICAL_INDEX_DB, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS documents (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL, payload TEXT NOT NULL)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+                "PRIMARY KEY (term, doc_id)) WITHOUT ROWID")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS collection_stats (id INTEGER PRIMARY KEY CHECK (id = 0), "
+                "doc_count INTEGER NOT NULL, total_length INTEGER NOT NULL)")
+            self.connection.execute("INSERT OR IGNORE INTO collection_stats (id, doc_count, total_length) VALUES (0, 0, 0)")
+
+    def add_documents(self, docs: List[dict]) -> None:
+        """Index or re-index documents (fields of the search index, the vector is not needed)."""
+        with self._lock, self.connection:
+            for doc in docs:
+                previous = self.connection.execute("SELECT length FROM documents WHERE doc_id = ?", (doc["id"],)).fetchone()
+                if previous is not None:
+                    self.connection.execute("DELETE FROM postings WHERE doc_id = ?", (doc["id"],))
+                    self.connection.execute("UPDATE collection_stats SET doc_count = doc_count - 1, total_length = total_length - ? "
+                                            "WHERE id = 0", (previous[0],))
+                terms = get_document_terms(doc)
+                length = sum(terms.values())
+                payload = {key: value for key, value in doc.items() if key != "combined_fields_vector" and not key.startswith("@")}
+                self.connection.execute("INSERT OR REPLACE INTO documents (doc_id, length, payload) VALUES (?, ?, ?)",
+                                        (doc["id"], length, json.dumps(payload, default=str)))
+                self.connection.executemany("INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                                            [(term, doc["id"], tf) for term, tf in terms.items()])
+                self.connection.execute("UPDATE collection_stats SET doc_count = doc_count + 1, total_length = total_length + ? "
+                                        "WHERE id = 0", (length,))
+
+    def remove_documents(self, doc_ids: List[str]) -> None:
+        with self._lock, self.connection:
+            for doc_id in doc_ids:
+                previous = self.connection.execute("SELECT length FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+                if previous is None:
+                    continue
+                self.connection.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+                self.connection.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+                self.connection.execute("UPDATE collection_stats SET doc_count = doc_count - 1, total_length = total_length - ? "
+                                        "WHERE id = 0", (previous[0],))
+
+    def sync(self, search_client, page_size: int = 500) -> tuple[int, int]:
+        """
+        Bring the index in line with the search index: documents that are new or changed there are (re-)indexed,
+        documents deleted there are removed. Returns (indexed, removed).
+        """
+        from embedding_kits.stock_news_embedding import iter_index_pages
+
+        with self._lock:
+            known = set(doc_id for doc_id, in self.connection.execute("SELECT doc_id FROM documents"))
+        indexed, seen = 0, set()
+        for page in iter_index_pages(search_client, page_size, select=LEXICAL_FIELDS):
+            seen.update(doc["id"] for doc in page)
+            stored = self.get_documents([doc["id"] for doc in page])
+            changed = [doc for doc in page if get_sync_key(stored.get(doc["id"])) != get_sync_key(doc)]
+            self.add_documents(changed)
+            indexed += len(changed)
+        removed = list(known - seen)
+        self.remove_documents(removed)
+        return indexed, len(removed)
+
+    def get_document_count(self) -> int:
+        with self._lock:
+            return self.connection.execute("SELECT doc_count FROM collection_stats WHERE id = 0").fetchone()[0]
+
+    def search_ids(self, query: str, top_k: int = 5) -> list[tuple[str, float]]:
+        """(doc_id, BM25 score) of the best matches, best first."""
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        with self._lock:
+            doc_count, total_length = self.connection.execute(
+                "SELECT doc_count, total_length FROM collection_stats WHERE id = 0").fetchone()
+            if not terms or doc_count == 0:
+                return []
+            rows = self.connection.execute(
+                f"SELECT p.term, p.doc_id, p.tf, d.length FROM postings p JOIN documents d ON d.doc_id = p.doc_id "
+                f"WHERE p.term IN ({','.join('?' * len(terms))})", terms).fetchall()
+        average_length = total_length / doc_count
+        document_frequency = Counter(term for term, _, _, _ in rows)
+        scores = defaultdict(float)
+        for term, doc_id, tf, length in rows:
+            idf = math.log(1 + (doc_count - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average_length))
+        return sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+
+    def get_documents(self, doc_ids: List[str]) -> dict[str, dict]:
+        if not doc_ids:
+            return {}
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT doc_id, payload FROM documents WHERE doc_id IN ({','.join('?' * len(doc_ids))})", doc_ids).fetchall()
+        return {doc_id: json.loads(payload) for doc_id, payload in rows}
+
+    @instrumentation.traced("search.lexical")
+    def search(self, query: str, top_k: int = 5) -> List[NewsAnalysisDoc]:
+        matches = self.search_ids(query, top_k)
+        docs = self.get_documents([doc_id for doc_id, _ in matches])
+        return [NewsAnalysisDoc(**docs[doc_id], **{"@search.score": score}) for doc_id, score in matches if doc_id in docs]
+
+
+@lru_cache(maxsize=1)
+def get_lexical_index() -> Optional[BM25Index]:
+    """Shared index of this process, None when SEARCH_MODE is pure vector search."""
+    if Config.SEARCH_MODE == SEARCH_MODE_VECTOR:
+        return None
+    return BM25Index(Config.LEXICAL_INDEX_DB)
+
+
+def get_sync_key(doc: Optional[dict]) -> Optional[str]:
+    if doc is None:
+        return None
+    return json.dumps([doc.get(field) for field in LEXICAL_FIELDS], default=str)
+
+
+def sync_lexical_index() -> None:
+    """Startup sync of this host's index, documents inserted on other hosts (distributed feeders) are only in the search index."""
+    from embedding_kits.stock_news_embedding import AzureSearchManager
+
+    lexical_index = get_lexical_index()
+    if lexical_index is None:
+        return
+    try:
+        indexed, removed = lexical_index.sync(AzureSearchManager().search_client)
+        logger.info("Lexical index synced: %d documents indexed, %d removed", indexed, removed)
+    except Exception:
+        logger.exception("Lexical index sync failed, related news search uses the local documents only")
+
+
+def start_lexical_index_sync() -> Optional[threading.Thread]:
+    if not Config.LEXICAL_INDEX_SYNC_ON_START or Config.SEARCH_MODE == SEARCH_MODE_VECTOR:
+        return None
+    thread = threading.Thread(target=sync_lexical_index, name="lexical-index-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+def reciprocal_rank_fusion(result_lists: List[List[NewsAnalysisDoc]], k: int = Config.SEARCH_RRF_K) -> List[NewsAnalysisDoc]:
+    """
+    Fused ranking by the sum of 1 / (k + rank) over the lists, @search.score becomes the fused score.
+    The results are copies, the input docs may be shared with other callers of a coalesced search.
+    """
+    scores, docs = defaultdict(float), {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            scores[doc.id] += 1 / (k + rank)
+            docs.setdefault(doc.id, doc)
+    fused = []
+    for doc_id in sorted(scores, key=lambda doc_id: -scores[doc_id]):
+        doc = copy.copy(docs[doc_id])
+        doc.search_score = scores[doc_id]
+        fused.append(doc)
+    return fused
+
+
+class HybridRetriever:
+    """
+    Related news retrieval fusing BM25 and vector search with reciprocal rank fusion.
+    The lexical search never waits for the embedding service: when the vector search is slower than
+    embedding_timeout or fails, it is cancelled, the lexical results are returned and vector search is skipped
+    for retry_after seconds.
+    """
+    _vector_unavailable_until = 0.0  # shared, a down embedding service is down for every retriever
+
+    def __init__(self, search_manager, lexical_index: Optional[BM25Index], mode: str = Config.SEARCH_MODE,
+                 embedding_timeout: float = Config.SEARCH_EMBEDDING_TIMEOUT_SECONDS,
+                 retry_after: float = Config.SEARCH_VECTOR_RETRY_SECONDS, candidate_multiplier: int = 4):
+        self.search_manager = search_manager
+        self.lexical_index = lexical_index
+        self.mode = mode if lexical_index is not None else SEARCH_MODE_VECTOR
+        self.embedding_timeout = embedding_timeout
+        self.retry_after = retry_after
+        self.candidate_multiplier = candidate_multiplier
+
+    def _vector_search(self, query: str, top_k: int):
+        """Awaitable vector search, native async (cancellable) when the manager has it, otherwise on a thread."""
+        if hasattr(self.search_manager, "asearch_similar_documents"):
+            return self.search_manager.asearch_similar_documents(query, top_k)
+        return asyncio.to_thread(self.search_manager.search_similar_documents, query, top_k)
+
+    async def search(self, query: str, top_k: int = 5) -> List[NewsAnalysisDoc]:
+        if self.mode == SEARCH_MODE_VECTOR:
+            try:
+                return await asyncio.wait_for(self._vector_search(query, top_k), self.embedding_timeout)
+            except Exception as e:
+                logger.warning("Vector search unavailable (%s), no related news", type(e).__name__)
+                instrumentation.increment("related_news_search_total", mode="vector_unavailable")
+                return []
+        candidate_k = top_k * self.candidate_multiplier
+        lexical = asyncio.create_task(asyncio.to_thread(self.lexical_index.search, query, candidate_k))
+        try:
+            if self.mode == SEARCH_MODE_LEXICAL or time.monotonic() < HybridRetriever._vector_unavailable_until:
+                instrumentation.increment("related_news_search_total", mode="lexical")
+                return (await lexical)[:top_k]
+
+            try:
+                vector_results = await asyncio.wait_for(self._vector_search(query, candidate_k), self.embedding_timeout)
+            except Exception as e:
+                logger.warning("Vector search unavailable (%s), lexical results only for %ss", type(e).__name__, self.retry_after)
+                HybridRetriever._vector_unavailable_until = time.monotonic() + self.retry_after
+                instrumentation.increment("related_news_search_total", mode="lexical_fallback")
+                return (await lexical)[:top_k]
+            instrumentation.increment("related_news_search_total", mode="hybrid")
+            return reciprocal_rank_fusion([await lexical, vector_results])[:top_k]
+        finally:
+            lexical.cancel()  # no-op once awaited, stops waiting for it when the caller is cancelled
+
+
+def main():
+    from embedding_kits.stock_news_embedding import AzureSearchManager
+
+    parser = argparse.ArgumentParser(description="Backfill / sync the BM25 index from the search index.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    index = BM25Index(Config.LEXICAL_INDEX_DB)
+    indexed, removed = index.sync(AzureSearchManager().search_client, args.batch_size)
+    print(f"Indexed {indexed} documents, removed {removed}, {index.get_document_count()} in {Config.LEXICAL_INDEX_DB}")
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
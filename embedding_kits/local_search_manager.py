@@ -0,0 +1,130 @@
+from typing import List
+
+import numpy as np
+
+from config import Config
+from embedding_kits.index_versions import get_index_signature
+from embedding_kits.lexical_index import BM25Index
+from embedding_kits.model_news_impact_analysis import NewsAnalysisDoc
+from embedding_kits.vector_compression import make_quantizer, reduce_vector, search_compressed
+from llm_backends.text_preparation import embed_text
+from new_analyzer.model_news_impact_analysis_result import NewsImpactAnalysisResult
+from news_downloader.model_news_article import NewsArticle
+from news_downloader.model_news_article_na import NewsAPIArticle
+from stock_price.back_tester import BacktestResult
+from stock_price.trading_date_calculator import TradingHourStatus
+
+
+class LocalSearchManager:
+    """
+    In-memory stand-in for AzureSearchManager, for offline runs and benchmarks. Search is exact cosine, or with a
+    compression the scan runs over int8 / binary codes and the oversampled candidates are rescored with full precision.
+    """
+
+    def __init__(self, embedding_model, compression: str = Config.VECTOR_COMPRESSION, oversampling: float = Config.VECTOR_OVERSAMPLING,
+                 lexical_index: BM25Index = None):
+        self.embedding_model = embedding_model
+        self.lexical_index = lexical_index  # kept up to date with the inserted documents when given
+        self.documents: List[dict] = []
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self._positions = {}  # document id -> row, inserts with a known id replace the row like mergeOrUpload
+        self.compression = compression
+        self.quantizer = make_quantizer(compression)
+        self.oversampling = oversampling
+        self.codes = None
+        self._fitted_count = 0
+
+    def generate_embedding(self, text: str):
+        return reduce_vector(embed_text(self.embedding_model, text))
+
+    def insert_document(self, sector: str, ticker: str, article: NewsArticle, trading_hour_status: TradingHourStatus, analysis_result: NewsImpactAnalysisResult, backtest_result: BacktestResult):
+        """Insert document with the same fields AzureSearchManager uploads."""
+        if not isinstance(article, NewsAPIArticle):
+            return
+        doc = {
+            "id": article.get_document_id(ticker),
+            "sector": sector,
+            "ticker": ticker,
+            "title": article.title,
+            "content": article.content,
+            "publish_at": article.published_at,
+            "url": article.url,
+            "source": article.source,
+            "next_trading_open": trading_hour_status.next_trading_open,
+            "is_in_trading_hour": trading_hour_status.is_in_trading_hour,
+            "is_same_day_before_trading_hour": trading_hour_status.is_same_day_before_trading_hour,
+            "is_same_day_after_trading_hour": trading_hour_status.is_same_day_after_trading_hour,
+            "is_in_weekend": trading_hour_status.is_in_weekend,
+            "is_in_holiday": trading_hour_status.is_in_holiday,
+            "hours_before_open": trading_hour_status.hours_before_open,
+            "position_movement": analysis_result.position_movement,
+            "impact_days_min": analysis_result.impact_days_min,
+            "impact_days_max": analysis_result.impact_days_max,
+            "impact_weight": analysis_result.impact_weight,
+            "pnl_ratio": backtest_result.total_pnl_ratio,
+        }
+        self.add_documents([doc], [self.generate_embedding(article.get_content_for_embedding())])
+        if self.lexical_index is not None:
+            self.lexical_index.add_documents([doc])
+
+    def add_documents(self, docs: List[dict], vectors) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        new_rows, replaced = [], []
+        for doc, vector in zip(docs, vectors):
+            if doc["id"] in self._positions:
+                position = self._positions[doc["id"]]
+                self.documents[position] = doc
+                self.vectors[position] = vector
+                replaced.append(position)
+            else:
+                self._positions[doc["id"]] = len(self.documents) + len(new_rows)
+                new_rows.append((doc, vector))
+        if new_rows:
+            new_vectors = np.vstack([vector for _, vector in new_rows])
+            self.vectors = new_vectors if not self.documents else np.vstack([self.vectors, new_vectors])
+            self.documents.extend(doc for doc, _ in new_rows)
+        if self.quantizer is not None:
+            self._update_codes(replaced, len(new_rows))
+
+    def _update_codes(self, replaced: List[int], appended: int) -> None:
+        """
+        Encode the changed rows. The quantizer range is refitted, and every row re-encoded, whenever the store
+        doubled since the last fit, so the amortized cost of an insert stays constant.
+        """
+        if len(self.vectors) >= 2 * self._fitted_count:
+            self.quantizer.fit(self.vectors)
+            self._fitted_count = len(self.vectors)
+            self.codes = self.quantizer.encode(self.vectors)
+            return
+        if replaced:
+            self.codes[replaced] = self.quantizer.encode(self.vectors[replaced])
+        if appended:
+            self.codes = np.vstack([self.codes, self.quantizer.encode(self.vectors[-appended:])])
+
+    def search_similar_documents(self, query: str, top_k: int = 5):
+        """Cosine search over every stored vector, on the codes first when the store is compressed."""
+        if not self.documents:
+            return []
+        query_vector = np.asarray(self.generate_embedding(query), dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1)
+        if self.quantizer is not None:
+            top, scores = search_compressed(query_vector, self.codes, self.quantizer, self.vectors, top_k, self.oversampling)
+            return [NewsAnalysisDoc(**self.documents[i], **{"@search.score": float(score)}) for i, score in zip(top, scores)]
+        scores = self.vectors @ query_vector
+        top = np.argsort(-scores)[:top_k]
+        return [NewsAnalysisDoc(**self.documents[i], **{"@search.score": float(scores[i])}) for i in top]
+
+    def get_signature(self) -> dict:
+        """Signature of the vectors this store expects, snapshots from another model or reduction don't fit."""
+        model_name = getattr(self.embedding_model, "model_name", Config.OLLAMA_MODEL_EMBEDDING)
+        return dict(get_index_signature(model_name), compression=self.compression)
+
+    def import_snapshot(self, path: str = Config.SNAPSHOT_PATH) -> int:
+        """Load an index snapshot, test fixtures and benchmarks start from a real index this way."""
+        from embedding_kits.index_snapshot import import_snapshot
+        return import_snapshot(self, path, lexical_index=self.lexical_index)
+
+    def get_total_document_count(self):
+        return len(self.documents)
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Optional, List, Iterator
+
+import numpy as np
+
+from common.logger import configure_logging
+from config import Config
+from embedding_kits.model_news_impact_analysis import NewsAnalysisDoc
+from embedding_kits.stock_news_embedding import iter_index_pages
+from ui.text_composer import LLMTextComposer
+
+NEIGHBOR_FIELDS = ["id", "sector", "ticker", "title", "publish_at", "url", "source",
+                   "position_movement", "impact_days_min", "impact_days_max", "impact_weight", "pnl_ratio"]
+
+
+class RelatedNewsAggregateStore:
+    """SQLite table of every indexed document's top-k neighbors and their aggregated pnl / impact-day statistics."""
+
+    def __init__(self, db_path: str = Config.RELATED_NEWS_AGGREGATE_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS doc_vectors ("
+                "doc_id TEXT PRIMARY KEY, payload TEXT NOT NULL, vector BLOB NOT NULL, fingerprint TEXT)")
+            columns = {row[1] for row in self.connection.execute("PRAGMA table_info(doc_vectors)")}
+            if "fingerprint" not in columns:
+                # rows of older tables have no fingerprint, so the next refresh pulls them once more
+                self.connection.execute("ALTER TABLE doc_vectors ADD COLUMN fingerprint TEXT")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS related_news_aggregates ("
+                "doc_id TEXT PRIMARY KEY, url TEXT, neighbors TEXT NOT NULL, kth_score REAL NOT NULL, stats TEXT NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_aggregates_url ON related_news_aggregates(url)")
+
+    def get_known_doc_ids(self) -> set[str]:
+        return {row[0] for row in self.connection.execute("SELECT doc_id FROM doc_vectors")}
+
+    def get_fingerprints(self) -> dict[str, Optional[str]]:
+        return dict(self.connection.execute("SELECT doc_id, fingerprint FROM doc_vectors"))
+
+    def add_documents(self, docs: List[dict], vectors: np.ndarray, fingerprints: List[str] = None) -> None:
+        fingerprints = fingerprints or [None] * len(docs)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO doc_vectors (doc_id, payload, vector, fingerprint) VALUES (?, ?, ?, ?)",
+                [(doc["id"], json.dumps(doc, default=str), vector.astype(np.float32).tobytes(), fingerprint)
+                 for doc, vector, fingerprint in zip(docs, vectors, fingerprints)])
+
+    def load_documents(self) -> tuple[List[dict], np.ndarray]:
+        """Load all document payloads and their vectors, in a stable order."""
+        rows = self.connection.execute("SELECT payload, vector FROM doc_vectors ORDER BY doc_id").fetchall()
+        if not rows:
+            return [], np.empty((0, 0), dtype=np.float32)
+        docs = [json.loads(payload) for payload, _ in rows]
+        vectors = np.vstack([np.frombuffer(vector, dtype=np.float32) for _, vector in rows])
+        return docs, vectors
+
+    def get_document(self, doc_id: str) -> Optional[NewsAnalysisDoc]:
+        """Stored payload of an indexed document: its analysis parameters and backtest pnl ratio."""
+        row = self.connection.execute("SELECT payload FROM doc_vectors WHERE doc_id = ?", (doc_id,)).fetchone()
+        return NewsAnalysisDoc(**json.loads(row[0])) if row else None
+
+    def remove_documents(self, doc_ids: List[str]) -> None:
+        """Drop documents deleted from the index with their own aggregates."""
+        with self.connection:
+            self.connection.executemany("DELETE FROM doc_vectors WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+        self.remove_aggregates(doc_ids)
+
+    def remove_aggregates(self, doc_ids: List[str]) -> None:
+        with self.connection:
+            self.connection.executemany("DELETE FROM related_news_aggregates WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+
+    def clear(self) -> None:
+        """Drop every document and aggregate, after the index vectors changed."""
+        with self.connection:
+            self.connection.execute("DELETE FROM doc_vectors")
+            self.connection.execute("DELETE FROM related_news_aggregates")
+
+    def get_neighbor_bounds(self, min_neighbors: int) -> dict[str, tuple[float, set[str]]]:
+        """
+        Current k-th neighbor score and neighbor ids of every aggregated document. Rows holding fewer than
+        min_neighbors neighbors (computed while the table was smaller) get -inf, so any document beats them.
+        """
+        bounds = {}
+        for doc_id, neighbors, kth_score in self.connection.execute(
+                "SELECT doc_id, neighbors, kth_score FROM related_news_aggregates"):
+            neighbor_ids = {doc["id"] for doc in json.loads(neighbors)}
+            bounds[doc_id] = (kth_score if len(neighbor_ids) >= min_neighbors else -np.inf, neighbor_ids)
+        return bounds
+
+    def save_aggregates(self, rows: List[tuple]) -> None:
+        """Rows of (doc_id, url, neighbors, kth_score, stats)."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO related_news_aggregates (doc_id, url, neighbors, kth_score, stats) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def get_by_url(self, url: str) -> Optional[tuple[List[NewsAnalysisDoc], dict]]:
+        """Key lookup of the precomputed neighbors and statistics of an indexed article."""
+        row = self.connection.execute(
+            "SELECT neighbors, stats FROM related_news_aggregates WHERE url = ? LIMIT 1", (url,)).fetchone()
+        if row is None:
+            return None
+        neighbors, stats = row
+        return [NewsAnalysisDoc(**doc) for doc in json.loads(neighbors)], json.loads(stats)
+
+
+class RelatedNewsAggregator:
+    """
+    Offline job precomputing the related news of every indexed document.
+    The index is scanned without vectors, only documents that are new or were re-indexed with different fields are
+    pulled with their vectors. Existing rows are recomputed when a changed document beats their current k-th neighbor,
+    was one of their neighbors, or when they hold fewer neighbors than the table can now provide.
+    """
+
+    FINGERPRINT_FIELDS = NEIGHBOR_FIELDS + ["content"]
+
+    def __init__(self, search_manager, store: RelatedNewsAggregateStore = None, top_k: int = Config.RELATED_NEWS_TOP_K,
+                 page_size: int = 1000, fetch_batch_size: int = 100):
+        self.search_manager = search_manager
+        self.store = store or RelatedNewsAggregateStore()
+        self.top_k = top_k
+        self.page_size = page_size
+        self.fetch_batch_size = fetch_batch_size
+
+    @staticmethod
+    def get_fingerprint(doc: dict) -> str:
+        fields = {field: doc.get(field) for field in RelatedNewsAggregator.FINGERPRINT_FIELDS}
+        return hashlib.sha1(json.dumps(fields, default=str, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _get_changed_fingerprints(self) -> tuple[dict[str, str], set[str]]:
+        """
+        Fingerprints of the indexed documents the table doesn't hold in their current version, and the ids of the
+        table no longer in the index. Vectors are not pulled.
+        """
+        known = self.store.get_fingerprints()
+        changed, seen = {}, set()
+        for page in iter_index_pages(self.search_manager.search_client, self.page_size, select=self.FINGERPRINT_FIELDS):
+            for doc in page:
+                seen.add(doc["id"])
+                fingerprint = self.get_fingerprint(doc)
+                if known.get(doc["id"]) != fingerprint:
+                    changed[doc["id"]] = fingerprint
+        return changed, set(known) - seen
+
+    def _iter_index_documents(self, doc_ids: List[str]) -> Iterator[dict]:
+        for start in range(0, len(doc_ids), self.fetch_batch_size):
+            batch = doc_ids[start:start + self.fetch_batch_size]
+            results = self.search_manager.search_client.search(
+                search_text="*", filter="search.in(id, '{}', ',')".format(",".join(batch)),
+                select=NEIGHBOR_FIELDS + ["combined_fields_vector"], top=len(batch))
+            for doc in results:
+                yield doc
+
+    def refresh(self) -> int:
+        """
+        Pull new and re-indexed documents from the index, drop the deleted ones and update the aggregates,
+        return the number pulled.
+        """
+        changed, removed = self._get_changed_fingerprints()
+        new_docs, new_vectors, new_fingerprints = [], [], []
+        for doc in self._iter_index_documents(sorted(changed)):
+            if not doc.get("combined_fields_vector"):
+                continue
+            new_vectors.append(doc.pop("combined_fields_vector"))
+            new_docs.append({field: doc.get(field) for field in NEIGHBOR_FIELDS})
+            new_fingerprints.append(changed[doc["id"]])
+
+        if not new_docs and not removed:
+            return 0
+
+        if new_docs:
+            self.store.add_documents(new_docs, np.asarray(new_vectors, dtype=np.float32), new_fingerprints)
+        self.store.remove_documents(sorted(removed))
+        docs, vectors = self.store.load_documents()
+        # removed ids count as changed so the rows listing them as a neighbor are recomputed
+        self._update_aggregates(docs, vectors, {doc["id"] for doc in new_docs} | removed)
+        print(f"Related news aggregates refreshed with {len(new_docs)} new or re-indexed documents, "
+              f"{len(removed)} removed.")
+        return len(new_docs)
+
+    def rebuild(self) -> None:
+        """Recompute the aggregates of every document in the table."""
+        docs, vectors = self.store.load_documents()
+        self._update_aggregates(docs, vectors, {doc["id"] for doc in docs})
+
+    def _update_aggregates(self, docs: List[dict], vectors: np.ndarray, changed_ids: set[str], batch_size: int = 512):
+        k = min(self.top_k, len(docs) - 1)
+        if k <= 0:
+            # a single document left has no neighbors, its row may still list removed ones
+            self.store.remove_aggregates([doc["id"] for doc in docs])
+            return
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        normalized = vectors / np.where(norms == 0, 1, norms)
+        ids = [doc["id"] for doc in docs]
+        changed_rows = np.array([i for i, doc_id in enumerate(ids) if doc_id in changed_ids], dtype=int)
+
+        # an existing row changes when a changed document scores above its k-th neighbor or was one of its neighbors
+        bounds = self.store.get_neighbor_bounds(k)
+        stale_rows = [i for i, doc_id in enumerate(ids) if doc_id not in changed_ids]
+        if stale_rows and len(changed_rows):
+            best_changed = (normalized[stale_rows] @ normalized[changed_rows].T).max(axis=1)
+            stale_rows = [row for row, score in zip(stale_rows, best_changed)
+                          if ids[row] not in bounds or score > bounds[ids[row]][0]
+                          or not changed_ids.isdisjoint(bounds[ids[row]][1])]
+        else:
+            stale_rows = [row for row in stale_rows if ids[row] not in bounds or bounds[ids[row]][0] == -np.inf
+                          or not changed_ids.isdisjoint(bounds[ids[row]][1])]
+        rows_to_update = np.concatenate([changed_rows, np.array(stale_rows, dtype=int)])
+
+        for start in range(0, len(rows_to_update), batch_size):
+            batch = rows_to_update[start:start + batch_size]
+            scores = normalized[batch] @ normalized.T
+            scores[np.arange(len(batch)), batch] = -np.inf  # a document is not its own neighbor
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            aggregate_rows = []
+            for i, row in enumerate(batch):
+                order = top[i][np.argsort(-scores[i, top[i]])]
+                neighbors = [docs[j] for j in order]
+                aggregate_rows.append((
+                    ids[row], docs[row].get("url"),
+                    json.dumps(neighbors, default=str),
+                    float(scores[i, order[-1]]),
+                    json.dumps(self.calculate_stats(neighbors)),
+                ))
+            self.store.save_aggregates(aggregate_rows)
+
+    @staticmethod
+    def calculate_stats(neighbors: List[dict]) -> dict:
+        complete = [NewsAnalysisDoc(**doc) for doc in neighbors
+                    if doc.get("pnl_ratio") is not None and doc.get("impact_days_min") is not None
+                    and doc.get("impact_days_max") is not None]
+        if not complete:
+            return {}
+        return LLMTextComposer.calculate_related_news_pnl_ratio(complete)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    from embedding_kits.stock_news_embedding import AzureSearchManager
+
+    aggregator = RelatedNewsAggregator(AzureSearchManager())
+    aggregator.refresh()
@@ -1,40 +1,93 @@
 import json
+from typing import Iterator, List
 
 import dotenv
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
 from azure.search.documents._generated.models import VectorizedQuery
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes._generated.models import HnswAlgorithmConfiguration
 from azure.search.documents.indexes.models import (
     SearchIndex, SearchField, SearchFieldDataType, VectorSearch, VectorSearchProfile,
-    SemanticConfiguration, SemanticPrioritizedFields, SemanticField, SemanticSearch, SimpleField
+    SemanticConfiguration, SemanticPrioritizedFields, SemanticField, SemanticSearch, SimpleField,
+    ScalarQuantizationCompression, BinaryQuantizationCompression
 )
 from llama_index.embeddings.ollama import OllamaEmbedding
 
+from common.instrumentation import instrumentation
+from common.logger import configure_logging, get_logger
+from common.single_flight import SingleFlight
 from config import Config
+from embedding_kits.index_versions import get_index_registry, get_index_signature
+from embedding_kits.lexical_index import get_lexical_index
 from embedding_kits.model_news_impact_analysis import NewsAnalysisDoc
+from embedding_kits.vector_compression import COMPRESSION_BINARY, COMPRESSION_SCALAR, get_index_dimensions, reduce_vector
+from llm_backends.text_preparation import aembed_text, embed_text
 from new_analyzer.model_news_impact_analysis_result import NewsImpactAnalysisResult
 from news_downloader.model_news_article import NewsArticle
 from news_downloader.model_news_article_na import NewsAPIArticle
 from stock_price.back_tester import BacktestResult
 from stock_price.trading_date_calculator import TradingHourStatus
 
+logger = get_logger(__name__)
+
+
+def iter_index_pages(search_client, page_size: int, after_id: str = None, select: List[str] = None) -> Iterator[List[dict]]:
+    """Documents in key order after after_id, paged by key so scans aren't capped by the search skip limit."""
+    last_id = after_id
+    while True:
+        results = list(search_client.search(search_text="*", filter="id gt '{}'".format(last_id.replace("'", "''")) if last_id else None,
+                                            order_by=["id asc"], top=page_size, select=select))
+        if not results:
+            return
+        yield [{key: value for key, value in doc.items() if not key.startswith("@")} for doc in results]
+        last_id = results[-1]["id"]
+
+
 
 class AzureSearchManager:
+    _search_flight = SingleFlight("related_news_search")  # shared by all instances, feeders create a manager per worker
+
     def __init__(self, endpoint=Config.AZURE_SEARCH_ENDPOINT, key=Config.AZURE_SEARCH_KEY, index_name=Config.AZURE_SEARCH_INDEX):
-        self.index_name = index_name
+        # index_name is an alias of the index versions (see embedding_kits/index_versions.py) or an index name
+        self.alias = index_name
+        self.index_name = get_index_registry().resolve(index_name)
+        self.endpoint = endpoint
+        self.credential = AzureKeyCredential(key)
+        self._async_search_client = None  # created on first use, bound to the event loop of the caller
         self.index_client = SearchIndexClient(endpoint=endpoint, credential=AzureKeyCredential(key))
-        self.search_client = SearchClient(endpoint=endpoint, index_name=index_name, credential=AzureKeyCredential(key))
-        self.embedding_model = OllamaEmbedding(model_name=Config.OLLAMA_MODEL_EMBEDDING)
+        self.search_client = SearchClient(endpoint=endpoint, index_name=self.index_name, credential=AzureKeyCredential(key))
         self.ensure_index_exists()
+        self.embedding_model = OllamaEmbedding(model_name=self.get_embedding_model_name())
 
     def ensure_index_exists(self):
-        """Ensure that the search index exists, otherwise create it."""
+        """Ensure that the search index exists, otherwise create it and register it as a version of the alias."""
         try:
             self.index_client.get_index(self.index_name)
         except Exception:
             self.create_index()
+            get_index_registry().register(self.alias, self.index_name, get_index_signature())
+
+    def get_embedding_model_name(self) -> str:
+        """
+        Embedding model the index was built with, query vectors must come from it even when the configuration
+        already names the model of the next version. Indexes created before versioning use the configured one.
+        """
+        version = get_index_registry().get_version(self.index_name)
+        if version is None:
+            return Config.OLLAMA_MODEL_EMBEDDING
+        signature = get_index_signature()
+        if version["signature"] != signature:
+            logger.warning("Index %s was built with %s but the configuration is %s, embedding with %s until "
+                           "python -m embedding_kits.index_versions migrate", self.index_name, version["signature"],
+                           signature, version["signature"]["embedding_model"])
+        return version["signature"]["embedding_model"]
+
+    def get_signature(self) -> dict:
+        """Signature the index was built with, indexes created before versioning are on the configured one."""
+        version = get_index_registry().get_version(self.index_name)
+        return version["signature"] if version else get_index_signature()
 
     def create_index(self):
         """Creates an Azure AI Search index with vector search support."""
@@ -68,13 +121,16 @@ class AzureSearchManager:
             SearchField(name="combined_fields_vector",
                         searchable=True,
                         type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
-                        vector_search_dimensions=4096,
+                        vector_search_dimensions=get_index_dimensions(),
                         vector_search_profile_name="vector-config")
         ]
 
+        compressions = self._get_vector_compressions()
         vector_config = VectorSearch(
-            profiles=[VectorSearchProfile(name="vector-config", algorithm_configuration_name="algorithms-config")],
+            profiles=[VectorSearchProfile(name="vector-config", algorithm_configuration_name="algorithms-config",
+                                          compression_name=compressions[0].compression_name if compressions else None)],
             algorithms=[HnswAlgorithmConfiguration(name="algorithms-config")],
+            compressions=compressions,
         )
 
         semantic_config = SemanticConfiguration(
@@ -88,22 +144,38 @@ class AzureSearchManager:
 
         index = SearchIndex(name=self.index_name, fields=fields, vector_search=vector_config, semantic_search=semantic_search)
         self.index_client.create_index(index)
-        print(f"✅ Successfully created Azure Search index: {self.index_name}")
+        logger.info("Created Azure Search index %s", self.index_name)
+
+    @staticmethod
+    def _get_vector_compressions() -> list:
+        """Quantized HNSW graph, the full precision vectors stay in the index to rescore the oversampled candidates."""
+        if Config.VECTOR_COMPRESSION == COMPRESSION_SCALAR:
+            return [ScalarQuantizationCompression(compression_name="vector-compression", rerank_with_original_vectors=True,
+                                                  default_oversampling=Config.VECTOR_OVERSAMPLING)]
+        if Config.VECTOR_COMPRESSION == COMPRESSION_BINARY:
+            return [BinaryQuantizationCompression(compression_name="vector-compression", rerank_with_original_vectors=True,
+                                                  default_oversampling=Config.VECTOR_OVERSAMPLING)]
+        return []
 
+    @instrumentation.traced("search.embedding")
     def generate_embedding(self, text: str):
-        """Generate embedding for a given text using Ollama and LlamaIndex."""
-        embedding = self.embedding_model.get_text_embedding(text)
+        """Generate embedding for a given text using Ollama and LlamaIndex, long texts are embedded in chunks and reduced like the index."""
+        embedding = reduce_vector(embed_text(self.embedding_model, text))
         return embedding  # Ensuring consistency between vector and embedding
 
+    @instrumentation.traced("search.embedding")
+    async def agenerate_embedding(self, text: str):
+        """generate_embedding with the async embedding calls."""
+        return reduce_vector(await aembed_text(self.embedding_model, text))
+
+    @instrumentation.traced("search.insert")
     def insert_document(self, sector: str, ticker: str, article: NewsArticle, trading_hour_status: TradingHourStatus, analysis_result: NewsImpactAnalysisResult, backtest_result: BacktestResult):
         """Insert document into Azure AI Search with vector embedding."""
         embedding = self.generate_embedding(article.get_content_for_embedding())
-        total_count = self.get_total_document_count()
-
-        doc_id = f"doc_{total_count + 1}"
 
         if isinstance(article, NewsAPIArticle):
             article: NewsAPIArticle = article
+            doc_id = article.get_document_id(ticker)
 
             doc = {
                 "@search.action": "mergeOrUpload",
@@ -134,20 +206,60 @@ class AzureSearchManager:
                 "combined_fields_vector": embedding  # Using the embedding for vector field
             }
             self.search_client.upload_documents(documents=[doc])
-            print(f"Inserted document {doc_id} into Azure AI Search.")
+            lexical_index = get_lexical_index()
+            if lexical_index is not None:
+                lexical_index.add_documents([doc])
+            logger.debug("Inserted document %s into %s", doc_id, self.index_name)
 
     def search_similar_documents(self, query: str, top_k: int = 5):
         """Search for similar documents using vector search in Azure AI Search."""
+        return self._search_flight.do_sync((self.index_name, query, top_k), lambda: self._search_similar_documents(query, top_k))
+
+    @instrumentation.traced("search.vector_search")
+    def _search_similar_documents(self, query: str, top_k: int):
         v_search_vector = VectorizedQuery(vector=self.generate_embedding(query), k_nearest_neighbors=top_k, fields="combined_fields_vector")
 
         results = self.search_client.search(
             search_text="*",
             vector_queries=[v_search_vector],
             include_total_count=True,
+            top=top_k,
         )
 
         return [NewsAnalysisDoc(**doc) for doc in results]
 
+    async def asearch_similar_documents(self, query: str, top_k: int = 5):
+        """
+        search_similar_documents on the async clients, the event loop is free during the embedding and search
+        round trips. Cancelling the caller (e.g. a timeout) cancels the requests.
+        """
+        return await self._search_flight.do((self.index_name, query, top_k), lambda: self._asearch_similar_documents(query, top_k))
+
+    @instrumentation.traced("search.vector_search")
+    async def _asearch_similar_documents(self, query: str, top_k: int):
+        if self._async_search_client is None:
+            self._async_search_client = AsyncSearchClient(endpoint=self.endpoint, index_name=self.index_name, credential=self.credential)
+        v_search_vector = VectorizedQuery(vector=await self.agenerate_embedding(query), k_nearest_neighbors=top_k, fields="combined_fields_vector")
+
+        results = await self._async_search_client.search(
+            search_text="*",
+            vector_queries=[v_search_vector],
+            include_total_count=True,
+            top=top_k,
+        )
+
+        return [NewsAnalysisDoc(**doc) async for doc in results]
+
+    def export_snapshot(self, path: str = Config.SNAPSHOT_PATH) -> dict:
+        """Dump every document with its vector to a local snapshot, see embedding_kits/index_snapshot.py."""
+        from embedding_kits.index_snapshot import export_snapshot
+        return export_snapshot(self, path)
+
+    def import_snapshot(self, path: str = Config.SNAPSHOT_PATH) -> int:
+        """Bulk load a snapshot into this index with parallel batched uploads."""
+        from embedding_kits.index_snapshot import import_snapshot
+        return import_snapshot(self, path, lexical_index=get_lexical_index())
+
     def get_total_document_count(self):
         """Get the total count of documents in the index."""
         results = self.search_client.search(search_text="*", include_total_count=True)
@@ -155,6 +267,7 @@ class AzureSearchManager:
 
 
 if __name__ == "__main__":
+    configure_logging()
     dotenv.load_dotenv()
     azure_search = AzureSearchManager(Config.AZURE_SEARCH_ENDPOINT, Config.AZURE_SEARCH_KEY, Config.AZURE_SEARCH_INDEX)
     # azure_search.insert_document(
@@ -1,12 +1,22 @@
+import asyncio
+import weakref
 from typing import Optional, List
 
 from semantic_kernel.functions.kernel_function_decorator import kernel_function
 
+from common.instrumentation import instrumentation
+from config import Config
+from embedding_kits.lexical_index import HybridRetriever, get_lexical_index
 from embedding_kits.model_news_impact_analysis import NewsAnalysisDoc
+from embedding_kits.related_news_aggregates import RelatedNewsAggregateStore
 from embedding_kits.stock_news_embedding import AzureSearchManager
+from news_downloader.near_duplicate_detector import NearDuplicateDetector
 
 
 class RelatedNewsPlugin:
+    _aggregate_store = None
+    _duplicate_detector = None
+    _search_managers = weakref.WeakKeyDictionary()  # event loop -> AzureSearchManager, its async clients are bound to the loop
 
     @kernel_function(name="get_related_stock_news", description="According to the summery provided to get related stock news."
                                                                 "Parameters:"
@@ -20,7 +30,52 @@ class RelatedNewsPlugin:
     @staticmethod
     async def get_related_stock_news_wrapper(news_summery: str, ticker: str = None) -> Optional[List[NewsAnalysisDoc]]:
         # TODO: add ticker to the search filter, or do the logic later after search
-        azure_search_manager = AzureSearchManager()
-        results = azure_search_manager.search_similar_documents(query=news_summery)
+        retriever = HybridRetriever(RelatedNewsPlugin._get_search_manager(), get_lexical_index())
+        return await retriever.search(news_summery)
 
-        return results
+    @staticmethod
+    def _get_search_manager() -> AzureSearchManager:
+        """One manager per event loop, concurrent sessions share its async search and embedding clients."""
+        loop = asyncio.get_running_loop()
+        if loop not in RelatedNewsPlugin._search_managers:
+            RelatedNewsPlugin._search_managers[loop] = AzureSearchManager()
+        return RelatedNewsPlugin._search_managers[loop]
+
+    @staticmethod
+    def _get_aggregate_store() -> RelatedNewsAggregateStore:
+        if RelatedNewsPlugin._aggregate_store is None:
+            RelatedNewsPlugin._aggregate_store = RelatedNewsAggregateStore()
+        return RelatedNewsPlugin._aggregate_store
+
+    @staticmethod
+    def _get_duplicate_detector() -> NearDuplicateDetector:
+        if RelatedNewsPlugin._duplicate_detector is None:
+            RelatedNewsPlugin._duplicate_detector = NearDuplicateDetector()
+        return RelatedNewsPlugin._duplicate_detector
+
+    @staticmethod
+    def get_precomputed_related_news(url: str) -> Optional[tuple[List[NewsAnalysisDoc], dict]]:
+        """Related news and pnl statistics of an already indexed article, None when it is not precomputed."""
+        if not url:
+            return None
+        precomputed = RelatedNewsPlugin._get_aggregate_store().get_by_url(url)
+        if precomputed is None and Config.NEAR_DUPLICATE_ENABLED:
+            # near duplicates are not indexed themselves, they share the results of their cluster's representative
+            representative_url = RelatedNewsPlugin._get_duplicate_detector().get_representative_url(url)
+            if representative_url and representative_url != url:
+                precomputed = RelatedNewsPlugin._get_aggregate_store().get_by_url(representative_url)
+        instrumentation.record_cache("related_news_precomputed", precomputed is not None)
+        return precomputed
+
+    @staticmethod
+    def get_precomputed_analysis(url: str) -> Optional[NewsAnalysisDoc]:
+        """
+        Indexed analysis and backtest of the article, or of its cluster's representative for a near duplicate,
+        None when neither was indexed.
+        """
+        if not url or not Config.NEAR_DUPLICATE_ENABLED:
+            return None
+        doc_id = RelatedNewsPlugin._get_duplicate_detector().get_document_id(url)
+        indexed = RelatedNewsPlugin._get_aggregate_store().get_document(doc_id) if doc_id else None
+        instrumentation.record_cache("indexed_analysis", indexed is not None)
+        return indexed
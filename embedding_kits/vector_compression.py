@@ -0,0 +1,186 @@
+import argparse
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from common.logger import configure_logging
+from config import Config
+
+EMBEDDING_DIMENSIONS = 4096
+COMPRESSION_NONE = "none"
+COMPRESSION_SCALAR = "scalar"
+COMPRESSION_BINARY = "binary"
+REDUCTION_NONE = "none"
+REDUCTION_PCA = "pca"
+REDUCTION_TRUNCATE = "truncate"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class ScalarQuantizer:
+    """
+    int8 codes with a per-dimension [min, max] range, 4x smaller than float32.
+    Dot products are computed on the codes: q . x ~= q . low + (q * scale) . code.
+    """
+    name = COMPRESSION_SCALAR
+
+    def __init__(self):
+        self.low = None
+        self.scale = None
+
+    def fit(self, vectors: np.ndarray) -> "ScalarQuantizer":
+        self.low = vectors.min(axis=0).astype(np.float32)
+        self.scale = np.maximum((vectors.max(axis=0) - self.low) / 255, 1e-12).astype(np.float32)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint((vectors - self.low) / self.scale), 0, 255).astype(np.uint8)
+
+    def score(self, query: np.ndarray, codes: np.ndarray, batch_size: int = 1024) -> np.ndarray:
+        offset = float(query @ self.low)
+        weights = (query * self.scale).astype(np.float32)
+        return np.concatenate([codes[start:start + batch_size].astype(np.float32) @ weights + offset
+                               for start in range(0, len(codes), batch_size)]) if len(codes) else np.empty(0, np.float32)
+
+    @staticmethod
+    def get_bytes_per_vector(dimensions: int) -> int:
+        return dimensions
+
+
+class BinaryQuantizer:
+    """One sign bit per dimension, 32x smaller than float32, scored by the Hamming distance of the packed bits."""
+    name = COMPRESSION_BINARY
+
+    def fit(self, vectors: np.ndarray) -> "BinaryQuantizer":
+        return self
+
+    @staticmethod
+    def encode(vectors: np.ndarray) -> np.ndarray:
+        return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+    def score(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Higher is closer, the number of matching signs."""
+        mismatches = np.bitwise_count(np.bitwise_xor(codes, self.encode(query))).sum(axis=1, dtype=np.int32)
+        return (codes.shape[1] * 8 - mismatches).astype(np.float32)
+
+    @staticmethod
+    def get_bytes_per_vector(dimensions: int) -> int:
+        return (dimensions + 7) // 8
+
+
+def make_quantizer(compression: str):
+    """None for full precision vectors."""
+    if compression == COMPRESSION_SCALAR:
+        return ScalarQuantizer()
+    if compression == COMPRESSION_BINARY:
+        return BinaryQuantizer()
+    if compression != COMPRESSION_NONE:
+        raise ValueError(f"Unknown vector compression: {compression}")
+    return None
+
+
+def search_compressed(query: np.ndarray, codes: np.ndarray, quantizer, vectors: np.ndarray, top_k: int,
+                      oversampling: float = Config.VECTOR_OVERSAMPLING) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Top top_k * oversampling candidates on the codes, rescored with the full precision vectors.
+    Returns the row indexes and exact scores of the top_k, best first.
+    """
+    candidate_count = min(len(codes), max(top_k, int(np.ceil(top_k * oversampling))))
+    approximate = quantizer.score(query, codes)
+    candidates = np.argpartition(-approximate, candidate_count - 1)[:candidate_count]
+    exact = vectors[candidates] @ query
+    order = np.argsort(-exact)[:top_k]
+    return candidates[order], exact[order]
+
+
+class PCAReducer:
+    """Projection on the top principal components of a sample of stored vectors, outputs are re-normalized."""
+    name = REDUCTION_PCA
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray):
+        self.mean = mean
+        self.components = components
+        self.dimensions = components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dimensions: int) -> "PCAReducer":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        mean = vectors.mean(axis=0)
+        _, _, components = np.linalg.svd(vectors - mean, full_matrices=False)
+        if components.shape[0] < dimensions:
+            raise ValueError(f"PCA to {dimensions} dimensions needs at least {dimensions} vectors, got {len(vectors)}")
+        return cls(mean, components[:dimensions].astype(np.float32))
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        return _normalize((np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T)
+
+    def save(self, path: str = Config.VECTOR_PCA_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path: str = Config.VECTOR_PCA_PATH) -> "PCAReducer":
+        with np.load(path) as data:
+            return cls(data["mean"], data["components"])
+
+
+class TruncationReducer:
+    """First dimensions of the vector, re-normalized. Only meaningful for Matryoshka-trained embedding models."""
+    name = REDUCTION_TRUNCATE
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        return _normalize(np.asarray(vectors, dtype=np.float32)[..., :self.dimensions])
+
+
+@lru_cache(maxsize=1)
+def get_vector_reducer():
+    """Reducer configured by VECTOR_REDUCTION, None when vectors keep the full embedding dimensions."""
+    if Config.VECTOR_REDUCTION == REDUCTION_PCA:
+        return PCAReducer.load(Config.VECTOR_PCA_PATH)
+    if Config.VECTOR_REDUCTION == REDUCTION_TRUNCATE:
+        return TruncationReducer(Config.VECTOR_DIMENSIONS)
+    if Config.VECTOR_REDUCTION != REDUCTION_NONE:
+        raise ValueError(f"Unknown vector reduction: {Config.VECTOR_REDUCTION}")
+    return None
+
+
+def get_index_dimensions() -> int:
+    reducer = get_vector_reducer()
+    return reducer.dimensions if reducer else EMBEDDING_DIMENSIONS
+
+
+def reduce_vector(vector) -> list[float]:
+    """Embedding as stored in and queried against the index."""
+    reducer = get_vector_reducer()
+    return vector if reducer is None else reducer.transform(vector).tolist()
+
+
+def main():
+    from embedding_kits.related_news_aggregates import RelatedNewsAggregateStore
+
+    parser = argparse.ArgumentParser(description="Fit the PCA projection of the news embeddings.")
+    parser.add_argument("--dimensions", type=int, default=Config.VECTOR_DIMENSIONS)
+    parser.add_argument("--sample", type=int, default=20000, help="max vectors used for the fit")
+    args = parser.parse_args()
+
+    # the related news table mirrors the full precision vectors of the index
+    _, vectors = RelatedNewsAggregateStore().load_documents()
+    if len(vectors) > args.sample:
+        vectors = vectors[np.random.default_rng(0).choice(len(vectors), args.sample, replace=False)]
+    reducer = PCAReducer.fit(vectors, args.dimensions)
+    explained = np.linalg.norm((vectors - reducer.mean) @ reducer.components.T) ** 2 / np.linalg.norm(vectors - reducer.mean) ** 2
+    reducer.save(Config.VECTOR_PCA_PATH)
+    print(f"PCA {vectors.shape[1]} -> {args.dimensions} dimensions fitted on {len(vectors)} vectors, "
+          f"{explained:.1%} variance kept, saved to {Config.VECTOR_PCA_PATH}")
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
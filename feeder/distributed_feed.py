@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+
+import pandas as pd
+
+from common.instrumentation import instrumentation
+from common.logger import configure_logging, get_logger
+from common.ticker_registry import TickerRegistry, get_ticker_registry
+from common.work_queue import SQLiteWorkQueue, WorkUnit
+from config import Config, DataFeedConfig
+from embedding_kits.related_news_aggregates import RelatedNewsAggregator
+from embedding_kits.stock_news_embedding import AzureSearchManager
+from feeder.news_price_data_feeder import feed_articles
+from new_analyzer.news_analyzer import NewsAnalyzer
+from new_analyzer.relevance_filter import RelevanceFilter
+from news_downloader.near_duplicate_detector import NearDuplicateDetector
+from news_downloader.news_downloader_na import NewsCache
+from stock_price.intraday_price_store import IntradayPriceStore
+from stock_price.price_panel import PricePanel
+
+logger = get_logger(__name__)
+
+
+def make_work_units(companies: TickerRegistry, date_from: str, date_to: str, window_days: int = Config.FEED_WINDOW_DAYS) -> list[tuple[str, dict]]:
+    """One (ticker, date window) unit per key, windows are contiguous and don't overlap."""
+    window_starts = pd.date_range(date_from, date_to, freq=f"{window_days}D", inclusive="left")
+    units = []
+    for ticker in companies:
+        for window_start in window_starts:
+            window_end = min(window_start + pd.Timedelta(days=window_days) - pd.Timedelta(seconds=1), pd.Timestamp(date_to))
+            payload = {"ticker": ticker, "from_date": window_start.strftime("%Y-%m-%d %H:%M:%S"),
+                       "to_date": window_end.strftime("%Y-%m-%d %H:%M:%S")}
+            units.append((f"{ticker}:{payload['from_date']}:{payload['to_date']}", payload))
+    return units
+
+
+async def _keep_lease(queue: SQLiteWorkQueue, unit: WorkUnit):
+    while True:
+        await asyncio.sleep(queue.visibility_timeout / 3)
+        if not queue.extend_lease(unit):
+            logger.warning("Lost the lease of %s", unit.key)
+            return
+
+
+async def run_worker(queue: SQLiteWorkQueue, worker_id: str, search_manager=None, news_cache: NewsCache = None,
+                     news_analyzer: NewsAnalyzer = None, companies: TickerRegistry = None, exit_when_drained: bool = True,
+                     poll_interval: float = 2.0) -> int:
+    """
+    Lease, process and ack units until the queue is drained (or forever), returns the number of acked units.
+    Dependencies default to the live services like start_data_feed.
+    """
+    search_manager = search_manager or AzureSearchManager(Config.AZURE_SEARCH_ENDPOINT, Config.AZURE_SEARCH_KEY, Config.AZURE_SEARCH_INDEX)
+    news_analyzer = news_analyzer or NewsAnalyzer()
+    news_cache = news_cache or NewsCache()
+    companies = companies if companies is not None else get_ticker_registry()
+    intraday_store = IntradayPriceStore()
+    price_panel = PricePanel.load()
+    duplicate_detector = NearDuplicateDetector() if Config.NEAR_DUPLICATE_ENABLED else None
+    relevance_filter = RelevanceFilter() if Config.RELEVANCE_FILTER_ENABLED else None
+
+    acked = 0
+    while True:
+        unit = queue.lease(worker_id)
+        if unit is None:
+            if exit_when_drained and queue.is_drained():
+                return acked
+            await asyncio.sleep(poll_interval)
+            continue
+
+        heartbeat = asyncio.create_task(_keep_lease(queue, unit))
+        started = time.perf_counter()
+        try:
+            ticker = unit.payload["ticker"]
+            articles = news_cache.load_from_cache(ticker, from_date=unit.payload["from_date"], to_date=unit.payload["to_date"])
+            indexed_count = 0
+            if articles:
+                indexed_count = await feed_articles(ticker, companies[ticker].sector, articles, search_manager, news_analyzer,
+                                                    intraday_store, price_panel, duplicate_detector,
+                                                    relevance_filter)
+        except Exception:
+            logger.exception("Work unit %s failed (attempt %s)", unit.key, unit.attempts)
+            queue.fail(unit, traceback.format_exc())
+            instrumentation.increment("work_queue_units_total", status="failed")
+            continue
+        finally:
+            heartbeat.cancel()
+
+        if queue.ack(unit):
+            acked += 1
+            instrumentation.increment("work_queue_units_total", status="done")
+            logger.info("Work unit done", extra={"fields": {"unit": unit.key, "indexed": indexed_count, "worker": worker_id,
+                                                             "seconds": round(time.perf_counter() - started, 3)}})
+        else:
+            logger.warning("Work unit %s finished after its lease expired", unit.key)
+
+
+def _worker_process(worker_index: int, db_path: str, exit_when_drained: bool) -> int:
+    configure_logging()  # spawned processes don't run the __main__ block
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{worker_index}"
+    queue = SQLiteWorkQueue(db_path)
+    try:
+        return asyncio.run(run_worker(queue, worker_id, exit_when_drained=exit_when_drained))
+    finally:
+        queue.close()
+
+
+def print_status(queue: SQLiteWorkQueue) -> None:
+    stats = queue.get_stats()
+    total = sum(stats.values())
+    done_ratio = stats["done"] / total if total else 0
+    print(f"{queue.db_path} [{queue.queue_name}]: " + ", ".join(f"{status} {count}" for status, count in stats.items())
+          + f" ({done_ratio:.1%} done)")
+    for key, attempts, error in queue.get_failures():
+        last_line = (error or "").strip().splitlines()[-1] if error else ""
+        print(f"  FAILED {key} after {attempts} attempts: {last_line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the news feed as (ticker, date window) units over a durable work queue.")
+    parser.add_argument("--db", default=Config.WORK_QUEUE_DB, help="work queue sqlite file, shared by all workers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordinator = commands.add_parser("coordinator", help="enqueue the work units")
+    coordinator.add_argument("--from-date", default=DataFeedConfig.EMBEDDING_DATE_FROM)
+    coordinator.add_argument("--to-date", default=DataFeedConfig.EMBEDDING_DATE_TO)
+    coordinator.add_argument("--window-days", type=int, default=Config.FEED_WINDOW_DAYS)
+    coordinator.add_argument("--wait", action="store_true", help="report progress until drained, then refresh related news")
+
+    worker = commands.add_parser("worker", help="process units until the queue is drained")
+    worker.add_argument("--processes", type=int, default=1, help="worker processes on this host")
+    worker.add_argument("--forever", action="store_true", help="keep polling when the queue is drained")
+
+    status = commands.add_parser("status", help="show progress and failures")
+    status.add_argument("--requeue-failed", action="store_true", help="retry the failed units")
+
+    args = parser.parse_args()
+    queue = SQLiteWorkQueue(args.db)
+
+    if args.command == "coordinator":
+        added = queue.enqueue(make_work_units(get_ticker_registry(), args.from_date, args.to_date, args.window_days))
+        print(f"Enqueued {added} new work units")
+        if args.wait:
+            while not queue.is_drained():
+                print_status(queue)
+                time.sleep(10)
+            print_status(queue)
+            RelatedNewsAggregator(AzureSearchManager()).refresh()
+
+    elif args.command == "worker":
+        if args.processes == 1:
+            instrumentation.start_metrics_server()
+            print(f"Acked {_worker_process(0, args.db, not args.forever)} work units")
+        else:
+            with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+                acked = pool.starmap(_worker_process, [(i, args.db, not args.forever) for i in range(args.processes)])
+            print(f"Acked {sum(acked)} work units")
+
+    else:
+        if args.requeue_failed:
+            print(f"Requeued {queue.requeue_failed()} failed units")
+        print_status(queue)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
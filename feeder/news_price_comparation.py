@@ -4,24 +4,29 @@ from typing import List, Optional
 
 import pandas as pd
 import pytz
-import semantic_kernel.connectors.ai.open_ai as sk_oai  # noqa: F401
 from semantic_kernel import Kernel
 from semantic_kernel.connectors.ai import PromptExecutionSettings, FunctionChoiceBehavior
-from semantic_kernel.connectors.ai.ollama import OllamaChatCompletion
 from semantic_kernel.contents import ChatHistory
 
-from config import Config, significant_companies, DataFeedConfig
+from common.logger import configure_logging, get_logger
+from common.ticker_registry import get_ticker_registry
+from config import Config, DataFeedConfig
 from embedding_kits.stock_news_embedding import AzureSearchManager
 from embedding_kits.stock_news_embedding_plugin import RelatedNewsPlugin
+from llm_backends.chat_completion_factory import create_chat_service_for_chat, create_chat_service_for_feed
 from new_analyzer.model_news_impact_analysis_result import NewsImpactAnalysisResult
 from new_analyzer.stock_news_analysis_plugin import StockNewsAnalysisPlugin
 from news_downloader.model_news_article_na import NewsAPIArticle
 from news_downloader.news_downloader_na import NewsAPIClient
 from stock_price.back_tester import BacktestRunner, BacktestResult
+from stock_price.intraday_price_store import IntradayPriceStore
+from stock_price.price_panel import PricePanel
 from stock_price.stock_price_data_downloader import StockPriceDataDownloader
 from stock_price.trading_date_calculator import TradingDateCalculator
 from ui.text_composer import LLMTextComposer
 
+logger = get_logger(__name__)
+
 
 class StockAnalysisResultCollectionItem:
     def __init__(self, ticker: str, news_article: NewsAPIArticle, pre_analysis_result: NewsImpactAnalysisResult, rag_analysis_result: NewsImpactAnalysisResult,
@@ -39,24 +44,16 @@ class ChatbotPerformanceComparison:
         self.azure_search = AzureSearchManager(Config.AZURE_SEARCH_ENDPOINT, Config.AZURE_SEARCH_KEY, Config.AZURE_SEARCH_INDEX)
 
         self.api_client = NewsAPIClient()
+        self.intraday_store = IntradayPriceStore()
+        self.price_panel = PricePanel.load()
 
         self.gradio_chat_history = []
 
         # SK initialization
         self.kernel = Kernel()
-        self.chat_completion_service_open_ai = sk_oai.AzureChatCompletion(
-            service_id="default",
-            deployment_name=Config.aoi_deployment_name,
-            api_key=Config.aoi_api_key,
-            endpoint=Config.aoi_endpoint,
-            api_version=Config.aoi_api_version,
-        )
+        self.chat_completion_service_open_ai = create_chat_service_for_chat(service_id="default")
 
-        self.chat_completion_service = OllamaChatCompletion(
-            service_id="ollama",
-            # ai_model_id="aratan/mistral-small-3.1:24b",
-            ai_model_id="llama3.2",
-        )
+        self.chat_completion_service = create_chat_service_for_feed()
         # Message call settings
         self.sk_chat_history = ChatHistory()
 
@@ -81,7 +78,7 @@ class ChatbotPerformanceComparison:
 
         ######## (1) gethering news
         news_data = {}
-        for company_ticker, company_info in list(significant_companies.items()):
+        for company_ticker in get_ticker_registry():
             news_data[company_ticker] = self.api_client.cache.load_from_cache(company_ticker, from_date=DataFeedConfig.EMBEDDING_DATE_FROM, to_date=DataFeedConfig.EMBEDDING_DATE_TO)
 
         ######## (2) analysis incoming news (pre-analysis)
@@ -103,24 +100,27 @@ class ChatbotPerformanceComparison:
                     settings=self._get_pe_settings(included_plugins=["StockNewsAnalysisPlugin"], included_function=["analyze_stock_news"], auto_invoke=False),
                     kernel=self.kernel
                 )
-                pre_analysis_result_str = pre_analysis_parameter_response.items[0].arguments
+                pre_analysis_result_str = pre_analysis_parameter_response.items[0].parse_arguments()
                 pre_analysis_result = NewsImpactAnalysisResult.from_dict(pre_analysis_result_str)
 
-                print("\n\n", "parameters:", pre_analysis_result_str, "\n\n--------\n\n")
+                logger.debug("parameters: %s", pre_analysis_result_str)
                 self.sk_chat_history.clear()
 
                 ######## (3) retrieve related news analysis
-                if pre_analysis_result:
-                    if pre_analysis_result.news_summery:
-                        index_search_result = await RelatedNewsPlugin.get_related_stock_news_wrapper(pre_analysis_result.news_summery)
-                    else:
-                        index_search_result = await RelatedNewsPlugin.get_related_stock_news_wrapper(article.get_content_for_llm())
-                else:
-                    print("ERROR: Can't analysis the news.", '\n')
+                precomputed_related_news = RelatedNewsPlugin.get_precomputed_related_news(article.url)
+                if not pre_analysis_result:
+                    logger.error("Can't analysis the news: %s", article.url)
                     # TODO: add a fail record
                     continue
+                elif precomputed_related_news:
+                    index_search_result, related_news_pnl_ratio = precomputed_related_news
+                elif pre_analysis_result.news_summery:
+                    index_search_result = await RelatedNewsPlugin.get_related_stock_news_wrapper(pre_analysis_result.news_summery)
+                else:
+                    index_search_result = await RelatedNewsPlugin.get_related_stock_news_wrapper(article.get_content_for_llm())
 
-                related_news_pnl_ratio = LLMTextComposer.calculate_related_news_pnl_ratio(index_search_result)
+                if not precomputed_related_news:
+                    related_news_pnl_ratio = LLMTextComposer.calculate_related_news_pnl_ratio(index_search_result)
                 related_news_suggestion = LLMTextComposer.compose_related_news_pnl_ratio_for_llm(index_search_result)
 
                 ######## (4) analysis incoming news (final-analysis)
@@ -144,11 +144,11 @@ class ChatbotPerformanceComparison:
                 )
 
                 try:
-                    rag_analysis_parameter = rag_analysis.items[0].arguments
+                    rag_analysis_parameter = rag_analysis.items[0].parse_arguments()
                     rag_analysis_result = NewsImpactAnalysisResult.from_dict(rag_analysis_parameter)
-                    print("\n", "rag_parameters:", rag_analysis_parameter, "\n\n--------")
+                    logger.debug("rag_parameters: %s", rag_analysis_parameter)
                 except AttributeError:
-                    print("ERROR: 'TextContent' object has no attribute 'arguments'. Skipping this loop.")
+                    logger.error("'TextContent' object has no attribute 'arguments'. Skipping %s", article.url)
                     # TODO: add a fail record
 
                     continue
@@ -187,15 +187,20 @@ class ChatbotPerformanceComparison:
 
             start_price_date_str = start_date.strftime("%Y-%m-%d")
             end_price_date_str = (start_date + timedelta(days=analysis_item.pre_analysis_result.impact_days_max + 5)).strftime("%Y-%m-%d")
+            intraday_entry_price = None
+            if trading_hour_status.is_in_trading_hour:
+                intraday_entry_price = self.intraday_store.get_entry_price(analysis_item.ticker, analysis_item.news_article.published_at)
 
             # Pre Analysis - backtest
             pre_backtest_result = self._run_backtest(
                 ticker=analysis_item.ticker, impact=analysis_item.pre_analysis_result,
-                start_date=start_date, start_price_date_str=start_price_date_str, end_price_date_str=end_price_date_str, trading_hour_status=trading_hour_status)
+                start_date=start_date, start_price_date_str=start_price_date_str, end_price_date_str=end_price_date_str, trading_hour_status=trading_hour_status,
+                intraday_entry_price=intraday_entry_price, price_panel=self.price_panel)
 
             post_backtest_result = self._run_backtest(
                 ticker=analysis_item.ticker, impact=analysis_item.rag_analysis_result,
-                start_date=start_date, start_price_date_str=start_price_date_str, end_price_date_str=end_price_date_str, trading_hour_status=trading_hour_status)
+                start_date=start_date, start_price_date_str=start_price_date_str, end_price_date_str=end_price_date_str, trading_hour_status=trading_hour_status,
+                intraday_entry_price=intraday_entry_price, price_panel=self.price_panel)
 
             # insert to the final_compare_df
 
@@ -230,9 +235,10 @@ class ChatbotPerformanceComparison:
         return final_compare_df
 
     @staticmethod
-    def _run_backtest(ticker: str, impact: NewsImpactAnalysisResult, start_date, start_price_date_str, end_price_date_str, trading_hour_status) -> Optional[BacktestResult]:
+    def _run_backtest(ticker: str, impact: NewsImpactAnalysisResult, start_date, start_price_date_str, end_price_date_str, trading_hour_status,
+                      intraday_entry_price: float = None, price_panel: PricePanel = None) -> Optional[BacktestResult]:
         if impact and impact.impact_weight > 0:
-            stock_price_downloader = StockPriceDataDownloader(ticker, start_price_date_str, end_price_date_str)
+            stock_price_downloader = StockPriceDataDownloader(ticker, start_price_date_str, end_price_date_str, price_panel)
             stock_price_df = stock_price_downloader.get_price_data_in_range(start_price_date_str, end_price_date_str)
 
             runner = BacktestRunner(data_frame=stock_price_df)
@@ -242,10 +248,11 @@ class ChatbotPerformanceComparison:
                                          minimum_impact_days=impact.impact_days_min,
                                          position_movement=impact.position_movement,
                                          start_trading_date=start_date.to_pydatetime().date(),
-                                         trading_hour_status=trading_hour_status
+                                         trading_hour_status=trading_hour_status,
+                                         intraday_entry_price=intraday_entry_price
                                          )
 
-            print("\n\n", "backtest_parameters:", backtest_result, "\n\n--------")
+            logger.debug("backtest_parameters: %s", backtest_result)
             return backtest_result
 
     def plot_pnl_compare(self, df: pd.DataFrame):
@@ -275,6 +282,7 @@ class ChatbotPerformanceComparison:
 
 
 if __name__ == "__main__":
+    configure_logging()
     cpc = ChatbotPerformanceComparison()
     # collection_parameter_analysis = asyncio.run(cpc.run_analysis_from_csv())
     # df_backtest_result = cpc.run_backtest(collection_parameter_analysis)
@@ -3,85 +3,145 @@ from datetime import timedelta
 
 import pytz
 
-from config import Config, DataFeedConfig, significant_companies
+from common.instrumentation import instrumentation
+from common.logger import configure_logging, get_logger
+from common.ticker_registry import TickerRegistry, get_ticker_registry
+from config import Config, DataFeedConfig
+from embedding_kits.related_news_aggregates import RelatedNewsAggregator
 from embedding_kits.stock_news_embedding import AzureSearchManager
 from new_analyzer.news_analyzer import NewsAnalyzer
-from news_downloader.news_downloader_na import NewsAPIClient
+from new_analyzer.relevance_filter import RelevanceFilter
+from news_downloader.near_duplicate_detector import NearDuplicateDetector
+from news_downloader.news_downloader_na import NewsCache
 from stock_price.back_tester import BacktestRunner
+from stock_price.intraday_price_store import IntradayPriceStore
+from stock_price.price_panel import PricePanel
 from stock_price.stock_price_data_downloader import StockPriceDataDownloader
 from stock_price.trading_date_calculator import TradingDateCalculator
 
-########
-azure_search = AzureSearchManager(Config.AZURE_SEARCH_ENDPOINT, Config.AZURE_SEARCH_KEY, Config.AZURE_SEARCH_INDEX)
-
-api_client = NewsAPIClient()
-
+logger = get_logger(__name__)
+
+
+async def feed_articles(company_ticker: str, sector: str, articles: list, azure_search, news_analyzer: NewsAnalyzer,
+                        intraday_store: IntradayPriceStore, price_panel: PricePanel = None,
+                        duplicate_detector: NearDuplicateDetector = None, relevance_filter: RelevanceFilter = None) -> int:
+    """
+    Analyze, backtest and index the articles of one company, returns the number of indexed documents.
+    With a duplicate_detector only one article per near-duplicate cluster is analyzed, the others are recorded as its members.
+    With a relevance_filter articles it rates as non-material are skipped before the LLM call.
+    """
+    indexed_count = 0
+    for article in articles:
+        if duplicate_detector:
+            representative_url = duplicate_detector.find_representative(company_ticker, article)
+            if representative_url:
+                logger.debug("Article: %s is a near duplicate of %s", article.title, representative_url)
+                duplicate_detector.add(company_ticker, article, representative_url=representative_url)
+                continue
+
+        if relevance_filter:
+            relevance = relevance_filter.evaluate(article)
+            if not relevance.keep:
+                logger.debug("Article: %s skipped as non-material (%s, %.3f)", article.title, relevance.reason, relevance.score)
+                continue
+
+        article_date = article.published_at.tz_localize('UTC').astimezone(pytz.timezone('US/Eastern'))
+
+        logger.debug("Article: %s, published_at_UTC: %s, published_at_ET: %s", article.title, article.published_at, article_date)
+
+        # 3.1 get trading hour
+        trading_hour_status = TradingDateCalculator.get_trading_hour(article_date)
+
+        logger.debug("is open?: %s, next trading open: %s", trading_hour_status.is_in_trading_hour, trading_hour_status.next_trading_open)
+
+        analysis_result = await news_analyzer.get_parameters(article, trading_hour_status)
+        doc_id = None
+        if analysis_result:
+            logger.debug("Analysis Result: %s", analysis_result)
+
+            # 3.2 base trading hour status to get trading dates
+            if trading_hour_status.is_in_trading_hour:
+                start_date = article_date
+            else:
+                start_date = trading_hour_status.next_trading_open
+
+            start_price_date_str = start_date.strftime("%Y-%m-%d")
+            end_price_date_str = (start_date + timedelta(days=analysis_result.impact_days_max + 5)).strftime("%Y-%m-%d")
+
+            if analysis_result and analysis_result.impact_weight > 0:
+                # 4 prepare price data
+                stock_price_downloader = StockPriceDataDownloader(company_ticker, start_price_date_str, end_price_date_str, price_panel)
+                with instrumentation.span("feed.price_data", ticker=company_ticker):
+                    stock_price_df = stock_price_downloader.get_price_data_in_range(start_price_date_str, end_price_date_str)
 
-async def start_data_feed():
-    # 1. download news data for significant companies
+                # 5. use the parameters to do back testing get pnl, entering at the intraday price when bars exist
+                intraday_entry_price = None
+                if trading_hour_status.is_in_trading_hour:
+                    intraday_entry_price = intraday_store.get_entry_price(company_ticker, article.published_at)
+                runner = BacktestRunner(data_frame=stock_price_df)
+
+                backtest_result = runner.run(impact_weight=analysis_result.impact_weight,
+                                             maximum_impact_days=analysis_result.impact_days_max,
+                                             minimum_impact_days=analysis_result.impact_days_min,
+                                             position_movement=analysis_result.position_movement,
+                                             start_trading_date=start_date.to_pydatetime().date(),
+                                             trading_hour_status=trading_hour_status,
+                                             intraday_entry_price=intraday_entry_price
+                                             )
+
+                # 6. save to azure ai search index
+                azure_search.insert_document(
+                    sector=sector,
+                    ticker=company_ticker,
+
+                    article=article,
+                    trading_hour_status=trading_hour_status,
+                    analysis_result=analysis_result,
+                    backtest_result=backtest_result,
+                )
+                indexed_count += 1
+                doc_id = article.get_document_id(company_ticker)
+
+        # the analysis was paid for either way, later copies of the story reuse it
+        if duplicate_detector:
+            duplicate_detector.add(company_ticker, article, doc_id=doc_id)
+    return indexed_count
+
+
+async def start_data_feed(search_manager=None, news_cache: NewsCache = None, news_analyzer: NewsAnalyzer = None,
+                          companies: TickerRegistry = None):
+    """
+    Analyze, backtest and index the cached news of every company.
+    Dependencies default to the live services, benchmarks pass local / fake ones.
+    """
+    azure_search = search_manager or AzureSearchManager(Config.AZURE_SEARCH_ENDPOINT, Config.AZURE_SEARCH_KEY, Config.AZURE_SEARCH_INDEX)
+    news_cache = news_cache or NewsCache()
+    if companies is None:
+        companies = get_ticker_registry().shard(Config.FEED_SHARD_INDEX, Config.FEED_SHARD_COUNT)
+
+    # 1. download news data for the companies of this shard
     news_data = {}
-    for company_ticker, company_info in list(significant_companies.items()):
-        news_data[company_ticker] = api_client.cache.load_from_cache(company_ticker, from_date=DataFeedConfig.EMBEDDING_DATE_FROM, to_date=DataFeedConfig.EMBEDDING_DATE_TO)
+    for company_ticker in companies:
+        news_data[company_ticker] = news_cache.load_from_cache(company_ticker, from_date=DataFeedConfig.EMBEDDING_DATE_FROM, to_date=DataFeedConfig.EMBEDDING_DATE_TO)
 
     # 2. send to llm to analyze parameters -> ticker, sector, position_movement, impact_days_min, impact_days_max, impact_weight
-    news_analyzer = NewsAnalyzer()
+    news_analyzer = news_analyzer or NewsAnalyzer()
+    intraday_store = IntradayPriceStore()
+    price_panel = PricePanel.load()
+    duplicate_detector = NearDuplicateDetector() if Config.NEAR_DUPLICATE_ENABLED else None
+    relevance_filter = RelevanceFilter() if Config.RELEVANCE_FILTER_ENABLED else None
     for company_ticker, articles in news_data.items():
         if not articles:
             continue
-        for article in articles:
-
-            article_date = article.published_at.tz_localize('UTC').astimezone(pytz.timezone('US/Eastern'))
-
-            print("Article:", article.title)
-            print("published_at_UTC:", article.published_at)
-            print("published_at_ET:", article_date)
-
-            # 3.1 get trading hour
-            trading_hour_status = TradingDateCalculator.get_trading_hour(article_date)
-
-            print(f" is open?: {trading_hour_status.is_in_trading_hour}", '\n')
-            print(f" Next Trading Open: {trading_hour_status.next_trading_open}")
-
-            analysis_result = await news_analyzer.get_parameters(article, trading_hour_status)
-            if analysis_result:
-                print("Analysis Result:", analysis_result)
-
-                # 3.2 base trading hour status to get trading dates
-                if trading_hour_status.is_in_trading_hour:
-                    start_date = article_date
-                else:
-                    start_date = trading_hour_status.next_trading_open
-
-                start_price_date_str = start_date.strftime("%Y-%m-%d")
-                end_price_date_str = (start_date + timedelta(days=analysis_result.impact_days_max + 5)).strftime("%Y-%m-%d")
-
-                if analysis_result and analysis_result.impact_weight > 0:
-                    # 4 prepare price data
-                    stock_price_downloader = StockPriceDataDownloader(company_ticker, start_price_date_str, end_price_date_str)
-                    stock_price_df = stock_price_downloader.get_price_data_in_range(start_price_date_str, end_price_date_str)
-
-                    # 5. use the parameters to do back testing get pnl
-                    runner = BacktestRunner(data_frame=stock_price_df)
-
-                    backtest_result = runner.run(impact_weight=analysis_result.impact_weight,
-                                                 maximum_impact_days=analysis_result.impact_days_max,
-                                                 minimum_impact_days=analysis_result.impact_days_min,
-                                                 position_movement=analysis_result.position_movement,
-                                                 start_trading_date=start_date.to_pydatetime().date(),
-                                                 trading_hour_status=trading_hour_status
-                                                 )
-
-                    # 6. save to azure ai search index
-                    azure_search.insert_document(
-                        sector=significant_companies[company_ticker]["sector"],
-                        ticker=company_ticker,
+        await feed_articles(company_ticker, companies[company_ticker].sector, articles, azure_search, news_analyzer,
+                            intraday_store, price_panel, duplicate_detector, relevance_filter)
 
-                        article=article,
-                        trading_hour_status=trading_hour_status,
-                        analysis_result=analysis_result,
-                        backtest_result=backtest_result,
-                    )
+    # 7. refresh the precomputed related news of the newly indexed documents
+    if isinstance(azure_search, AzureSearchManager):
+        RelatedNewsAggregator(azure_search).refresh()
 
 
 if __name__ == "__main__":
+    configure_logging()
+    instrumentation.start_metrics_server()
     asyncio.run(start_data_feed())
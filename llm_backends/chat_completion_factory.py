@@ -0,0 +1,43 @@
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+
+from config import Config
+
+SUPPORTED_BACKENDS = ("ollama", "azure_openai", "fake")
+
+
+def create_chat_completion_service(backend: str, model_id: str, service_id: str = "default") -> ChatCompletionClientBase:
+    """
+    Create the chat completion service for the given backend.
+    :param backend: One of "ollama", "azure_openai" or "fake".
+    :param model_id: Model id for Ollama / the fake service. Azure uses the configured deployment.
+    :param service_id: Semantic kernel service id.
+    """
+    if backend == "ollama":
+        from semantic_kernel.connectors.ai.ollama import OllamaChatCompletion
+        return OllamaChatCompletion(service_id=service_id, ai_model_id=model_id)
+
+    if backend == "azure_openai":
+        from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+        return AzureChatCompletion(
+            service_id=service_id,
+            deployment_name=Config.aoi_deployment_name,
+            api_key=Config.aoi_api_key,
+            endpoint=Config.aoi_endpoint,
+            api_version=Config.aoi_api_version,
+        )
+
+    if backend == "fake":
+        from llm_backends.fake_chat_completion import FakeChatCompletion
+        return FakeChatCompletion(service_id=service_id, ai_model_id=model_id, latency_ms=Config.FAKE_LLM_LATENCY_MS)
+
+    raise ValueError(f"Unsupported LLM backend '{backend}', expected one of {SUPPORTED_BACKENDS}.")
+
+
+def create_chat_service_for_chat(service_id: str = "default") -> ChatCompletionClientBase:
+    """Chat completion service for the interactive chatbot."""
+    return create_chat_completion_service(Config.CHAT_LLM_BACKEND, Config.CHAT_LLM_MODEL, service_id)
+
+
+def create_chat_service_for_feed(service_id: str = "feed") -> ChatCompletionClientBase:
+    """Chat completion service for bulk feed analysis, usually a cheaper and faster model."""
+    return create_chat_completion_service(Config.FEED_LLM_BACKEND, Config.FEED_LLM_MODEL, service_id)
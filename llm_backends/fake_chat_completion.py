@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+import json
+import re
+
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.contents import ChatMessageContent, FunctionCallContent, FunctionResultContent
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+
+
+class FakeChatCompletion(ChatCompletionClientBase):
+    """Deterministic offline chat completion service for benchmarking the pipelines without network.
+
+    The reply only depends on the last user message, so the same article always gets the same analysis.
+    """
+
+    latency_ms: float = 0.0
+
+    async def get_chat_message_contents(self, chat_history: ChatHistory, settings, **kwargs) -> list[ChatMessageContent]:
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        user_message = self._last_user_message(chat_history)
+        plugin_name, function_name, arguments = self._pick_tool_call(user_message)
+        function_call = FunctionCallContent(
+            id=f"call_{self._digest(user_message)[:12]}",
+            plugin_name=plugin_name,
+            function_name=function_name,
+            arguments=json.dumps(arguments),
+        )
+
+        kernel = kwargs.get("kernel")
+        behavior = getattr(settings, "function_choice_behavior", None)
+        if kernel is not None and behavior is not None and behavior.auto_invoke_kernel_functions:
+            # mimic SK auto invoke: record the call and its result in the history, answer with text
+            chat_history.add_message(ChatMessageContent(role=AuthorRole.ASSISTANT, items=[function_call]))
+            result = await kernel.invoke(plugin_name=plugin_name, function_name=function_name,
+                                         arguments=KernelArguments(**arguments))
+            function_result = FunctionResultContent.from_function_call_content_and_result(function_call, result)
+            chat_history.add_message(function_result.to_chat_message_content())
+            content = self._compose_text(arguments)
+            return [ChatMessageContent(role=AuthorRole.ASSISTANT, ai_model_id=self.ai_model_id, content=content,
+                                       metadata={"usage": self._usage(user_message, content)})]
+
+        return [ChatMessageContent(role=AuthorRole.ASSISTANT, ai_model_id=self.ai_model_id, items=[function_call],
+                                   metadata={"usage": self._usage(user_message, function_call.arguments)})]
+
+    @staticmethod
+    def _usage(prompt: str, completion: str) -> dict:
+        """Rough token counts, about one token per word."""
+        return {"prompt_tokens": len(prompt.split()), "completion_tokens": len(completion.split())}
+
+    @staticmethod
+    def _last_user_message(chat_history: ChatHistory) -> str:
+        for message in reversed(chat_history.messages):
+            if message.role == AuthorRole.USER:
+                return message.content or ""
+        return ""
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _pick_tool_call(self, user_message: str) -> tuple[str, str, dict]:
+        """Choose the tool the real pipelines expect for this prompt."""
+        if "network expert" in user_message:
+            return "NewsDownloader3kPlugin", "is_news_content_normal", {"is_news_blocked": False}
+
+        urls = re.findall(r"https?://\S+", user_message)
+        if urls and len(user_message) < 500:
+            return "NewsDownloader3kPlugin", "fetch_news_from_url", {"url": urls[0]}
+
+        return "StockNewsAnalysisPlugin", "analyze_stock_news", self._analysis_arguments(user_message)
+
+    def _analysis_arguments(self, user_message: str) -> dict:
+        seed = int(self._digest(user_message)[:16], 16)
+        impact_days_min = 1 + seed % 5
+        return {
+            "position_movement": "long" if seed % 2 == 0 else "short",
+            "impact_weight": 1 + (seed >> 4) % 10,
+            "minimum_impact_days": impact_days_min,
+            "maximum_impact_days": impact_days_min + (seed >> 8) % 5,
+            "possible_pnl_ratio": round(((seed >> 12) % 2001 - 1000) / 100, 2),
+            "news_summery": " ".join(user_message.split()[-60:]),
+        }
+
+    @staticmethod
+    def _compose_text(arguments: dict) -> str:
+        return ", ".join(f"{key}: {value}" for key, value in arguments.items() if key != "news_summery")
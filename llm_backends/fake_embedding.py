@@ -0,0 +1,27 @@
+import re
+import zlib
+
+import numpy as np
+
+
+class FakeEmbedding:
+    """
+    Deterministic offline embedding, a signed hashing trick over lower-cased words.
+    Texts sharing words get similar vectors, so vector search still behaves sensibly in benchmarks.
+    """
+
+    def __init__(self, dimensions: int = 4096):
+        self.dimensions = dimensions
+
+    def get_text_embedding(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in re.findall(r"\w+", (text or "").lower()):
+            hashed = zlib.crc32(word.encode("utf-8"))
+            vector[hashed % self.dimensions] += 1.0 if hashed & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    async def aget_text_embedding(self, text: str) -> list[float]:
+        return self.get_text_embedding(text)
@@ -0,0 +1,190 @@
+import asyncio
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from common.instrumentation import instrumentation
+from common.logger import get_logger
+from config import Config
+
+logger = get_logger(__name__)
+
+# whole lines of scraped pages that are never part of the story
+BOILERPLATE_LINE = re.compile(
+    r"^\s*(advertisement|sponsored( content)?|skip to (main )?content|sign up( for)?\b.*|subscribe( now| to)?\b.*"
+    r"|(read|see) (more|also)\b.*|related( articles| stories)?:?|share (this|on)\b.*|follow us\b.*|click here\b.*"
+    r"|we use cookies\b.*|accept (all )?cookies|(©|copyright)\s.*|all rights reserved\.?.*|image( source)?:.*"
+    r"|photo:.*|getty images|reporting by\b.*|editing by\b.*)\s*$",
+    re.IGNORECASE)
+_FALLBACK_TOKEN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]?\s")
+
+
+def clean_boilerplate(text: str) -> str:
+    """Drop boilerplate and repeated lines of a scraped page, collapse blank lines."""
+    if not text:
+        return text
+    lines, seen = [], set()
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        if BOILERPLATE_LINE.match(stripped) or stripped in seen:
+            continue
+        seen.add(stripped)
+        lines.append(stripped)
+    return "\n".join(lines).strip()
+
+
+class TokenCounter:
+    """
+    tiktoken counts with a bounded cache of text lengths. Without the encoding files (offline hosts) tokens are
+    approximated by words and punctuation, which is close enough to keep prompts within their budget.
+    Shared by the event loop and asyncio.to_thread workers, the cache is only touched under the lock.
+    """
+
+    def __init__(self, encoding_name: str = Config.TOKENIZER_ENCODING, cache_size: int = 4096):
+        self.encoding_name = encoding_name
+        self.cache_size = cache_size
+        self._encoding = None
+        self._encoding_loaded = False
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def encoding(self):
+        if not self._encoding_loaded:
+            with self._lock:
+                if not self._encoding_loaded:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception as e:
+                        logger.warning("tiktoken encoding %s unavailable, approximating token counts: %s", self.encoding_name, e)
+                    self._encoding_loaded = True
+        return self._encoding
+
+    def get_token_offsets(self, text: str) -> list[int]:
+        """End offset (in characters) of every token."""
+        if self.encoding is None:
+            return [match.end() for match in _FALLBACK_TOKEN.finditer(text)]
+        decoded, starts = self.encoding.decode_with_offsets(self.encoding.encode(text, disallowed_special=()))
+        return starts[1:] + [len(decoded)]
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        with self._lock:
+            count = self._counts.get(text)
+            if count is not None:
+                self._counts.move_to_end(text)
+        instrumentation.record_cache("token_count", count is not None)
+        if count is not None:
+            return count
+        # encoded outside the lock, two threads may count the same text once each
+        if self.encoding is None:
+            count = sum(1 for _ in _FALLBACK_TOKEN.finditer(text))
+        else:
+            count = len(self.encoding.encode(text, disallowed_special=()))
+        with self._lock:
+            self._counts[text] = count
+            while len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return count
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Prefix within max_tokens, cut at the last sentence end when one is in the final fifth."""
+        if self.count(text) <= max_tokens:
+            return text
+        prefix = text[:self.get_token_offsets(text)[max_tokens - 1]]
+        sentence_ends = [match.start() + 1 for match in _SENTENCE_END.finditer(prefix + " ")]
+        if sentence_ends and sentence_ends[-1] >= len(prefix) * 0.8:
+            prefix = prefix[:sentence_ends[-1]]
+        return prefix.rstrip()
+
+    def chunk(self, text: str, max_tokens: int, overlap_tokens: int = 0, max_chunks: Optional[int] = None) -> list[str]:
+        """Windows of max_tokens tokens, consecutive windows share overlap_tokens tokens."""
+        if self.count(text) <= max_tokens:
+            return [text]
+        offsets = self.get_token_offsets(text)
+        step = max(max_tokens - overlap_tokens, 1)
+        chunks = []
+        for start in range(0, len(offsets), step):
+            start_offset = offsets[start - 1] if start > 0 else 0
+            chunks.append(text[start_offset:offsets[min(start + max_tokens, len(offsets)) - 1]].strip())
+            if start + max_tokens >= len(offsets) or (max_chunks and len(chunks) >= max_chunks):
+                break
+        return chunks
+
+
+token_counter = TokenCounter()
+
+
+def get_llm_token_budget(model: str) -> int:
+    """Article token budget of a chat model, LLM_TOKEN_BUDGETS entries are "model=tokens" separated by commas."""
+    budgets = {}
+    for entry in Config.LLM_TOKEN_BUDGETS.split(","):
+        name, _, tokens = entry.partition("=")
+        if name.strip() and tokens.strip():
+            budgets[name.strip()] = int(tokens)
+    return budgets.get(model, budgets.get("default", 3000))
+
+
+def prepare_for_llm(text: str, model: str = Config.CHAT_LLM_MODEL, max_tokens: int = None) -> str:
+    """Cleaned article text within the model's article budget."""
+    if not text:
+        return text
+    return token_counter.truncate(clean_boilerplate(text), max_tokens or get_llm_token_budget(model))
+
+
+def embed_text(embedding_model, text: str, chunk_tokens: int = Config.EMBEDDING_CHUNK_TOKENS,
+               overlap_tokens: int = Config.EMBEDDING_CHUNK_OVERLAP_TOKENS, max_chunks: int = Config.EMBEDDING_MAX_CHUNKS) -> list[float]:
+    """
+    Embedding of a text of any length: the chunk vectors, weighted by their token counts, are averaged and re-normalized.
+    Short texts (queries, NewsAPI snippets) are a single chunk and embedded as is.
+    """
+    if token_counter.count(text) <= chunk_tokens:
+        return embedding_model.get_text_embedding(text)
+    chunks = token_counter.chunk(clean_boilerplate(text), chunk_tokens, overlap_tokens, max_chunks)
+    if hasattr(embedding_model, "get_text_embedding_batch"):
+        vectors = embedding_model.get_text_embedding_batch(chunks)
+    else:
+        vectors = [embedding_model.get_text_embedding(chunk) for chunk in chunks]
+    return _average_chunk_vectors(chunks, vectors)
+
+
+async def aembed_text(embedding_model, text: str, chunk_tokens: int = Config.EMBEDDING_CHUNK_TOKENS,
+                      overlap_tokens: int = Config.EMBEDDING_CHUNK_OVERLAP_TOKENS, max_chunks: int = Config.EMBEDDING_MAX_CHUNKS) -> list[float]:
+    """embed_text with the model's async calls, the event loop keeps serving other sessions meanwhile."""
+    if token_counter.count(text) <= chunk_tokens:
+        return await embedding_model.aget_text_embedding(text)
+    chunks = token_counter.chunk(clean_boilerplate(text), chunk_tokens, overlap_tokens, max_chunks)
+    if hasattr(embedding_model, "aget_text_embedding_batch"):
+        vectors = await embedding_model.aget_text_embedding_batch(chunks)
+    else:
+        vectors = await asyncio.gather(*(embedding_model.aget_text_embedding(chunk) for chunk in chunks))
+    return _average_chunk_vectors(chunks, vectors)
+
+
+def _average_chunk_vectors(chunks: list[str], vectors) -> list[float]:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    weights = np.array([token_counter.count(chunk) for chunk in chunks], dtype=np.float32)
+    combined = weights @ vectors / weights.sum()
+    norm = np.linalg.norm(combined)
+    return (combined / norm if norm > 0 else combined).tolist()
+
+
+def embed_texts(embedding_model, texts: list[str], chunk_tokens: int = Config.EMBEDDING_CHUNK_TOKENS) -> list[list[float]]:
+    """embed_text of many texts, the single-chunk ones in one batch call."""
+    vectors = [None] * len(texts)
+    short = [i for i, text in enumerate(texts) if token_counter.count(text) <= chunk_tokens]
+    if short and hasattr(embedding_model, "get_text_embedding_batch"):
+        for i, vector in zip(short, embedding_model.get_text_embedding_batch([texts[i] for i in short])):
+            vectors[i] = vector
+    return [vector if vector is not None else embed_text(embedding_model, text, chunk_tokens)
+            for text, vector in zip(texts, vectors)]
@@ -1,29 +1,31 @@
 import asyncio
+import os
 
 from semantic_kernel.connectors.ai import PromptExecutionSettings
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
-from semantic_kernel.connectors.ai.ollama import OllamaChatCompletion
 from semantic_kernel.contents import FunctionCallContent
 from semantic_kernel.contents.chat_history import ChatHistory
 from semantic_kernel.kernel import Kernel
 
+from common.instrumentation import instrumentation
+from common.logger import configure_logging, get_logger
+from common.single_flight import SingleFlight
+from llm_backends.chat_completion_factory import create_chat_service_for_feed
 from new_analyzer.model_news_impact_analysis_result import NewsImpactAnalysisResult
 from new_analyzer.stock_news_analysis_plugin import StockNewsAnalysisPlugin
 from news_downloader.model_news_article import NewsArticle
 from news_downloader.news_downloader_na import NewsAPIClient
 from stock_price.trading_date_calculator import TradingHourStatus, TradingDateCalculator
 
+logger = get_logger(__name__)
 
 class NewsAnalyzer:
     """Class responsible for analyzing news articles."""
+    _analysis_flight = SingleFlight("news_analysis")  # coalesces concurrent analysis of the same article
 
     def __init__(self):
         self.kernel = Kernel()
-        self.chat_completion_service = OllamaChatCompletion(
-            service_id="ollama",
-            # ai_model_id="deepseek-r1:14b",
-            ai_model_id="llama3.2",
-        )
+        self.chat_completion_service = create_chat_service_for_feed()
         self.kernel.add_plugin(StockNewsAnalysisPlugin(), "StockNewsAnalysisPlugin")
         self.settings = PromptExecutionSettings(
             function_choice_behavior=FunctionChoiceBehavior.Auto(auto_invoke=False),
@@ -32,37 +34,45 @@ class NewsAnalyzer:
 
     @staticmethod
     def _load_system_message() -> str:
-        with open('../prompts/news_analyzer_system_instruction_na.txt', 'r') as file:
+        prompt_file = os.path.join(os.path.dirname(__file__), '..', 'prompts', 'news_analyzer_system_instruction_na.txt')
+        with open(prompt_file, 'r') as file:
             return file.read()
 
     async def get_parameters(self, article: NewsArticle, trading_hour_status: TradingHourStatus) -> NewsImpactAnalysisResult:
         """Extract parameters from the given article."""
+        publication_comment = trading_hour_status.get_publication_comment(article.published_at)
+        return await self._analysis_flight.do(
+            (article.get_content_for_llm(), publication_comment),
+            lambda: self._get_parameters(article, publication_comment))
+
+    async def _get_parameters(self, article: NewsArticle, publication_comment: str) -> NewsImpactAnalysisResult:
         chat_history = ChatHistory()
         chat_history.add_system_message(self.system_message)
 
         chat_history.add_user_message(article.get_content_for_llm() +
-                                      f"\n\nNews Publish Time Comments: {trading_hour_status.get_publication_comment(article.published_at)}"
+                                      f"\n\nNews Publish Time Comments: {publication_comment}"
                                       "\n\nProvide a JSON response with keys: "
                                       "impact_weight (1-10), "
                                       "position_movement (long or short), "
                                       "impact_days_min, and impact_days_max.")
 
-        response = await self.chat_completion_service.get_chat_message_content(
-            chat_history, self.settings, kernel=self.kernel)
+        with instrumentation.span("feed.llm_analysis"):
+            response = await self.chat_completion_service.get_chat_message_content(
+                chat_history, self.settings, kernel=self.kernel)
+            instrumentation.record_llm_usage("feed.llm_analysis", response)
         function_call_content = response.items[0]
 
         if isinstance(function_call_content, FunctionCallContent) :
-            converted_params = NewsImpactAnalysisResult.from_dict(function_call_content.arguments)
+            converted_params = NewsImpactAnalysisResult.from_dict(function_call_content.parse_arguments())
         else:
-            print("\n","######## CAN'T Analysis")
-            print(function_call_content)
-            print(article.get_content_for_llm(), '\n')
+            logger.debug("No analysis function call for %r: %s", getattr(article, "title", None), function_call_content)
             converted_params = None
         return converted_params
         # return function_call_content
 
 
 if __name__ == "__main__":
+    configure_logging()
     api_client = NewsAPIClient()
     news_data = api_client.get_news("AAPL", from_date="2025-03-01", to_date="2025-03-02")
 
@@ -0,0 +1,187 @@
+import argparse
+import os
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from common.instrumentation import instrumentation
+from common.logger import configure_logging, get_logger
+from config import Config, DataFeedConfig
+from news_downloader.model_news_article import NewsArticle
+
+logger = get_logger(__name__)
+
+HASHED_FEATURES = 1 << 18
+_WORD = re.compile(r"[a-z0-9']+")
+
+# checked on the title, a material event wins over a non-material pattern
+MATERIAL_PATTERNS = re.compile(
+    r"\b(earnings|revenue|guidance|outlook|forecast|acquir(?:e|es|ed|ing)\b.{0,40}\b(?:company|maker|startup|business|rival)"
+    r"|acquisition|merger|buyout|takeover|recall|lawsuit|sues|probe|investigation|antitrust|fda|approval|bankruptcy"
+    r"|layoffs?|job cuts|downgrade|upgrade|buyback|dividend (?:cut|hike|increase)|ceo (?:resigns|steps down|ousted)|strike)\b",
+    re.IGNORECASE)
+# institutional holding filings only ("X LLC buys 688 shares of", "... stake in Apple Inc. (NASDAQ:AAPL)"),
+# a company taking or cutting a stake in another one is material
+NON_MATERIAL_PATTERNS = re.compile(
+    r"\b(?:purchases|acquires|buys|sells|trims|lowers|raises|boosts|increases|decreases|cuts|reduces|grows|adds|takes)"
+    r" (?:an? )?(?:additional |new )?[\d,.]+k? shares of\b"
+    r"|\b(?:stake|position|holdings)\b.{0,80}\((?:NASDAQ|NYSE|NYSEARCA|NYSEAMERICAN|AMEX|OTCMKTS|BATS)\s*:\s*[A-Z.]+\)"
+    r"|\b(?:shares|stake|position) (?:sold|bought|purchased|acquired|trimmed|raised|lowered) by\b"
+    r"|\b\d+ (?:best|top|cheap|great|dividend|growth|magnificent|unstoppable)\b.{0,30}\bstocks?\b"
+    r"|\bstocks? to (?:buy|watch|own|avoid|hold)\b"
+    r"|\b(?:should you|is it time to|is it too late to) (?:buy|sell)\b",
+    re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class RelevanceDecision:
+    keep: bool
+    score: float  # probability of a material article, 1.0 / 0.0 for rule decisions
+    reason: str  # rule_material, rule_non_material, model or default
+
+
+def get_feature_indexes(text: str) -> np.ndarray:
+    """Hashed unigram and bigram features of the lower-cased words, deduplicated."""
+    words = _WORD.findall((text or "").lower())
+    grams = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+    return np.unique(np.fromiter((zlib.crc32(gram.encode("utf-8")) % HASHED_FEATURES for gram in grams),
+                                 dtype=np.int64, count=len(grams)))
+
+
+class HashedNgramClassifier:
+    """Logistic regression over hashed n-gram features, small enough to score an article in microseconds."""
+
+    def __init__(self, weights: np.ndarray = None, bias: float = 0.0):
+        self.weights = weights if weights is not None else np.zeros(HASHED_FEATURES, dtype=np.float32)
+        self.bias = bias
+
+    def predict(self, text: str) -> float:
+        indexes = get_feature_indexes(text)
+        logit = self.bias + float(self.weights[indexes].sum()) / np.sqrt(max(len(indexes), 1))
+        return float(1 / (1 + np.exp(-logit)))
+
+    @classmethod
+    def train(cls, texts: list[str], labels: np.ndarray, epochs: int = 200, learning_rate: float = 5.0,
+              l2: float = 1e-4) -> "HashedNgramClassifier":
+        """Full batch gradient descent on the class-balanced log loss, features are sparse so gradients use bincount."""
+        labels = np.asarray(labels, dtype=np.float64)
+        feature_rows = [get_feature_indexes(text) for text in texts]
+        rows = np.repeat(np.arange(len(texts)), [len(indexes) for indexes in feature_rows])
+        columns = np.concatenate(feature_rows) if feature_rows else np.empty(0, dtype=np.int64)
+        scale = 1 / np.sqrt(np.maximum([len(indexes) for indexes in feature_rows], 1))
+        positive_ratio = labels.mean()
+        sample_weights = np.where(labels == 1, 0.5 / max(positive_ratio, 1e-9), 0.5 / max(1 - positive_ratio, 1e-9))
+
+        weights, bias = np.zeros(HASHED_FEATURES), 0.0
+        for _ in range(epochs):
+            logits = bias + np.bincount(rows, weights=weights[columns], minlength=len(texts)) * scale
+            errors = (1 / (1 + np.exp(-logits)) - labels) * sample_weights / len(texts)
+            weights -= learning_rate * (np.bincount(columns, weights=(errors * scale)[rows], minlength=HASHED_FEATURES) + l2 * weights)
+            bias -= learning_rate * errors.sum()
+        return cls(weights.astype(np.float32), float(bias))
+
+    def save(self, path: str = Config.RELEVANCE_MODEL_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, weights=self.weights, bias=np.float64(self.bias))
+
+    @classmethod
+    def load(cls, path: str = Config.RELEVANCE_MODEL_PATH) -> Optional["HashedNgramClassifier"]:
+        """None when no model was trained yet."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["weights"], float(data["bias"]))
+
+
+class RelevanceFilter:
+    """
+    Cheap pre-filter in front of the LLM analysis: title rules first, then the hashed n-gram model when one
+    was trained. Articles scoring below skip_threshold are not analyzed, decisions are counted per reason.
+    """
+
+    def __init__(self, classifier: HashedNgramClassifier = None, skip_threshold: float = Config.RELEVANCE_SKIP_THRESHOLD):
+        self.classifier = classifier if classifier is not None else HashedNgramClassifier.load()
+        self.skip_threshold = skip_threshold
+
+    def evaluate(self, article: NewsArticle) -> RelevanceDecision:
+        title = getattr(article, "title", "") or ""
+        if MATERIAL_PATTERNS.search(title):
+            decision = RelevanceDecision(True, 1.0, "rule_material")
+        elif NON_MATERIAL_PATTERNS.search(title):
+            decision = RelevanceDecision(False, 0.0, "rule_non_material")
+        elif self.classifier is not None:
+            score = self.classifier.predict(article.get_content_for_embedding())
+            decision = RelevanceDecision(score >= self.skip_threshold, score, "model")
+        else:
+            decision = RelevanceDecision(True, 1.0, "default")
+        instrumentation.increment("relevance_filter_articles_total", decision="keep" if decision.keep else "skip",
+                                  reason=decision.reason)
+        return decision
+
+
+def iter_labeled_documents(search_manager) -> Iterator[tuple[str, int]]:
+    """(title + content, impact_weight) of every indexed document, from the Azure index or a LocalSearchManager."""
+    if hasattr(search_manager, "documents"):
+        docs = search_manager.documents
+    else:
+        docs = search_manager.search_client.search(search_text="*", select=["title", "content", "impact_weight"])
+    for doc in docs:
+        yield f"{doc.get('title') or ''}\n\n{doc.get('content') or ''}", int(doc.get("impact_weight") or 0)
+
+
+def train_from_index(search_manager, material_impact_weight: int = Config.RELEVANCE_MATERIAL_IMPACT_WEIGHT,
+                     path: str = Config.RELEVANCE_MODEL_PATH) -> Optional[HashedNgramClassifier]:
+    """Label indexed documents as material when the LLM gave them impact_weight >= material_impact_weight."""
+    labeled = list(iter_labeled_documents(search_manager))
+    labels = np.array([impact_weight >= material_impact_weight for _, impact_weight in labeled], dtype=np.float64)
+    if len(labeled) == 0 or labels.min() == labels.max():
+        logger.warning("Relevance model not trained, %s documents with a single label", len(labeled))
+        return None
+    classifier = HashedNgramClassifier.train([text for text, _ in labeled], labels)
+    predictions = np.array([classifier.predict(text) >= 0.5 for text, _ in labeled])
+    logger.info("Relevance model trained on %s documents (%.1f%% material), training accuracy %.3f",
+                len(labeled), labels.mean() * 100, np.mean(predictions == labels))
+    classifier.save(path)
+    return classifier
+
+
+def get_skip_rate(relevance_filter: RelevanceFilter, articles: Iterable[NewsArticle]) -> tuple[float, dict[str, int]]:
+    """Share of skipped articles and the decision count per reason."""
+    reasons, skipped, total = {}, 0, 0
+    for article in articles:
+        decision = relevance_filter.evaluate(article)
+        reasons[decision.reason] = reasons.get(decision.reason, 0) + 1
+        skipped += not decision.keep
+        total += 1
+    return (skipped / total if total else 0.0), reasons
+
+
+def main():
+    from common.ticker_registry import get_ticker_registry
+    from embedding_kits.stock_news_embedding import AzureSearchManager
+    from news_downloader.news_downloader_na import NewsCache
+
+    parser = argparse.ArgumentParser(description="Train or evaluate the relevance pre-filter.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("train", help="train the hashed n-gram model from the impact weights in the search index")
+    evaluate = commands.add_parser("evaluate", help="skip rate over the cached news")
+    evaluate.add_argument("--threshold", type=float, default=Config.RELEVANCE_SKIP_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train_from_index(AzureSearchManager())
+    else:
+        relevance_filter = RelevanceFilter(skip_threshold=args.threshold)
+        news_cache = NewsCache()
+        articles = [article for ticker in get_ticker_registry() for article in news_cache.load_from_cache(
+            ticker, from_date=DataFeedConfig.EMBEDDING_DATE_FROM, to_date=DataFeedConfig.EMBEDDING_DATE_TO) or []]
+        skip_rate, reasons = get_skip_rate(relevance_filter, articles)
+        print(f"{len(articles)} articles, skip rate {skip_rate:.1%} at threshold {args.threshold}: {reasons}")
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
@@ -1,5 +1,8 @@
+import hashlib
 import re
 
+from config import Config
+from llm_backends.text_preparation import prepare_for_llm
 from news_downloader.model_news_article import NewsArticle
 
 
@@ -8,12 +11,16 @@ class NewsAPIArticle(NewsArticle):
 
     def get_content_for_llm(self) -> str:
         return (f"Title: {self.title}\n\n"
-                f"Content: {self.content}")
+                f"Content: {prepare_for_llm(self.content, Config.FEED_LLM_MODEL)}")
 
     def get_content_for_embedding(self) -> str:
         return (f"{self.title}\n\n"
                 f"{self.content}")
 
+    def get_document_id(self, ticker: str) -> str:
+        """Stable search index key, so re-running or retrying a feed updates the same document."""
+        return "doc_" + hashlib.sha1(f"{ticker}|{self.url}".encode("utf-8")).hexdigest()[:20]
+
     def __init__(self, source, author, title, description, url, published_at, content):
         super().__init__(published_at)
         self.source = source
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import re
+import sqlite3
+import zlib
+from typing import Optional
+
+import numpy as np
+
+from common.instrumentation import instrumentation
+from config import Config
+from news_downloader.model_news_article import NewsArticle
+
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16  # 16 bands x 8 rows, candidates from a Jaccard similarity of about 0.7
+SHINGLE_WORDS = 3
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20250301)  # fixed, signatures are persisted and must stay comparable across runs
+_PERMUTATION_A = _rng.integers(1, _MERSENNE_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.int64)
+_PERMUTATION_B = _rng.integers(0, _MERSENNE_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.int64)
+
+
+def get_shingles(text: str) -> np.ndarray:
+    """crc32 of every 3-word shingle of the lower-cased words."""
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) < SHINGLE_WORDS:
+        words = words + [""] * (SHINGLE_WORDS - len(words))
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.int64, count=len(shingles))
+
+
+def compute_minhash(text: str) -> np.ndarray:
+    """MinHash signature, one (a * x + b) mod p permutation per row, vectorized over all shingles."""
+    shingles = get_shingles(text) % _MERSENNE_PRIME
+    hashed = (_PERMUTATION_A[:, None] * shingles[None, :] + _PERMUTATION_B[:, None]) % _MERSENNE_PRIME
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def estimate_similarity(signature: np.ndarray, other: np.ndarray) -> float:
+    """Fraction of equal rows, an unbiased estimate of the Jaccard similarity of the shingle sets."""
+    return float(np.mean(signature == other))
+
+
+def get_band_keys(signature: np.ndarray) -> list[int]:
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    return [int.from_bytes(hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest(), "little", signed=True)
+            for band in range(LSH_BANDS)]
+
+
+class NearDuplicateDetector:
+    """
+    Clusters syndicated copies of the same story per ticker with MinHash + LSH, so only the first copy
+    (the representative) is analyzed, backtested and indexed. Signatures, LSH buckets and cluster membership
+    are kept in SQLite, so articles of later runs are matched against everything seen before.
+    """
+
+    def __init__(self, db_path: str = Config.NEAR_DUPLICATE_DB, threshold: float = Config.NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                "ticker TEXT NOT NULL, url TEXT NOT NULL, signature BLOB NOT NULL, representative_url TEXT NOT NULL, "
+                "doc_id TEXT, PRIMARY KEY (ticker, url))")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS lsh_buckets (ticker TEXT NOT NULL, band INTEGER NOT NULL, bucket INTEGER NOT NULL, url TEXT NOT NULL, "
+                "UNIQUE (ticker, band, bucket, url))")
+            if not any(index[2] for index in self.connection.execute("PRAGMA index_list(lsh_buckets)")):
+                # tables created before the constraint hold a copy of the rows per re-added representative
+                self.connection.execute(
+                    "DELETE FROM lsh_buckets WHERE rowid NOT IN (SELECT MIN(rowid) FROM lsh_buckets GROUP BY ticker, band, bucket, url)")
+                self.connection.execute(
+                    "CREATE UNIQUE INDEX idx_lsh_buckets_unique ON lsh_buckets(ticker, band, bucket, url)")
+                self.connection.execute("DROP INDEX IF EXISTS idx_lsh_buckets")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_signatures_url ON signatures(url)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_signatures_representative ON signatures(ticker, representative_url)")
+
+    def find_representative(self, ticker: str, article: NewsArticle) -> Optional[str]:
+        """
+        Url of the representative this article duplicates, None for a new story.
+        An article seen before maps to its own cluster.
+        """
+        url = getattr(article, "url", None)
+        known = self.connection.execute(
+            "SELECT representative_url FROM signatures WHERE ticker = ? AND url = ?", (ticker, url)).fetchone()
+        if known is not None:
+            representative = known[0] if known[0] != url else None
+            instrumentation.record_cache("near_duplicate", representative is not None)
+            return representative
+
+        signature = compute_minhash(article.get_content_for_embedding())
+        representative = self._find_similar_representative(ticker, signature)
+        instrumentation.record_cache("near_duplicate", representative is not None)
+        return representative
+
+    def _find_similar_representative(self, ticker: str, signature: np.ndarray) -> Optional[str]:
+        band_keys = get_band_keys(signature)
+        candidates = set()
+        for band, bucket in enumerate(band_keys):
+            candidates.update(row[0] for row in self.connection.execute(
+                "SELECT url FROM lsh_buckets WHERE ticker = ? AND band = ? AND bucket = ?", (ticker, band, bucket)))
+        best_url, best_similarity = None, self.threshold
+        for candidate_url in candidates:
+            stored_signature, representative_url = self.connection.execute(
+                "SELECT signature, representative_url FROM signatures WHERE ticker = ? AND url = ?", (ticker, candidate_url)).fetchone()
+            similarity = estimate_similarity(signature, np.frombuffer(stored_signature, dtype=np.uint32))
+            if similarity >= best_similarity:
+                best_url, best_similarity = representative_url, similarity
+        return best_url
+
+    def add(self, ticker: str, article: NewsArticle, representative_url: str = None, doc_id: str = None) -> None:
+        """
+        Record an article, as a representative (after it was indexed as doc_id) or as a member of representative_url.
+        Members are linked to the representative's doc_id, so they resolve to its analysis and backtest results.
+        Only representatives go into the LSH buckets, so clusters don't drift through chains of partial matches.
+        """
+        url = getattr(article, "url", None)
+        signature = compute_minhash(article.get_content_for_embedding())
+        with self.connection:
+            if representative_url is not None and doc_id is None:
+                row = self.connection.execute(
+                    "SELECT doc_id FROM signatures WHERE ticker = ? AND url = ?", (ticker, representative_url)).fetchone()
+                doc_id = row[0] if row else None
+            self.connection.execute(
+                "INSERT OR REPLACE INTO signatures (ticker, url, signature, representative_url, doc_id) VALUES (?, ?, ?, ?, ?)",
+                (ticker, url, signature.tobytes(), representative_url or url, doc_id))
+            if representative_url is None:
+                if doc_id is not None:
+                    # a representative indexed on a later run, its members follow
+                    self.connection.execute(
+                        "UPDATE signatures SET doc_id = ? WHERE ticker = ? AND representative_url = ?", (doc_id, ticker, url))
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO lsh_buckets (ticker, band, bucket, url) VALUES (?, ?, ?, ?)",
+                    [(ticker, band, bucket, url) for band, bucket in enumerate(get_band_keys(signature))])
+
+    def get_representative_url(self, url: str) -> Optional[str]:
+        """Representative of any recorded article url, used to fan the representative's results out to its members."""
+        row = self.connection.execute("SELECT representative_url FROM signatures WHERE url = ? LIMIT 1", (url,)).fetchone()
+        return row[0] if row else None
+
+    def get_document_id(self, url: str) -> Optional[str]:
+        """Index document holding the analysis and backtest of the url's cluster, None when the cluster isn't indexed."""
+        row = self.connection.execute(
+            "SELECT doc_id FROM signatures WHERE url = ? AND doc_id IS NOT NULL LIMIT 1", (url,)).fetchone()
+        return row[0] if row else None
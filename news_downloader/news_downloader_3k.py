@@ -2,21 +2,34 @@ import requests
 from bs4 import BeautifulSoup
 from newspaper import Article, build
 
+from common.logger import configure_logging
+from news_downloader.news_page_cache import DomainSupportCache
+
 class NewsDownloader3K:
+    _domain_support_cache = None
+
     def __init__(self, url):
         self.url = url
         self.supported = self.check_news_support()
 
     def check_news_support(self):
         """
-        Checks if the website is supported by newspaper3k.
+        Checks if the website is supported by newspaper3k, the verdict is cached per domain.
         """
+        if NewsDownloader3K._domain_support_cache is None:
+            NewsDownloader3K._domain_support_cache = DomainSupportCache()
+        supported = self._domain_support_cache.get(self.url)
+        if supported is not None:
+            return supported
+
         try:
             paper = build(self.url, memoize_articles=False)
-            return paper.size() > 0  # If articles are found, it's supported
+            supported = paper.size() > 0  # If articles are found, it's supported
         except Exception as e:
             print(f"Error checking support for {self.url}: {e}")
-            return False
+            supported = False
+        self._domain_support_cache.set(self.url, supported)
+        return supported
 
     def fetch_with_newspaper3k(self):
         """
@@ -64,6 +77,7 @@ class NewsDownloader3K:
 
 # Continuous Loop for Testing
 if __name__ == "__main__":
+    configure_logging()
     while True:
         url = input("\nEnter the news article URL (or type 'exit' to quit): ")
         if url.lower() == "exit":
@@ -71,5 +85,5 @@ if __name__ == "__main__":
             break
 
         fetcher = NewsDownloader3K(url)
-        content = fetcher.get_article_content()
+        content = str(fetcher.get_article_parsed())
         print("\n" + content[:1000])  # Print first 1000 characters for preview
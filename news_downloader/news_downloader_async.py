@@ -0,0 +1,130 @@
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import httpx
+from bs4 import BeautifulSoup
+from newspaper import Article
+
+from common.instrumentation import instrumentation
+from common.logger import configure_logging, get_logger
+from config import Config
+from news_downloader.news_page_cache import NewsPageCache, DomainSupportCache
+
+logger = get_logger(__name__)
+
+
+class AsyncNewsDownloader:
+    """
+    Async article scraper with a pooled HTTP client, per-domain concurrency limits and an on-disk page cache.
+    A page is fetched once (conditional GET when cached), parsing runs in a thread pool.
+    """
+    HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+    def __init__(self, page_cache: NewsPageCache = None, domain_support_cache: DomainSupportCache = None,
+                 max_connections: int = Config.NEWS_HTTP_MAX_CONNECTIONS,
+                 max_per_domain: int = Config.NEWS_HTTP_MAX_PER_DOMAIN,
+                 timeout_seconds: float = Config.NEWS_HTTP_TIMEOUT_SECONDS,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.page_cache = page_cache or NewsPageCache()
+        self.domain_support_cache = domain_support_cache or DomainSupportCache()
+        self.max_connections = max_connections
+        self.max_per_domain = max_per_domain
+        self.timeout_seconds = timeout_seconds
+        self.transport = transport
+        self.executor = ThreadPoolExecutor(max_workers=Config.NEWS_EXTRACT_WORKERS, thread_name_prefix="news-extract")
+        self._client: Optional[httpx.AsyncClient] = None
+        self._domain_semaphores = defaultdict(lambda: asyncio.Semaphore(self.max_per_domain))
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.HEADERS,
+                timeout=self.timeout_seconds,
+                follow_redirects=True,
+                transport=self.transport,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self.executor.shutdown(wait=False)
+
+    async def fetch_html(self, url: str) -> tuple[int, Optional[str]]:
+        """Fetch the page html, revalidating the cached copy with ETag / Last-Modified when present."""
+        cached_html, meta = self.page_cache.load(url)
+        headers = self.page_cache.get_conditional_headers(meta) if cached_html is not None else {}
+
+        async with self._domain_semaphores[DomainSupportCache.get_domain(url)]:
+            response = await self._get_client().get(url, headers=headers)
+
+        if response.status_code == 304 and cached_html is not None:
+            instrumentation.record_cache("news_page", True)
+            return 200, cached_html
+        instrumentation.record_cache("news_page", False)
+        if response.status_code != 200:
+            return response.status_code, None
+
+        self.page_cache.save(url, response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return 200, response.text
+
+    @instrumentation.traced("scrape.fetch_article")
+    async def fetch_article_text(self, url: str) -> str:
+        """
+        Fetch the news content, newspaper3k for supported domains and BeautifulSoup as fallback.
+        Errors are returned as text so the LLM can tell a blocked page from a normal one.
+        """
+        try:
+            status_code, html = await self.fetch_html(url)
+        except httpx.HTTPError as e:
+            return f"BeautifulSoup failed: {e}"
+        if html is None:
+            return f"Failed to fetch page: Status Code {status_code}"
+
+        loop = asyncio.get_running_loop()
+        if self.domain_support_cache.get(url) is not False:
+            with instrumentation.span("scrape.extract", parser="newspaper3k"):
+                text = await loop.run_in_executor(self.executor, self.extract_with_newspaper3k, url, html)
+            self.domain_support_cache.set(url, bool(text))
+            if text:
+                return text
+
+        return await loop.run_in_executor(self.executor, self.extract_with_bs4, html)
+
+    @staticmethod
+    def extract_with_newspaper3k(url: str, html: str) -> str:
+        """Parse already downloaded html with newspaper3k, empty string when nothing is extracted."""
+        try:
+            article = Article(url)
+            article.download(input_html=html)
+            article.parse()
+            return article.text
+        except Exception as e:
+            logger.debug("newspaper3k failed on %s: %s", url, e)
+            return ""
+
+    @staticmethod
+    def extract_with_bs4(html: str) -> str:
+        soup = BeautifulSoup(html, 'html.parser')
+        paragraphs = soup.find_all('p')
+        content = "\n".join([p.get_text() for p in paragraphs])
+        return f"Extracted using BeautifulSoup:\n\n{content}"
+
+
+if __name__ == "__main__":
+    configure_logging()
+    async def main():
+        downloader = AsyncNewsDownloader()
+        while True:
+            url = input("\nEnter the news article URL (or type 'exit' to quit): ")
+            if url.lower() == "exit":
+                break
+            content = await downloader.fetch_article_text(url)
+            print("\n" + content[:1000])
+        await downloader.close()
+
+    asyncio.run(main())
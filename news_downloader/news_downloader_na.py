@@ -6,7 +6,9 @@ from typing import Optional, List
 import pandas as pd
 import requests
 
-from config import Config, significant_companies
+from common.logger import configure_logging
+from common.ticker_registry import get_ticker_registry
+from config import Config
 from news_downloader.model_news_article_na import NewsAPIArticle
 
 
@@ -103,7 +105,7 @@ class NewsAPIClient:
     def download_news(self, ticker, from_date=None, to_date=None, language='en', sort_by='publishedAt', page_size=100, page=1) -> Optional[list[NewsAPIArticle]]:
         """Download news from NewsAPI."""
         params = {
-            'q': significant_companies[ticker]["name"],
+            'q': get_ticker_registry().get_news_query(ticker),
             'from': from_date,
             'to': to_date,
             'language': language,
@@ -139,9 +141,10 @@ class NewsAPIClient:
 
 
 if __name__ == "__main__":
+    configure_logging()
     api_client = NewsAPIClient()
     # Download ALL
-    for company_ticker, company_info in significant_companies.items():
+    for company_ticker in get_ticker_registry():
         for days in range(28, 0, -3):
             # from_date_l = "2025-03-13"
             # to_date_l = "2025-03-14"
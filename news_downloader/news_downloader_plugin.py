@@ -1,29 +1,47 @@
-from newspaper import Article
+import asyncio
+import weakref
+
 from semantic_kernel.functions import kernel_function
 
-from news_downloader.news_downloader_3k import NewsDownloader3K
+from common.single_flight import SingleFlight
+from news_downloader.news_downloader_async import AsyncNewsDownloader
 
 
 class NewsDownloader3kPlugin:
+    _fetch_flight = SingleFlight("news_fetch")  # the same breaking-news url is often pasted by many users at once
+    _downloaders = weakref.WeakKeyDictionary()  # event loop -> AsyncNewsDownloader, its client and semaphores are bound to the loop
 
     ######## for SK to get parameters
     @kernel_function(name="fetch_news_from_url",
                      description="Fetch news from the url. "
                                  "Parameters: - url: A string url of the news article.")
-    async def fetch_news_from_url(self, url: str) -> Article:
+    async def fetch_news_from_url(self, url: str) -> str:
 
-        return await self.fetch_news_from_url(url)
+        return await self.fetch_news_from_url_wrapper(url)
 
     ######## for dev to call the function
     @staticmethod
-    async def fetch_news_from_url_wrapper(url: str) -> Article:
-        nd3k = NewsDownloader3K(url)
-        if nd3k.check_news_support():
-            news_article = nd3k.get_article_parsed().text
-        else:
-            news_article = nd3k.get_article_parsed()
-
-        return news_article
+    async def fetch_news_from_url_wrapper(url: str) -> str:
+        return await NewsDownloader3kPlugin._fetch_flight.do(
+            url, lambda: NewsDownloader3kPlugin._get_downloader().fetch_article_text(url))
+
+    @staticmethod
+    def _get_downloader() -> AsyncNewsDownloader:
+        """One downloader per event loop, created on first use so importing the plugin has no side effects."""
+        loop = asyncio.get_running_loop()
+        if loop not in NewsDownloader3kPlugin._downloaders:
+            downloader = AsyncNewsDownloader()
+            NewsDownloader3kPlugin._downloaders[loop] = downloader
+            # a loop ended without aclose() can no longer close the client, at least stop the extraction threads
+            weakref.finalize(loop, downloader.executor.shutdown, wait=False)
+        return NewsDownloader3kPlugin._downloaders[loop]
+
+    @staticmethod
+    async def aclose() -> None:
+        """Close the downloader of the running event loop, call it before the loop ends (e.g. at the end of asyncio.run)."""
+        downloader = NewsDownloader3kPlugin._downloaders.pop(asyncio.get_running_loop(), None)
+        if downloader is not None:
+            await downloader.close()
 
     @kernel_function(name="is_news_content_normal",
                      description="Check the news content is normal. "
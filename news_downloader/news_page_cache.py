@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from config import Config
+
+
+class NewsPageCache:
+    """On-disk HTML cache keeping the ETag / Last-Modified validators of every page."""
+
+    def __init__(self, cache_dir: str = Config.NEWS_PAGE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _get_cache_filename(self, url: str, extension: str) -> str:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.{extension}")
+
+    def load(self, url: str) -> tuple[Optional[str], dict]:
+        """Return the cached html and its metadata, or (None, {}) when the page is not cached."""
+        html_filename = self._get_cache_filename(url, "html")
+        meta_filename = self._get_cache_filename(url, "json")
+        if not (os.path.exists(html_filename) and os.path.exists(meta_filename)):
+            return None, {}
+
+        with open(meta_filename, "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        with open(html_filename, "r", encoding="utf-8") as file:
+            return file.read(), meta
+
+    def save(self, url: str, html: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        with open(self._get_cache_filename(url, "html"), "w", encoding="utf-8") as file:
+            file.write(html)
+        with open(self._get_cache_filename(url, "json"), "w", encoding="utf-8") as file:
+            json.dump({"url": url, "etag": etag, "last_modified": last_modified, "fetched_at": time.time()}, file)
+
+    @staticmethod
+    def get_conditional_headers(meta: dict) -> dict:
+        """Build If-None-Match / If-Modified-Since headers from cached validators."""
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+
+class DomainSupportCache:
+    """
+    Per-domain verdict whether newspaper3k can extract articles, persisted with a TTL. A domain is only marked
+    unsupported after max_failures extractions in a row came back empty, one odd page does not disable it.
+    """
+
+    def __init__(self, filename: str = None, ttl_seconds: float = Config.NEWS_DOMAIN_SUPPORT_TTL_HOURS * 3600,
+                 max_failures: int = Config.NEWS_DOMAIN_MAX_FAILURES):
+        self.filename = filename or os.path.join(Config.NEWS_PAGE_CACHE_DIR, "domain_support.json")
+        self.ttl_seconds = ttl_seconds
+        self.max_failures = max_failures
+        self._lock = threading.Lock()
+        self._verdicts = self._load()
+
+    @staticmethod
+    def get_domain(url: str) -> str:
+        return urlparse(url).netloc.lower()
+
+    def _load(self) -> dict:
+        if os.path.exists(self.filename):
+            with open(self.filename, "r", encoding="utf-8") as file:
+                return json.load(file)
+        return {}
+
+    def _get_fresh(self, domain: str) -> Optional[dict]:
+        verdict = self._verdicts.get(domain)
+        if verdict is None or time.time() - verdict["checked_at"] > self.ttl_seconds:
+            return None
+        return verdict
+
+    def get(self, url: str) -> Optional[bool]:
+        """Return the cached verdict for the url's domain, None when unknown, expired or not failing often enough yet."""
+        verdict = self._get_fresh(self.get_domain(url))
+        if verdict is None:
+            return None
+        if verdict["supported"]:
+            return True
+        # verdicts written before failures were counted are taken as final
+        return False if verdict.get("failures", self.max_failures) >= self.max_failures else None
+
+    def set(self, url: str, supported: bool) -> None:
+        """Record one extraction outcome, a success resets the failure count of the domain."""
+        domain = self.get_domain(url)
+        with self._lock:
+            previous = self._get_fresh(domain)
+            failures = 0
+            if not supported:
+                failures = 1 if previous is None or previous["supported"] else previous.get("failures", 0) + 1
+            self._verdicts[domain] = {"supported": supported, "failures": failures, "checked_at": time.time()}
+            os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+            with open(self.filename, "w", encoding="utf-8") as file:
+                json.dump(self._verdicts, file)
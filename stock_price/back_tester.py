@@ -1,14 +1,21 @@
 import datetime
+import logging
 import math
 
 import backtrader as bt
 import pandas as pd
 
+from common.instrumentation import instrumentation
+from common.logger import configure_logging, get_logger
 from config import Config
+from stock_price.corporate_actions import PriceAdjuster, get_price_adjuster
+from stock_price.price_panel import PricePanel
 from stock_price.trading_date_calculator import TradingHourStatus
 
 BROKER_STARTING_CASH = Config.BROKER_STARTING_CASH
 
+logger = get_logger(__name__)
+
 
 class BacktestResult:
     def __init__(self, total_pnl, total_pnl_ratio):
@@ -16,19 +23,36 @@ class BacktestResult:
         self.total_pnl_ratio = total_pnl_ratio
 
 
+class TradeJournal:
+    """In-memory record of the orders and trades of one or many backtests."""
+
+    def __init__(self):
+        self.events = []
+
+    def record(self, event: str, **fields):
+        self.events.append({"event": event, **fields})
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(self.events)
+
+
 class NewsImpactStrategy(bt.Strategy):
     def __init__(self, impact_weight, maximum_impact_days, minimum_impact_days, position_movement,
-                 start_trading_date, trading_hour_status: TradingHourStatus):
+                 start_trading_date, trading_hour_status: TradingHourStatus, trade_journal: TradeJournal = None,
+                 intraday_entry_price: float = None):
         self.impact_weight = impact_weight
         self.maximum_impact_days = maximum_impact_days
         self.minimum_impact_days = minimum_impact_days
         self.position_movement = position_movement
         self.start_trading_date = start_trading_date  # start trading date
         self.trading_hour_status = trading_hour_status  # trading hour status
+        self.trade_journal = trade_journal
+        self.intraday_entry_price = intraday_entry_price  # open of the first intraday bar after publication, adjusted
 
         self.holding_days = math.floor((self.minimum_impact_days + self.maximum_impact_days) / 2)
         self.size = self.impact_weight * 10  # weight position size
-        self.entry_price = None
+        self.entry_order = None
+        self.entry_price = None  # set when the entry order fills
         self.entry_date = None
         self.total_pnl = 0  # total profit and loss
         self.total_pnl_ratio = 0
@@ -38,17 +62,57 @@ class NewsImpactStrategy(bt.Strategy):
         self.dataclose = self.datas[0].close
 
     def notify_order(self, order):
+        if order is self.entry_order and order.status in [order.Canceled, order.Expired, order.Margin, order.Rejected]:
+            logger.debug("Entry order not filled: %s", order.getstatusname())
         if order.status in [order.Completed]:
-            if order.isbuy():
-                print(f"BUY EXECUTED: Price {order.executed.price}, Size {order.executed.size}, Date {self.datas[0].datetime.date(0)}")
-            elif order.issell():
-                print(f"SELL EXECUTED: Price {order.executed.price}, Size {order.executed.size}, Date {self.datas[0].datetime.date(0)}")
+            if order is self.entry_order:
+                self.entry_price = order.executed.price
+                self.entry_date = self.datas[0].datetime.date(0)
+            side = "BUY" if order.isbuy() else "SELL"
+            if self.trade_journal is not None:
+                self.trade_journal.record("order_executed", side=side, price=order.executed.price,
+                                          size=order.executed.size, date=self.datas[0].datetime.date(0))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s EXECUTED: Price %s, Size %s, Date %s", side, order.executed.price,
+                             order.executed.size, self.datas[0].datetime.date(0))
 
     def notify_trade(self, trade):
         if trade.isclosed:
             pnl = trade.pnl
             self.total_pnl += pnl
-            print(f"TRADE CLOSED: Gross PnL {pnl}, Net PnL {trade.pnlcomm}")
+            if self.trade_journal is not None:
+                self.trade_journal.record("trade_closed", pnl=pnl, pnl_comm=trade.pnlcomm,
+                                          date=self.datas[0].datetime.date(0))
+            logger.debug("TRADE CLOSED: Gross PnL %s, Net PnL %s", pnl, trade.pnlcomm)
+
+    def next_open(self):
+        """
+        Only called with cheat-on-open, enters at the intraday price within the start trading date bar. A price outside
+        the bar's low / high can't fill (another price basis or a bad tick), the daily entry rule is used instead.
+        """
+        current_date = self.datas[0].datetime.date(0)
+        if self.intraday_entry_price is None or self.entry_order is not None or current_date != self.start_trading_date:
+            return
+
+        price = self.intraday_entry_price
+        if not self.data.low[0] <= price <= self.data.high[0]:
+            logger.warning("Intraday entry price %s outside the %s bar [%s, %s], using the daily entry rule",
+                           price, current_date, self.data.low[0], self.data.high[0])
+            self.intraday_entry_price = None
+            return
+        is_long = self.position_movement == 'long'
+        # a stop above / limit below the open fills at exactly the intraday price on this bar
+        if price == self.data.open[0]:
+            exectype = bt.Order.Market
+        elif (price > self.data.open[0]) == is_long:
+            exectype = bt.Order.Stop
+        else:
+            exectype = bt.Order.Limit
+        logger.debug("Entering %s position on %s at intraday price %s", self.position_movement, current_date, price)
+        if is_long:
+            self.entry_order = self.buy(price=price, exectype=exectype, size=self.size, valid=self.data.datetime.datetime(0))
+        else:
+            self.entry_order = self.sell(price=price, exectype=exectype, size=self.size, valid=self.data.datetime.datetime(0))
 
     def next(self):
         current_date = self.datas[0].datetime.date(0)
@@ -59,51 +123,62 @@ class NewsImpactStrategy(bt.Strategy):
         # print(f" - Trade Completed: {self.trade_completed}")
 
         if not self.trade_completed:
-            if current_date == self.start_trading_date:
-                print(" -> Condition met: Entering position")
+            if current_date == self.start_trading_date and self.intraday_entry_price is None and self.entry_order is None:
+                logger.debug("Entering %s position on %s", self.position_movement, current_date)
                 if self.position_movement == 'long':
                     if self.trading_hour_status.is_in_trading_hour:
-                        self.buy(price=self.data.high[0], size=self.size)
-                        self.entry_price = self.data.high[0]
+                        self.entry_order = self.buy(price=self.data.high[0], size=self.size)
                     else:
-                        self.buy(price=self.data.open[0], size=self.size)
-                        self.entry_price = self.data.open[0]
+                        self.entry_order = self.buy(price=self.data.open[0], size=self.size)
                 else:
                     if self.trading_hour_status.is_in_trading_hour:
-                        self.sell(price=self.data.low[0], size=self.size)
-                        self.entry_price = self.data.low[0]
+                        self.entry_order = self.sell(price=self.data.low[0], size=self.size)
                     else:
-                        self.sell(price=self.data.open[0], size=self.size)
-                        self.entry_price = self.data.open[0]
+                        self.entry_order = self.sell(price=self.data.open[0], size=self.size)
 
-                self.entry_price = self.data.close[0]
-                self.entry_date = current_date
-
-            if self.position and (current_date - self.entry_date).days >= self.holding_days:
-                print(" -> Condition met: Closing position")
+            # the holding period counts from the start trading date, whichever bar the entry filled on
+            if self.position and (current_date - self.start_trading_date).days >= self.holding_days:
+                logger.debug("Closing position on %s", current_date)
                 self.close()
                 self.trade_completed = True  # Trade completed, no entry anymore
 
     def stop(self):
-        print(f"FINAL TOTAL PnL: {self.total_pnl}")
-        self.total_pnl_ratio = self.total_pnl / (self.entry_price * self.size)
-        print(f"FINAL TOTAL PnL%: {self.total_pnl_ratio}")
-        if self.total_pnl > 0:
-            print("RESULT: GAIN ✅")
-        elif self.total_pnl < 0:
-            print("RESULT: LOSS ❌")
-        else:
-            print("RESULT: BREAKEVEN ⚖️")
+        self.total_pnl_ratio = self.total_pnl / (self.entry_price * self.size) if self.entry_price else 0
+        if self.trade_journal is not None:
+            self.trade_journal.record("backtest_finished", total_pnl=self.total_pnl, total_pnl_ratio=self.total_pnl_ratio,
+                                      start_trading_date=self.start_trading_date)
+        logger.info("Backtest finished: total PnL %s, PnL ratio %s", self.total_pnl, self.total_pnl_ratio)
 
 
 class BacktestRunner:
     def __init__(self, data_frame):
         self.data_frame = data_frame
 
+    @classmethod
+    def from_price_panel(cls, price_panel: PricePanel, ticker: str, start_date: str, end_date: str,
+                         adjusted: bool = True) -> "BacktestRunner":
+        """
+        Runner over a slice of a (memory-mapped or shared) price panel, no csv parsing.
+        The raw bars are adjusted for splits and dividends up to end_date, like StockPriceDataDownloader does.
+        """
+        frame = price_panel.get_frame(ticker, start_date, end_date)
+        return cls(get_price_adjuster().adjust(ticker, frame, as_of=end_date) if adjusted else frame)
+
+    @instrumentation.traced("backtest.run")
     def run(self,
             impact_weight, maximum_impact_days, minimum_impact_days,
-            position_movement, start_trading_date: datetime, trading_hour_status=None):
-        cerebro = bt.Cerebro()
+            position_movement, start_trading_date: datetime, trading_hour_status=None, trade_journal: TradeJournal = None,
+            intraday_entry_price: float = None):
+        """
+        With an intraday_entry_price (see IntradayPriceStore.get_entry_price) the position is opened at that price
+        on the start trading date bar, otherwise the daily bar rules apply. Intraday bars are raw, the price is put on
+        the basis of the daily bars with their price_factor (see PriceAdjuster.adjust).
+        """
+        data_frame = self.data_frame
+        if intraday_entry_price is not None:
+            intraday_entry_price *= PriceAdjuster.get_price_factor(data_frame, start_trading_date)
+            data_frame = self._with_warm_up_bar(data_frame)
+        cerebro = bt.Cerebro(cheat_on_open=intraday_entry_price is not None)
         cerebro.broker.setcash(BROKER_STARTING_CASH)
         cerebro.addstrategy(NewsImpactStrategy,
                             impact_weight=impact_weight,
@@ -111,18 +186,35 @@ class BacktestRunner:
                             minimum_impact_days=minimum_impact_days,
                             position_movement=position_movement,
                             start_trading_date=start_trading_date,
-                            trading_hour_status=trading_hour_status
+                            trading_hour_status=trading_hour_status,
+                            trade_journal=trade_journal,
+                            intraday_entry_price=intraday_entry_price
                             )
 
-        cerebro.adddata(bt.feeds.PandasData(dataname=self.data_frame))
+        cerebro.adddata(bt.feeds.PandasData(dataname=data_frame))
         st = cerebro.run()
 
         # cerebro.plot()
 
         return BacktestResult(st[0].total_pnl, st[0].total_pnl_ratio)
 
+    @staticmethod
+    def _with_warm_up_bar(data_frame: pd.DataFrame) -> pd.DataFrame:
+        """backtrader never calls next_open on the first bar, so put a flat bar one day before it."""
+        if data_frame.empty:
+            return data_frame
+        first_bar = data_frame.iloc[[0]].copy()
+        first_bar.index = first_bar.index - pd.Timedelta(days=1)
+        for column in ("high", "low", "close"):
+            if column in first_bar.columns:
+                first_bar[column] = first_bar["open"]
+        if "volume" in first_bar.columns:
+            first_bar["volume"] = 0
+        return pd.concat([first_bar, data_frame])
+
 
 if __name__ == "__main__":
+    configure_logging()
     impact_weight_l = 6
     maximum_impact_days_l = 4
     minimum_impact_days_l = 2
@@ -0,0 +1,341 @@
+import glob
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from common.logger import configure_logging, get_logger
+from config import Config
+from stock_price.price_panel import PricePanel
+
+logger = get_logger(__name__)
+
+ACTION_SPLIT = "split"
+ACTION_DIVIDEND = "dividend"
+EVENT_COLUMNS = ["date", "action", "value"]
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+PRICE_CACHE_FORMAT_FILE = "cache_format.json"
+PRICE_FACTOR_COLUMN = "price_factor"
+
+
+class CorporateActionStore:
+    """
+    Split / dividend events per ticker, one csv per ticker: date (ex-date), action, value.
+    A split value is the share ratio (10 for a 10-for-1 split), a dividend value is cash per raw (unsplit) share.
+    """
+
+    def __init__(self, folder: str = Config.CORPORATE_ACTIONS_FOLDER):
+        self.folder = folder
+        self._events = {}
+        os.makedirs(self.folder, exist_ok=True)
+
+    def get_filename(self, ticker: str) -> str:
+        return os.path.join(self.folder, f"{ticker}.csv")
+
+    def has_events(self, ticker: str) -> bool:
+        return ticker in self._events or os.path.exists(self.get_filename(ticker))
+
+    def load(self, ticker: str) -> pd.DataFrame:
+        """Events sorted by date, empty when the ticker has none."""
+        if ticker not in self._events:
+            filename = self.get_filename(ticker)
+            if os.path.exists(filename):
+                events = pd.read_csv(filename, parse_dates=["date"])
+            else:
+                events = pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "action": pd.Series(dtype=str),
+                                       "value": pd.Series(dtype=float)})
+            self._events[ticker] = events.sort_values("date", ignore_index=True)
+        return self._events[ticker]
+
+    def save(self, ticker: str, events: pd.DataFrame) -> pd.DataFrame:
+        """Merge events into the stored table, a later row for the same date and action wins."""
+        merged = pd.concat([self.load(ticker), events[EVENT_COLUMNS]])
+        merged = merged.drop_duplicates(subset=["date", "action"], keep="last").sort_values("date", ignore_index=True)
+        merged.to_csv(self.get_filename(ticker), index=False, date_format="%Y-%m-%d")
+        self._events[ticker] = merged
+        return merged
+
+    def download(self, ticker: str) -> pd.DataFrame:
+        """Fetch the split / dividend history from Yahoo Finance and merge it into the table."""
+        try:
+            actions = yf.Ticker(ticker).actions
+        except Exception as e:
+            logger.exception("Error occurred while downloading %s corporate actions: %s", ticker, e)
+            return self.load(ticker)
+        if actions is None or actions.empty:
+            return self.load(ticker)
+
+        dates = pd.DatetimeIndex(actions.index).tz_localize(None).normalize()
+        splits = actions.get("Stock Splits", pd.Series(0.0, index=actions.index)).to_numpy(dtype=np.float64)
+        dividends = actions.get("Dividends", pd.Series(0.0, index=actions.index)).to_numpy(dtype=np.float64)
+
+        split_events = pd.DataFrame({"date": dates[splits > 0], "action": ACTION_SPLIT, "value": splits[splits > 0]})
+        # Yahoo reports dividends per current share, convert back to the share count on the ex-date
+        later_splits = PriceAdjuster.split_factors(split_events, dates[dividends > 0])
+        dividend_events = pd.DataFrame({"date": dates[dividends > 0], "action": ACTION_DIVIDEND,
+                                        "value": dividends[dividends > 0] / later_splits})
+        events = self.save(ticker, pd.concat([split_events, dividend_events]))
+        logger.info("%s corporate actions: %s splits, %s dividends", ticker, len(split_events), len(dividend_events))
+        return events
+
+
+class PriceAdjuster:
+    """
+    Computes adjusted OHLC from raw bars plus the event table, vectorized over all bars.
+    Factors only change at ex-dates, so adjusted series are cached per (ticker, last event applied by the as-of date).
+    """
+
+    def __init__(self, store: CorporateActionStore = None, cache_size: int = Config.ADJUSTED_PRICE_CACHE_SIZE):
+        self.store = store or CorporateActionStore()
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def split_factors(events: pd.DataFrame, bar_dates) -> np.ndarray:
+        """Product of the split ratios with an ex-date after each bar date, i.e. raw shares per current share."""
+        splits = events[events["action"] == ACTION_SPLIT]
+        split_dates = splits["date"].to_numpy(dtype="datetime64[D]")
+        suffix_product = np.append(np.cumprod(splits["value"].to_numpy(dtype=np.float64)[::-1])[::-1], 1.0)
+        return suffix_product[np.searchsorted(split_dates, np.asarray(bar_dates, dtype="datetime64[D]"), side="right")]
+
+    @staticmethod
+    def adjustment_factors(events: pd.DataFrame, bar_dates, raw_close: np.ndarray, dividends: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Price and volume multipliers per bar. Each event multiplies every earlier bar by 1/ratio (split)
+        or 1 - dividend / previous raw close (dividend), the same convention Yahoo uses for adjusted close.
+        """
+        bar_dates = np.asarray(bar_dates, dtype="datetime64[D]")
+        event_dates = events["date"].to_numpy(dtype="datetime64[D]")
+        values = events["value"].to_numpy(dtype=np.float64)
+        is_split = (events["action"] == ACTION_SPLIT).to_numpy()
+
+        event_factors = np.ones(len(events))
+        event_factors[is_split] = 1 / values[is_split]
+        if dividends:
+            is_dividend = (events["action"] == ACTION_DIVIDEND).to_numpy()
+            previous_bar = np.searchsorted(bar_dates, event_dates[is_dividend], side="left") - 1
+            previous_close = np.where(previous_bar >= 0, raw_close[np.maximum(previous_bar, 0)], np.nan)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                dividend_factors = 1 - values[is_dividend] / previous_close
+            event_factors[is_dividend] = np.where(np.isfinite(dividend_factors) & (dividend_factors > 0), dividend_factors, 1.0)
+
+        split_only = np.where(is_split, event_factors, 1.0)
+        positions = np.searchsorted(event_dates, bar_dates, side="right")
+        price_factors = np.append(np.cumprod(event_factors[::-1])[::-1], 1.0)[positions]
+        volume_factors = 1 / np.append(np.cumprod(split_only[::-1])[::-1], 1.0)[positions]
+        return price_factors, volume_factors
+
+    def adjust(self, ticker: str, raw_data: pd.DataFrame, as_of=None, dividends: bool = True) -> pd.DataFrame:
+        """
+        Adjusted copy of raw bars (Date index) on the price basis of the as-of date, events after it are ignored.
+        adj_close is set to the adjusted close, price_factor to the multiplier from a raw price of that date, so raw
+        prices from other sources (intraday bars) can be put on the same basis with get_price_factor.
+        """
+        events = self.store.load(ticker)
+        if as_of is not None:
+            events = events[events["date"] <= pd.Timestamp(as_of)]
+        if events.empty:
+            return raw_data
+
+        key = (ticker, len(events), events["date"].iloc[-1], dividends, len(raw_data),
+               raw_data.index[0] if len(raw_data) else None, raw_data.index[-1] if len(raw_data) else None)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        # legacy csv caches may contain repeated header rows, they become NaN
+        raw_values = {column: pd.to_numeric(raw_data[column], errors="coerce").to_numpy(dtype=np.float64)
+                      for column in PRICE_COLUMNS + ["volume"] if column in raw_data.columns}
+        price_factors, volume_factors = self.adjustment_factors(events, raw_data.index.values, raw_values["close"], dividends)
+        adjusted = raw_data.copy()
+        for column in PRICE_COLUMNS:
+            adjusted[column] = raw_values[column] * price_factors
+        if "volume" in raw_values:
+            adjusted["volume"] = raw_values["volume"] * volume_factors
+        adjusted["adj_close"] = adjusted["close"]
+        adjusted[PRICE_FACTOR_COLUMN] = price_factors
+
+        self._cache[key] = adjusted
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return adjusted
+
+    @staticmethod
+    def get_price_factor(adjusted_data: pd.DataFrame, date) -> float:
+        """
+        Multiplier from a raw price on date to the basis of an adjust() result, factors only change at ex-dates so
+        the last bar at or before date is used. 1.0 when the frame was not adjusted (no events).
+        """
+        if PRICE_FACTOR_COLUMN not in adjusted_data.columns or adjusted_data.empty:
+            return 1.0
+        factors = adjusted_data[PRICE_FACTOR_COLUMN]
+        position = max(int(factors.index.searchsorted(pd.Timestamp(date), side="right")) - 1, 0)
+        return float(factors.iloc[position])
+
+    def get_panel_factors(self, price_panel: PricePanel, as_of=None, dividends: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """
+        [ticker x date] price and volume multipliers from the raw panel bars to the basis of the as-of date (the last
+        panel date by default), 1 where no event applies. adjust_panel multiplies the bars with them.
+        """
+        as_of = pd.Timestamp(as_of if as_of is not None else price_panel.dates[-1]) if len(price_panel.dates) else None
+        price_factors = np.ones((len(price_panel.tickers), len(price_panel.dates)))
+        volume_factors = np.ones_like(price_factors)
+        closes = price_panel.get_field("close")
+        for row, ticker in enumerate(price_panel.tickers):
+            events = self.store.load(ticker)
+            events = events[events["date"] <= as_of] if as_of is not None else events.iloc[:0]
+            if events.empty:
+                continue
+            bars = ~np.isnan(closes[row])
+            price_factors[row, bars], volume_factors[row, bars] = self.adjustment_factors(
+                events, price_panel.dates[bars], np.asarray(closes[row, bars], dtype=np.float64), dividends)
+        return price_factors, volume_factors
+
+    def adjust_panel(self, price_panel: PricePanel, as_of=None, dividends: bool = True) -> PricePanel:
+        """
+        Adjusted copy of a raw price panel, every ticker on the price basis of the as-of date (the last panel date
+        by default), so vectorized consumers never see a split as a price jump.
+        """
+        price_factors, volume_factors = self.get_panel_factors(price_panel, as_of, dividends)
+        values = np.array(price_panel.values, dtype=np.float64)  # the panel may be memory-mapped read-only
+        field_index = price_panel.field_index
+        for column in PRICE_COLUMNS:
+            values[:, :, field_index[column]] *= price_factors
+        if "volume" in field_index:
+            values[:, :, field_index["volume"]] *= volume_factors
+        if "adj_close" in field_index:
+            values[:, :, field_index["adj_close"]] = values[:, :, field_index["close"]]
+        return PricePanel(price_panel.tickers, price_panel.dates, values, price_panel.fields)
+
+    def to_raw(self, ticker: str, split_adjusted_data: pd.DataFrame, events: pd.DataFrame = None) -> pd.DataFrame:
+        """Undo the split adjustment Yahoo applies up to today, so cached bars never change when a split happens."""
+        events = self.store.load(ticker) if events is None else events
+        if events.empty or split_adjusted_data.empty:
+            return split_adjusted_data
+        split_factors = self.split_factors(events, pd.to_datetime(split_adjusted_data["Date"]).values)
+        raw = split_adjusted_data.copy()
+        for column in PRICE_COLUMNS:
+            raw[column] = split_adjusted_data[column].to_numpy(dtype=np.float64) * split_factors
+        if "volume" in raw.columns:
+            raw["volume"] = split_adjusted_data["volume"].to_numpy(dtype=np.float64) / split_factors
+        return raw
+
+
+@lru_cache(maxsize=1)
+def get_price_adjuster() -> PriceAdjuster:
+    """Shared adjuster, adjusted series are cached across downloaders and the event folder is only created on first use."""
+    return PriceAdjuster()
+
+
+class PriceCacheFormat:
+    """
+    Which csv files of a price cache folder hold raw bars. Files cached before bars were stored raw hold Yahoo's
+    split-adjusted bars, migrate_price_cache converts them once so adjust() doesn't apply the same splits twice.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.filename = os.path.join(folder, PRICE_CACHE_FORMAT_FILE)
+        self._lock = threading.Lock()
+        self._raw_tickers = self._load()
+
+    def _load(self) -> set[str]:
+        if not os.path.exists(self.filename):
+            return set()
+        with open(self.filename, "r", encoding="utf-8") as file:
+            return set(json.load(file)["raw_tickers"])
+
+    def is_raw(self, ticker: str) -> bool:
+        return ticker in self._raw_tickers
+
+    def mark_raw(self, tickers: List[str]) -> None:
+        with self._lock:
+            if self._raw_tickers.issuperset(tickers):
+                return
+            self._raw_tickers.update(tickers)
+            os.makedirs(self.folder, exist_ok=True)
+            temp_filename = f"{self.filename}.tmp"
+            with open(temp_filename, "w", encoding="utf-8") as file:
+                json.dump({"raw_tickers": sorted(self._raw_tickers)}, file)
+            os.replace(temp_filename, self.filename)
+
+
+@lru_cache(maxsize=None)
+def get_price_cache_format(folder: str) -> PriceCacheFormat:
+    return PriceCacheFormat(folder)
+
+
+def get_applied_splits(data: pd.DataFrame, events: pd.DataFrame, cached_at) -> pd.DataFrame:
+    """
+    Split events a legacy (split-adjusted) csv cache already has applied. A split inside the cached range is applied
+    when the close doesn't jump by its ratio across the ex-date, for a later split the file's modification time is the
+    only evidence of whether Yahoo knew it.
+    """
+    splits = events[events["action"] == ACTION_SPLIT]
+    dates = data["Date"].to_numpy(dtype="datetime64[D]")
+    closes = data["close"].to_numpy(dtype=np.float64)
+    applied = []
+    for split_date, ratio in zip(splits["date"].to_numpy(dtype="datetime64[D]"), splits["value"].to_numpy(dtype=np.float64)):
+        position = int(np.searchsorted(dates, split_date, side="left"))
+        if 0 < position < len(dates):
+            jump = closes[position] / closes[position - 1]
+            applied.append(abs(np.log(jump * ratio)) > abs(np.log(jump)))
+        else:
+            applied.append(split_date <= np.datetime64(pd.Timestamp(cached_at).date()))
+    return splits[np.array(applied, dtype=bool)] if len(splits) else splits
+
+
+def convert_legacy_bars(price_adjuster: PriceAdjuster, ticker: str, data: pd.DataFrame, events: pd.DataFrame, cached_at) -> pd.DataFrame:
+    """Raw bars of a legacy cache frame (Date column), the splits it has applied are undone."""
+    data = data.copy()
+    # legacy csv caches may contain repeated header rows, they are dropped
+    data["Date"] = pd.to_datetime(data["Date"], errors="coerce")
+    for column in PRICE_COLUMNS + ["volume", "adj_close"]:
+        if column in data.columns:
+            data[column] = pd.to_numeric(data[column], errors="coerce")
+    data = data.dropna(subset=["Date", "close"]).sort_values("Date", ignore_index=True)
+    return price_adjuster.to_raw(ticker, data, get_applied_splits(data, events, cached_at))
+
+
+def migrate_price_cache(folder: str, tickers: List[str] = None, price_adjuster: PriceAdjuster = None,
+                        download: bool = False) -> List[str]:
+    """
+    Conversion of legacy csv caches to raw bars, returns the converted tickers. Read paths only use the stored events:
+    a legacy ticker without any is left as cached, adjust() then has nothing to apply to it either, and it is converted
+    when StockPriceDataDownloader downloads its bars and events. download fetches missing events (the CLI).
+    """
+    cache_format = get_price_cache_format(folder)
+    if tickers is None:
+        tickers = sorted(os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(folder, "*.csv")))
+    price_adjuster = price_adjuster or get_price_adjuster()
+    store = price_adjuster.store
+    converted = []
+    for ticker in tickers:
+        filename = os.path.join(folder, f"{ticker}.csv")
+        if cache_format.is_raw(ticker) or not os.path.exists(filename):
+            continue
+        if store.has_events(ticker):
+            events = store.load(ticker)
+        elif download:
+            events = store.download(ticker)
+        else:
+            continue
+        cached_at = pd.Timestamp(os.path.getmtime(filename), unit="s")
+        raw = convert_legacy_bars(price_adjuster, ticker, pd.read_csv(filename), events, cached_at)
+        raw.to_csv(filename, index=False, date_format="%Y-%m-%d")
+        cache_format.mark_raw([ticker])
+        converted.append(ticker)
+        logger.info("Converted the %s price cache to raw bars", ticker)
+    return converted
+
+
+if __name__ == "__main__":
+    configure_logging()
+    # one-off conversion of a legacy cache, downloads the events of every cached ticker
+    print(f"Converted {migrate_price_cache('data_stock_price', download=True)}")
@@ -0,0 +1,139 @@
+import os
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from common.logger import configure_logging, get_logger
+from common.ticker_registry import get_ticker_registry
+from config import Config
+
+logger = get_logger(__name__)
+
+# 24 bytes per bar: uint32 epoch seconds (UTC bar start) in one file, float32 prices and uint32 volume in another
+INTRADAY_TIMESTAMP_DTYPE = np.dtype("<u4")
+INTRADAY_BAR_DTYPE = np.dtype([("open", "<f4"), ("high", "<f4"), ("low", "<f4"), ("close", "<f4"), ("volume", "<u4")])
+
+
+class IntradayBars:
+    """Sorted intraday bars of one ticker, backed by memory-mapped arrays."""
+
+    def __init__(self, timestamps: np.ndarray, bars: np.ndarray):
+        self.timestamps = timestamps
+        self.bars = bars
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @staticmethod
+    def to_epoch_seconds(timestamp) -> int:
+        """Naive timestamps are taken as UTC, like NewsArticle.published_at."""
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize("UTC")
+        return int(timestamp.timestamp())
+
+    def first_bar_after(self, timestamp) -> Optional[int]:
+        """Position of the first bar starting at or after the timestamp, O(log n)."""
+        position = int(np.searchsorted(self.timestamps, self.to_epoch_seconds(timestamp), side="left"))
+        return position if position < len(self.timestamps) else None
+
+    def get_range(self, start, end) -> "IntradayBars":
+        """Bars starting in [start, end), the slices stay views on the mapped files."""
+        start_position, end_position = np.searchsorted(self.timestamps, [self.to_epoch_seconds(start), self.to_epoch_seconds(end)])
+        return IntradayBars(self.timestamps[start_position:end_position], self.bars[start_position:end_position])
+
+    def to_frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame({field: np.asarray(self.bars[field], dtype=np.float64) for field in INTRADAY_BAR_DTYPE.names})
+        frame.index = pd.to_datetime(np.asarray(self.timestamps, dtype=np.int64), unit="s", utc=True).rename("Datetime")
+        return frame
+
+
+class IntradayPriceStore:
+    """
+    Minute / hourly bars per ticker as narrow-dtype .npy files, opened with mmap so only the pages a lookup touches
+    are read. A year of minute bars is about 2.4 MB per ticker.
+    """
+
+    def __init__(self, folder: str = Config.INTRADAY_PRICE_FOLDER, interval: str = Config.INTRADAY_INTERVAL):
+        self.folder = os.path.join(folder, interval)
+        self.interval = interval
+        self._bars = {}
+        os.makedirs(self.folder, exist_ok=True)
+
+    def get_paths(self, ticker: str) -> tuple[str, str]:
+        base = os.path.join(self.folder, ticker)
+        return f"{base}.timestamps.npy", f"{base}.bars.npy"
+
+    def load(self, ticker: str) -> Optional[IntradayBars]:
+        """Memory-mapped bars of a ticker, None when nothing was downloaded yet."""
+        if ticker not in self._bars:
+            timestamps_path, bars_path = self.get_paths(ticker)
+            if not os.path.exists(timestamps_path):
+                return None
+            self._bars[ticker] = IntradayBars(np.load(timestamps_path, mmap_mode="r"), np.load(bars_path, mmap_mode="r"))
+        return self._bars[ticker]
+
+    def save(self, ticker: str, frame: pd.DataFrame) -> None:
+        """Merge a frame (datetime index, open/high/low/close/volume columns) into the stored bars."""
+        existing = self.load(ticker)
+        if existing is not None and len(existing):
+            frame = pd.concat([existing.to_frame(), frame])
+        frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+
+        index = frame.index.tz_convert("UTC") if frame.index.tz else frame.index.tz_localize("UTC")
+        timestamps = (index - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+        bars = np.empty(len(frame), dtype=INTRADAY_BAR_DTYPE)
+        for field in INTRADAY_BAR_DTYPE.names:
+            bars[field] = frame[field].to_numpy()
+
+        # drop the mapping before replacing the files
+        self._bars.pop(ticker, None)
+        for path, values in zip(self.get_paths(ticker), (timestamps.astype(INTRADAY_TIMESTAMP_DTYPE), bars)):
+            temp_path = f"{path}.tmp.npy"
+            np.save(temp_path, values)
+            os.replace(temp_path, path)
+        logger.info("Saved %s %s bars of %s", len(frame), self.interval, ticker)
+
+    def download(self, ticker: str, start: str, end: str) -> None:
+        """Download bars from Yahoo Finance, which only keeps 1m bars for the last 30 days and 1h bars for 730 days."""
+        try:
+            data = yf.download(ticker, start=start, end=end, interval=self.interval, auto_adjust=False, progress=False)
+        except Exception as e:
+            logger.exception("Error occurred while downloading %s %s bars: %s", ticker, self.interval, e)
+            return
+        if data.empty:
+            logger.warning("No %s %s bars retrieved", ticker, self.interval)
+            return
+        if isinstance(data.columns, pd.MultiIndex):
+            data.columns = data.columns.get_level_values(0)
+        data = data.rename(columns={"Open": "open", "High": "high", "Low": "low", "Close": "close", "Volume": "volume"})
+        self.save(ticker, data)
+
+    def get_entry_price(self, ticker: str, published_at: datetime) -> Optional[float]:
+        """
+        Open of the first bar at or after the publication time within the same US/Eastern trading day,
+        None when no intraday bar covers it so callers fall back to daily bars.
+        """
+        intraday_bars = self.load(ticker)
+        if intraday_bars is None:
+            return None
+        position = intraday_bars.first_bar_after(published_at)
+        if position is None:
+            return None
+
+        published_date = pd.Timestamp(IntradayBars.to_epoch_seconds(published_at), unit="s", tz="UTC").tz_convert("US/Eastern").date()
+        bar_date = pd.Timestamp(int(intraday_bars.timestamps[position]), unit="s", tz="UTC").tz_convert("US/Eastern").date()
+        if bar_date != published_date:
+            return None
+        return float(intraday_bars.bars["open"][position])
+
+
+if __name__ == "__main__":
+    configure_logging()
+    store = IntradayPriceStore()
+    end_date = pd.Timestamp.now(tz="UTC").normalize()
+    for company_ticker in get_ticker_registry():
+        store.download(company_ticker, (end_date - pd.Timedelta(days=29)).strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
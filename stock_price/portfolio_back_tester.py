@@ -0,0 +1,178 @@
+from collections import defaultdict
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from common.logger import configure_logging, get_logger
+from config import Config
+from stock_price.corporate_actions import get_price_adjuster
+from stock_price.price_panel import PricePanel
+from stock_price.strategy_sweep import SignalSet, HOLDING_RULES, SIZING_FUNCTIONS
+
+logger = get_logger(__name__)
+
+
+class PortfolioBacktestResult:
+    def __init__(self, trades: pd.DataFrame, equity_curve: pd.Series, starting_cash: float, rejected_signals: int):
+        self.trades = trades
+        self.equity_curve = equity_curve
+        self.starting_cash = starting_cash
+        self.rejected_signals = rejected_signals
+
+    def summary(self) -> dict:
+        final_equity = float(self.equity_curve.iloc[-1]) if len(self.equity_curve) else self.starting_cash
+        running_peak = self.equity_curve.cummax()
+        closed = self.trades[self.trades["status"] == "closed"] if len(self.trades) else self.trades
+        return {
+            "starting_cash": self.starting_cash,
+            "final_equity": final_equity,
+            "total_pnl": final_equity - self.starting_cash,
+            "total_return": final_equity / self.starting_cash - 1,
+            "max_drawdown": float(((running_peak - self.equity_curve) / running_peak).max()) if len(self.equity_curve) else 0.0,
+            "trades": int(len(self.trades)),
+            "hit_rate": float((closed["pnl"] > 0).mean()) if len(closed) else float("nan"),
+            "rejected_signals": self.rejected_signals,
+        }
+
+
+class PortfolioBacktestRunner:
+    """
+    Replays every news signal of every ticker in chronological order on one shared account.
+
+    Positions can overlap, each one reserves its notional from cash (shorts included, as margin) and
+    a ticker's open notional is capped at max_ticker_exposure of current equity. One event-driven pass runs over
+    the date axis of the price panel. Fills follow NewsImpactStrategy run by BacktestRunner, counted on the ticker's
+    own bars: the entry market order fills at the open of the bar after the start trading date, the close is submitted
+    on the first bar after that at least holding_days calendar days after the start trading date and fills at the open
+    of the following bar. Positions are valued at the last valid close, those without an exit bar stay open.
+    Prices are adjusted for splits and dividends up to the last panel date unless adjusted is False.
+    """
+
+    def __init__(self, price_panel: PricePanel, starting_cash: float = Config.BROKER_STARTING_CASH,
+                 max_ticker_exposure: float = Config.PORTFOLIO_MAX_TICKER_EXPOSURE,
+                 holding_rule: Callable = HOLDING_RULES["midpoint"], sizing: Callable = SIZING_FUNCTIONS["impact_weight_x10"],
+                 adjusted: bool = True):
+        self.price_panel = get_price_adjuster().adjust_panel(price_panel) if adjusted else price_panel
+        self.starting_cash = float(starting_cash)
+        self.max_ticker_exposure = max_ticker_exposure
+        self.holding_rule = holding_rule
+        self.sizing = sizing
+
+    @staticmethod
+    def _get_next_bar_positions(opens: np.ndarray) -> np.ndarray:
+        """[ticker x date + 1] position of the first bar on or after each date with an open, len(dates) when none."""
+        ticker_count, date_count = opens.shape
+        next_positions = np.full((ticker_count, date_count + 1), date_count, dtype=int)
+        for position in range(date_count - 1, -1, -1):
+            next_positions[:, position] = np.where(np.isnan(opens[:, position]), next_positions[:, position + 1], position)
+        return next_positions
+
+    def _schedule(self, signals: SignalSet, opens: np.ndarray):
+        """Entry / exit fill positions of every signal, entry -1 when the signal can't be traded, exit len(dates) when past the panel."""
+        panel = self.price_panel
+        date_count = len(panel.dates)
+        ticker_rows = np.array([panel.ticker_index.get(ticker, -1) for ticker in signals.tickers], dtype=int)
+        start_positions = np.minimum(panel.date_position(signals.start_dates), date_count)
+        next_positions = self._get_next_bar_positions(opens)
+        rows = np.maximum(ticker_rows, 0)
+
+        # the market order is submitted on the start trading date bar and fills at the next bar's open
+        entry_positions = next_positions[rows, np.minimum(start_positions + 1, date_count)]
+        holding_days = self.holding_rule(signals.impact_days_min, signals.impact_days_max, signals.impact_weight)
+        close_dates = signals.start_dates + holding_days.astype("timedelta64[D]")
+        close_positions = next_positions[rows, np.minimum(np.maximum(panel.date_position(close_dates), entry_positions), date_count)]
+        exit_positions = next_positions[rows, np.minimum(close_positions + 1, date_count)]
+
+        tradable = (ticker_rows >= 0) & (start_positions < date_count) & (entry_positions < date_count)
+        return ticker_rows, np.where(tradable, entry_positions, -1), exit_positions
+
+    def run(self, signals: SignalSet) -> PortfolioBacktestResult:
+        panel = self.price_panel
+        opens, closes = panel.get_field("open"), panel.get_field("close")
+        ticker_rows, entry_positions, exit_positions = self._schedule(signals, opens)
+        sizes = self.sizing(signals.impact_weight)
+
+        entries_by_position = defaultdict(list)
+        for i in np.flatnonzero(entry_positions >= 0):
+            entries_by_position[entry_positions[i]].append(i)
+
+        cash = self.starting_cash
+        open_positions = {}  # signal index -> dict
+        ticker_notional = defaultdict(float)
+        exits_by_position = defaultdict(list)
+        trades, equity, rejected = [], np.empty(len(panel.dates)), int((entry_positions < 0).sum())
+
+        for position in range(len(panel.dates)):
+            # 1. exits at the open
+            for i in exits_by_position.pop(position, []):
+                trade = open_positions.pop(i)
+                exit_price = opens[trade["row"], position]  # exits are scheduled on bars with an open
+                pnl = trade["direction"] * (exit_price - trade["entry_price"]) * trade["quantity"]
+                cash += trade["notional"] + pnl
+                ticker_notional[trade["ticker"]] -= trade["notional"]
+                trades.append({**trade, "exit_date": panel.dates[position], "exit_price": exit_price, "pnl": pnl, "status": "closed"})
+
+            # 2. entries at the open, in signal order
+            if position in entries_by_position:
+                current_equity = cash + self._open_value(open_positions, closes, position - 1)
+                for i in entries_by_position[position]:
+                    row, ticker = ticker_rows[i], signals.tickers[i]
+                    entry_price = opens[row, position]
+                    if np.isnan(entry_price) or entry_price <= 0:
+                        rejected += 1
+                        continue
+                    exposure_room = self.max_ticker_exposure * current_equity - ticker_notional[ticker]
+                    quantity = np.floor(min(sizes[i], cash / entry_price, max(exposure_room, 0) / entry_price))
+                    if quantity <= 0:
+                        rejected += 1
+                        continue
+                    notional = quantity * entry_price
+                    cash -= notional
+                    ticker_notional[ticker] += notional
+                    open_positions[i] = {"ticker": ticker, "row": row, "direction": signals.direction[i],
+                                         "quantity": quantity, "entry_date": panel.dates[position],
+                                         "entry_price": entry_price, "notional": notional, "last_price": entry_price}
+                    if exit_positions[i] < len(panel.dates):
+                        exits_by_position[exit_positions[i]].append(i)
+
+            # 3. mark to market at the close
+            equity[position] = cash + self._open_value(open_positions, closes, position)
+
+        # positions still open at the end of the panel, valued at their last valid close
+        last_position = len(panel.dates) - 1
+        for i, trade in open_positions.items():
+            exit_price = trade["last_price"]
+            pnl = trade["direction"] * (exit_price - trade["entry_price"]) * trade["quantity"]
+            trades.append({**trade, "exit_date": panel.dates[last_position], "exit_price": exit_price, "pnl": pnl, "status": "open"})
+
+        trades_df = pd.DataFrame(trades).drop(columns=["row", "last_price"], errors="ignore")
+        equity_curve = pd.Series(equity, index=pd.DatetimeIndex(panel.dates, name="Date"), name="equity")
+        result = PortfolioBacktestResult(trades_df, equity_curve, self.starting_cash, rejected)
+        logger.info("Portfolio backtest finished: %s", result.summary())
+        return result
+
+    @staticmethod
+    def _open_value(open_positions: dict, closes: np.ndarray, position: int) -> float:
+        """
+        Reserved notional plus unrealized pnl of the open positions, valued at the given bar close.
+        A ticker without a close on that bar keeps its last valid close.
+        """
+        value = 0.0
+        for trade in open_positions.values():
+            price = closes[trade["row"], position] if position >= 0 else np.nan
+            if np.isnan(price):
+                price = trade["last_price"]
+            else:
+                trade["last_price"] = price
+            value += trade["notional"] + trade["direction"] * (price - trade["entry_price"]) * trade["quantity"]
+        return value
+
+
+if __name__ == "__main__":
+    configure_logging()
+    results_df = pd.read_csv("backtest_results.csv")
+    runner = PortfolioBacktestRunner(PricePanel.from_csv_folder("data_stock_price"))
+    portfolio_result = runner.run(SignalSet.from_analysis_results(results_df, prefix="rag_analysis_result"))
+    print(portfolio_result.summary())
+    print(portfolio_result.trades.to_string())
@@ -0,0 +1,172 @@
+import glob
+import json
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from common.logger import configure_logging
+from config import Config
+
+PRICE_FIELDS = ("open", "high", "low", "close", "volume", "adj_close")
+
+_attach_lock = threading.Lock()
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    Open an existing block without registering it with the resource tracker,
+    which would otherwise unlink it when the attaching process exits (only the creator should).
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+@dataclass(frozen=True)
+class SharedPricePanelHandle:
+    """Picklable description of a panel in shared memory, pass it to workers and call PricePanel.attach."""
+    shared_memory_name: str
+    tickers: tuple
+    dates: np.ndarray
+    fields: tuple
+
+
+class PricePanel:
+    """
+    Dense OHLCV array of shape [ticker x date x field] over the union of trading dates, NaN where a ticker has no bar.
+    Lets vectorized consumers (sweeps, portfolio replay) index prices without pandas lookups. Bars are raw, consumers
+    adjust them for splits and dividends with PriceAdjuster.
+    """
+
+    def __init__(self, tickers: List[str], dates: np.ndarray, values: np.ndarray, fields=PRICE_FIELDS,
+                 shared_memory_block: shared_memory.SharedMemory = None):
+        self.tickers = list(tickers)
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.values = values
+        self.fields = tuple(fields)
+        self.ticker_index = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.field_index = {field: i for i, field in enumerate(self.fields)}
+        # keeps the shared memory mapped as long as the panel is alive
+        self._shared_memory_block = shared_memory_block
+        self._owns_shared_memory = False
+        self._coverage = {}
+
+    @classmethod
+    def from_csv_folder(cls, folder: str = "data_stock_price", tickers: List[str] = None) -> "PricePanel":
+        """
+        Build the panel of raw bars from the StockPriceDataDownloader csv cache. Legacy split-adjusted files are
+        converted first when their events are stored, nothing is downloaded.
+        """
+        from stock_price.corporate_actions import migrate_price_cache
+
+        if tickers is None:
+            tickers = sorted(os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(folder, "*.csv")))
+        migrate_price_cache(folder, tickers)
+
+        frames = {}
+        for ticker in tickers:
+            df = pd.read_csv(os.path.join(folder, f"{ticker}.csv"), parse_dates=["Date"])
+            # some cached files contain repeated header rows, drop anything that is not a number
+            df[list(PRICE_FIELDS)] = df[list(PRICE_FIELDS)].apply(pd.to_numeric, errors="coerce")
+            frames[ticker] = df.dropna(subset=["close"]).drop_duplicates(subset="Date").set_index("Date")
+
+        all_dates = sorted(set().union(*(frame.index for frame in frames.values()))) if frames else []
+        date_index = pd.DatetimeIndex(all_dates)
+        values = np.full((len(tickers), len(date_index), len(PRICE_FIELDS)), np.nan, dtype=np.float64)
+        for i, ticker in enumerate(tickers):
+            aligned = frames[ticker].reindex(date_index)
+            values[i] = aligned[list(PRICE_FIELDS)].to_numpy(dtype=np.float64)
+        return cls(tickers, date_index.values.astype("datetime64[D]"), values)
+
+    def save(self, path: str = Config.PRICE_PANEL_PATH) -> None:
+        """Write the values as a raw .npy next to a small json index, so readers can memory-map it."""
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "index.json"), "w") as f:
+            json.dump({"tickers": self.tickers, "dates": [str(date) for date in self.dates], "fields": list(self.fields)}, f)
+        temp_path = os.path.join(path, "values.tmp.npy")
+        np.save(temp_path, np.ascontiguousarray(self.values, dtype=np.float64))
+        os.replace(temp_path, os.path.join(path, "values.npy"))
+
+    @classmethod
+    def load(cls, path: str = Config.PRICE_PANEL_PATH) -> Optional["PricePanel"]:
+        """Memory-map a saved panel read-only, pages are shared by every process reading the same file."""
+        index_path = os.path.join(path, "index.json")
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as f:
+            index = json.load(f)
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+        return cls(index["tickers"], np.array(index["dates"], dtype="datetime64[D]"), values, index["fields"])
+
+    def to_shared_memory(self) -> SharedPricePanelHandle:
+        """
+        Copy the values into a new shared memory block, the returned handle lets workers attach zero-copy.
+        The creating panel owns the block, call release() when every worker is done.
+        """
+        block = shared_memory.SharedMemory(create=True, size=max(self.values.nbytes, 1))
+        shared_values = np.ndarray(self.values.shape, dtype=np.float64, buffer=block.buf)
+        shared_values[:] = self.values
+        self.values = shared_values
+        self._shared_memory_block = block
+        self._owns_shared_memory = True
+        return SharedPricePanelHandle(block.name, tuple(self.tickers), self.dates, self.fields)
+
+    @classmethod
+    def attach(cls, handle: SharedPricePanelHandle) -> "PricePanel":
+        block = _attach_untracked(handle.shared_memory_name)
+        values = np.ndarray((len(handle.tickers), len(handle.dates), len(handle.fields)), dtype=np.float64, buffer=block.buf)
+        values.flags.writeable = False
+        return cls(list(handle.tickers), handle.dates, values, handle.fields, shared_memory_block=block)
+
+    def release(self) -> None:
+        """Close the shared memory block, and remove it when this panel created it. The values are kept as a copy."""
+        if self._shared_memory_block is None:
+            return
+        self.values = np.array(self.values)
+        self._shared_memory_block.close()
+        if self._owns_shared_memory:
+            self._shared_memory_block.unlink()
+        self._shared_memory_block = None
+
+    def get_field(self, field: str) -> np.ndarray:
+        """[ticker x date] view of one field."""
+        return self.values[:, :, self.field_index[field]]
+
+    def date_position(self, dates) -> np.ndarray:
+        """Position of the first panel date on or after each given date, O(log n) per lookup."""
+        return np.searchsorted(self.dates, np.asarray(dates, dtype="datetime64[D]"), side="left")
+
+    def covers(self, ticker: str, start_date: str, end_date: str) -> bool:
+        """True when the ticker has bars from start_date (or earlier) to end_date (or later)."""
+        if ticker not in self.ticker_index:
+            return False
+        if ticker not in self._coverage:
+            available = np.flatnonzero(~np.isnan(self.values[self.ticker_index[ticker], :, self.field_index["close"]]))
+            self._coverage[ticker] = (self.dates[available[0]], self.dates[available[-1]]) if len(available) else None
+        coverage = self._coverage[ticker]
+        return coverage is not None and coverage[0] <= np.datetime64(start_date, "D") and coverage[1] >= np.datetime64(end_date, "D")
+
+    def get_frame(self, ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """Backtrader friendly frame for one ticker and an inclusive date range."""
+        start, end = self.date_position([start_date, np.datetime64(end_date, "D") + 1])
+        frame = pd.DataFrame(self.values[self.ticker_index[ticker], start:end], columns=self.fields,
+                             index=pd.DatetimeIndex(self.dates[start:end], name="Date"))
+        return frame.dropna(subset=["close"])
+
+
+if __name__ == "__main__":
+    configure_logging()
+    # rebuild the memory-mapped panel from the csv cache
+    PricePanel.from_csv_folder("data_stock_price").save(Config.PRICE_PANEL_PATH)
@@ -2,37 +2,58 @@ import os
 import pandas as pd
 import yfinance as yf
 
-from config import significant_companies
+from common.logger import configure_logging, get_logger
+from common.ticker_registry import get_ticker_registry
+from stock_price.corporate_actions import (PriceAdjuster, convert_legacy_bars, get_price_adjuster, get_price_cache_format,
+                                          migrate_price_cache)
+from stock_price.price_panel import PricePanel
+
+logger = get_logger(__name__)
 
 
 class StockPriceDataDownloader:
-    def __init__(self, ticker: str, start: str, end: str) -> None:
+    def __init__(self, ticker: str, start: str, end: str, price_panel: PricePanel = None) -> None:
         """
         Initialize the stock price data downloader.
         :param ticker: Stock ticker symbol (e.g., AAPL, TSLA)
         :param start: Start date (format: YYYY-MM-DD)
         :param end: End date (format: YYYY-MM-DD)
+        :param price_panel: Optional memory-mapped / shared panel, read before the csv cache.
         """
         self.ticker = ticker
         self.start = start
         self.end = end
+        self.price_panel = price_panel
         self.data = None
         self.folder = "data_stock_price"
         os.makedirs(self.folder, exist_ok=True)
 
+    @property
+    def price_adjuster(self) -> PriceAdjuster:
+        # shared so adjusted series are cached across downloader instances
+        return get_price_adjuster()
+
     def get_filename(self) -> str:
         """Generate the storage filename following Backtrader CSV format."""
         # period = f"{self.start}_to_{self.end}"
         return os.path.join(self.folder, f"{self.ticker}.csv")
 
-    def get_price_data_in_range(self, start_date_str: str, end_date_str: str) -> pd.DataFrame:
-        """Get stock price data within the specified date range."""
+    def get_price_data_in_range(self, start_date_str: str, end_date_str: str, adjusted: bool = True) -> pd.DataFrame:
+        """
+        Get stock price data within the specified date range.
+        :param adjusted: Adjust for the splits and dividends up to end_date_str, otherwise return the raw bars.
+        """
+        if self.price_panel is not None and self.price_panel.covers(self.ticker, start_date_str, end_date_str):
+            price_data_in_range = self.price_panel.get_frame(self.ticker, start_date_str, end_date_str)
+            return self.price_adjuster.adjust(self.ticker, price_data_in_range, as_of=end_date_str) if adjusted else price_data_in_range
+
         self.fetch_data(from_cache=True)
 
         self.data.set_index("Date", inplace=True)
         self.data = self.data.sort_index()
+        data = self.price_adjuster.adjust(self.ticker, self.data, as_of=end_date_str) if adjusted else self.data
         # TODO: temporary fix for date range issue, manual remove lines of Ticker, the download api would fix in the future
-        price_data_in_range = self.data.loc[start_date_str:end_date_str]
+        price_data_in_range = data.loc[start_date_str:end_date_str]
         return price_data_in_range
 
     def fetch_data(self, from_cache: bool = True) -> None:
@@ -41,18 +62,19 @@ class StockPriceDataDownloader:
         self.data = None
 
         if from_cache and os.path.exists(filename):
-            print("Loading data from cache...")
+            logger.debug("Loading %s prices from cache", self.ticker)
+            migrate_price_cache(self.folder, [self.ticker])  # only with stored events, no download on the read path
             self.data = pd.read_csv(filename, parse_dates=["Date"], header=0)
             # self.data = pd.read_csv(filename, index_col='Date', parse_dates=True)
 
             # Check if date range is covered
             if not self.is_date_range_covered():
-                print("Date range not fully covered, fetching missing data...")
+                logger.info("%s date range %s to %s not fully covered, fetching missing data", self.ticker, self.start, self.end)
                 self.download_and_append_data()
             else:
-                print("Date range fully covered.")
+                logger.debug("%s date range fully covered", self.ticker)
         else:
-            print("Fetching new data from Yahoo Finance...")
+            logger.info("Fetching %s prices from Yahoo Finance", self.ticker)
             self.download_and_append_data()
 
     def is_date_range_covered(self) -> bool:
@@ -64,12 +86,17 @@ class StockPriceDataDownloader:
         return False
 
     def download_and_append_data(self) -> None:
-        """Download missing data and append to existing data."""
+        """
+        Download missing data and append to existing data.
+        Bars are cached raw (Yahoo's split adjustment undone), adjustments are applied on read from the event table.
+        """
         try:
-            new_data = yf.download(self.ticker, start=self.start, end=self.end)
+            new_data = yf.download(self.ticker, start=self.start, end=self.end, auto_adjust=False)
             if new_data.empty:
-                print("No data retrieved, please check the ticker or date range.")
+                logger.warning("No %s data retrieved, please check the ticker or date range", self.ticker)
             else:
+                if isinstance(new_data.columns, pd.MultiIndex):
+                    new_data.columns = new_data.columns.get_level_values(0)
                 new_data.rename(columns={
                     'Open': 'open',
                     'High': 'high',
@@ -82,6 +109,12 @@ class StockPriceDataDownloader:
                 else:
                     new_data['adj_close'] = new_data['close']
                 new_data.reset_index(inplace=True)
+                events = self.price_adjuster.store.download(self.ticker)
+                new_data = self.price_adjuster.to_raw(self.ticker, new_data, events)
+                if self.data is not None and not get_price_cache_format(self.folder).is_raw(self.ticker):
+                    # a legacy split-adjusted cache without stored events, convert it with the events just downloaded
+                    cached_at = pd.Timestamp(os.path.getmtime(self.get_filename()), unit="s")
+                    self.data = convert_legacy_bars(self.price_adjuster, self.ticker, self.data, events, cached_at)
 
                 if self.data is not None:
                     new_data = self.pre_process_data(new_data)
@@ -90,8 +123,9 @@ class StockPriceDataDownloader:
                     self.data = new_data
 
                 self.save_to_csv(self.data)
+                get_price_cache_format(self.folder).mark_raw([self.ticker])
         except Exception as e:
-            print(f"Error occurred while downloading data: {e}")
+            logger.exception("Error occurred while downloading %s data: %s", self.ticker, e)
 
     @staticmethod
     def pre_process_data(data: pd.DataFrame) -> pd.DataFrame | None:
@@ -109,7 +143,7 @@ class StockPriceDataDownloader:
             clean_step_df.reset_index(drop=True, inplace=True)  # Remove index
             return clean_step_df
         else:
-            print("Data not provided.")
+            logger.warning("Data not provided.")
             return None
 
     def save_to_csv(self, df) -> None:
@@ -119,14 +153,15 @@ class StockPriceDataDownloader:
             if df is not None:
                 df.sort_values(by='Date', inplace=True)  # Sort by Date before saving
                 df.to_csv(filename, index=False)
-                print(f"Data saved to {filename}")
+                logger.info("Data saved to %s", filename)
         else:
-            print("No data available to save.")
+            logger.warning("No data available to save.")
 
 
 # Example usage
 if __name__ == "__main__":
-    for company_ticker in significant_companies.keys():
+    configure_logging()
+    for company_ticker in get_ticker_registry():
         start_date = "2024-01-01"
         end_date = "2025-03-17"
 
@@ -0,0 +1,166 @@
+import itertools
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+from common.logger import configure_logging
+from stock_price.corporate_actions import get_price_adjuster
+from stock_price.price_panel import PricePanel
+from stock_price.trading_date_calculator import TradingDateCalculator
+
+# holding rules map (impact_days_min, impact_days_max, impact_weight) arrays to holding days
+HOLDING_RULES: Dict[str, Callable] = {
+    "min": lambda days_min, days_max, weight: days_min,
+    "max": lambda days_min, days_max, weight: days_max,
+    "midpoint": lambda days_min, days_max, weight: np.floor((days_min + days_max) / 2),
+    "weighted": lambda days_min, days_max, weight: np.round(days_min + (days_max - days_min) * weight / 10),
+}
+
+# sizing functions map impact_weight arrays to position sizes
+SIZING_FUNCTIONS: Dict[str, Callable] = {
+    "impact_weight_x10": lambda weight: weight * 10,
+    "fixed_10": lambda weight: np.full_like(weight, 10.0),
+    "impact_weight_squared": lambda weight: weight ** 2,
+}
+
+# "next_<field>" reads the field of the bar after the start trading date, "next_open" is where the market order of
+# NewsImpactStrategy fills; plain fields price the start trading date bar itself
+NEXT_BAR_PREFIX = "next_"
+ENTRY_PRICE_FIELDS = ("next_open", "open", "high", "low", "close")
+
+
+class SignalSet:
+    """Historical news signals as flat arrays, sorted chronologically."""
+
+    def __init__(self, tickers: np.ndarray, start_dates: np.ndarray, impact_weight: np.ndarray,
+                 impact_days_min: np.ndarray, impact_days_max: np.ndarray, direction: np.ndarray):
+        order = np.argsort(start_dates, kind="stable")
+        self.tickers = np.asarray(tickers)[order]
+        self.start_dates = np.asarray(start_dates, dtype="datetime64[D]")[order]
+        self.impact_weight = np.asarray(impact_weight, dtype=np.float64)[order]
+        self.impact_days_min = np.asarray(impact_days_min, dtype=np.float64)[order]
+        self.impact_days_max = np.asarray(impact_days_max, dtype=np.float64)[order]
+        self.direction = np.asarray(direction, dtype=np.float64)[order]
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @classmethod
+    def from_analysis_results(cls, df: pd.DataFrame, prefix: str = "rag_analysis_result") -> "SignalSet":
+        """
+        Build signals from a comparison result frame (see ChatbotPerformanceComparison.run_backtest),
+        the start trading date follows the same trading hour rules as the feeder.
+        """
+        df = df.dropna(subset=[f"{prefix}.impact_weight", f"{prefix}.position_movement"])
+        start_dates = []
+        for published_at in pd.to_datetime(df["published_at"]):
+            article_date = published_at.tz_localize("UTC").tz_convert("US/Eastern")
+            status = TradingDateCalculator.get_trading_hour(article_date)
+            start_date = article_date if status.is_in_trading_hour else status.next_trading_open
+            start_dates.append(np.datetime64(start_date.strftime("%Y-%m-%d")))
+
+        return cls(
+            tickers=df["ticker"].to_numpy(),
+            start_dates=np.array(start_dates, dtype="datetime64[D]"),
+            impact_weight=df[f"{prefix}.impact_weight"].to_numpy(),
+            impact_days_min=df[f"{prefix}.impact_days_min"].to_numpy(),
+            impact_days_max=df[f"{prefix}.impact_days_max"].to_numpy(),
+            direction=np.where(df[f"{prefix}.position_movement"].str.lower() == "long", 1.0, -1.0),
+        )
+
+
+class StrategySweep:
+    """
+    Evaluates every (holding rule, entry price, sizing) combination of NewsImpactStrategy over all signals at once.
+
+    Fill model, mirroring NewsImpactStrategy with market orders:
+    the entry order is submitted on the start trading date bar and, with the "next_open" entry price, fills at the open
+    of the following bar like BacktestRunner; the other entry prices read the start trading date bar itself. The close
+    is submitted on the first bar after the entry fill at least holding_days calendar days after the start trading date
+    and fills at the open of the following bar.
+    Signals whose entry or exit falls outside the price panel are left out of the statistics.
+    Prices are adjusted for splits and dividends up to the last panel date unless adjusted is False.
+    """
+
+    def __init__(self, price_panel: PricePanel, holding_rules: Dict[str, Callable] = None,
+                 entry_price_fields=ENTRY_PRICE_FIELDS, sizing_functions: Dict[str, Callable] = None,
+                 adjusted: bool = True):
+        self.price_panel = get_price_adjuster().adjust_panel(price_panel) if adjusted else price_panel
+        self.holding_rules = holding_rules or HOLDING_RULES
+        self.entry_price_fields = tuple(entry_price_fields)
+        self.sizing_functions = sizing_functions or SIZING_FUNCTIONS
+
+    def _get_entry_prices(self, name: str, ticker_rows: np.ndarray, entry_positions: np.ndarray) -> np.ndarray:
+        """Entry price of every signal for one entry name, NaN when the entry bar is past the end of the panel."""
+        field, offset = (name[len(NEXT_BAR_PREFIX):], 1) if name.startswith(NEXT_BAR_PREFIX) else (name, 0)
+        last_position = len(self.price_panel.dates) - 1
+        positions = entry_positions + offset
+        prices = self.price_panel.get_field(field)[ticker_rows, np.minimum(positions, last_position)]
+        return np.where(positions <= last_position, prices, np.nan)
+
+    def run(self, signals: SignalSet) -> pd.DataFrame:
+        panel = self.price_panel
+        known = np.array([ticker in panel.ticker_index for ticker in signals.tickers], dtype=bool)
+        ticker_rows = np.array([panel.ticker_index.get(ticker, 0) for ticker in signals.tickers], dtype=int)
+        entry_positions = panel.date_position(signals.start_dates)
+        last_position = len(panel.dates) - 1
+        entry_valid = known & (entry_positions <= last_position)
+        entry_positions = np.minimum(entry_positions, last_position)
+
+        # [E x N] entry prices
+        entry_prices = np.stack([self._get_entry_prices(name, ticker_rows, entry_positions)
+                                 for name in self.entry_price_fields])
+
+        # [H x N] exit prices
+        opens = panel.get_field("open")
+        exit_prices = []
+        for rule in self.holding_rules.values():
+            holding_days = rule(signals.impact_days_min, signals.impact_days_max, signals.impact_weight)
+            close_dates = panel.dates[entry_positions] + holding_days.astype("timedelta64[D]")
+            # the position is only open from the bar after the entry order
+            close_positions = np.maximum(panel.date_position(close_dates), entry_positions + 1)
+            exit_positions = close_positions + 1
+            exit_valid = exit_positions <= last_position
+            exit_price = opens[ticker_rows, np.minimum(exit_positions, last_position)]
+            exit_prices.append(np.where(exit_valid & entry_valid, exit_price, np.nan))
+        exit_prices = np.stack(exit_prices)
+
+        # [S x N] sizes
+        sizes = np.stack([sizing(signals.impact_weight) for sizing in self.sizing_functions.values()])
+
+        # [H x E x S x N]
+        price_move = signals.direction * (exit_prices[:, None, None, :] - entry_prices[None, :, None, :])
+        pnl = price_move * sizes[None, None, :, :]
+        pnl_ratio = price_move / entry_prices[None, :, None, :]
+
+        valid = ~np.isnan(pnl)
+        trade_count = valid.sum(axis=-1)
+        cumulative_pnl = np.nancumsum(pnl, axis=-1)
+        drawdown = np.maximum.accumulate(np.maximum(cumulative_pnl, 0), axis=-1) - cumulative_pnl
+        with np.errstate(invalid="ignore", divide="ignore"):
+            hit_rate = np.where(trade_count > 0, (pnl > 0).sum(axis=-1) / trade_count, np.nan)
+            mean_pnl_ratio = np.where(trade_count > 0, np.nansum(pnl_ratio, axis=-1) / trade_count, np.nan)
+
+        rows = []
+        for (h, holding_name), (e, entry_field), (s, sizing_name) in itertools.product(
+                enumerate(self.holding_rules), enumerate(self.entry_price_fields), enumerate(self.sizing_functions)):
+            rows.append({
+                "holding_rule": holding_name,
+                "entry_price": entry_field,
+                "sizing": sizing_name,
+                "trades": int(trade_count[h, e, s]),
+                "total_pnl": float(cumulative_pnl[h, e, s, -1]) if len(signals) else 0.0,
+                "mean_pnl_ratio": float(mean_pnl_ratio[h, e, s]),
+                "hit_rate": float(hit_rate[h, e, s]),
+                "max_drawdown": float(drawdown[h, e, s].max()) if len(signals) else 0.0,
+            })
+        return pd.DataFrame(rows).sort_values("total_pnl", ascending=False, ignore_index=True)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    results_df = pd.read_csv("backtest_results.csv")
+    sweep = StrategySweep(PricePanel.from_csv_folder("data_stock_price"))
+    sweep_result = sweep.run(SignalSet.from_analysis_results(results_df, prefix="rag_analysis_result"))
+    print(sweep_result.to_string())
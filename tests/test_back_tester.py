@@ -0,0 +1,68 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_price.back_tester import BacktestRunner, TradeJournal
+from stock_price.corporate_actions import ACTION_SPLIT, CorporateActionStore, PriceAdjuster
+from stock_price.trading_date_calculator import TradingHourStatus
+
+DATES = pd.bdate_range("2025-02-03", periods=12)
+START_DATE = datetime.date(2025, 2, 5)
+IN_TRADING_HOUR = TradingHourStatus(next_trading_open=datetime.datetime(2025, 2, 6, 9, 30), is_in_trading_hour=True,
+                                    is_same_day_before_trading_hour=False, is_same_day_after_trading_hour=False,
+                                    is_in_weekend=False, is_in_holiday=False, hours_before_open=0)
+
+
+def make_frame() -> pd.DataFrame:
+    opens = 100 + np.arange(len(DATES)) * np.array([1, -1, 2, -2] * 3)
+    return pd.DataFrame({"open": opens, "high": opens + 3, "low": opens - 3, "close": opens + 0.5,
+                         "volume": np.full(len(DATES), 1e6), "adj_close": opens + 0.5},
+                        index=pd.DatetimeIndex(DATES, name="Date")).astype(np.float64)
+
+
+def run(data_frame: pd.DataFrame, intraday_entry_price: float = None) -> tuple[float, pd.DataFrame]:
+    journal = TradeJournal()
+    result = BacktestRunner(data_frame).run(impact_weight=5, maximum_impact_days=4, minimum_impact_days=2,
+                                            position_movement="long", start_trading_date=START_DATE,
+                                            trading_hour_status=IN_TRADING_HOUR, trade_journal=journal,
+                                            intraday_entry_price=intraday_entry_price)
+    return result.total_pnl, journal.to_dataframe()
+
+
+def test_intraday_entry_fills_at_the_intraday_price():
+    frame = make_frame()
+    entry_price = frame.loc[str(START_DATE), "open"] + 1.25
+
+    total_pnl, journal = run(frame, entry_price)
+
+    orders = journal[journal["event"] == "order_executed"]
+    assert list(orders["price"])[0] == pytest.approx(entry_price)
+    assert list(orders["date"])[0] == START_DATE
+    assert total_pnl == pytest.approx((list(orders["price"])[1] - entry_price) * 50)
+
+
+def test_intraday_price_outside_the_bar_falls_back_to_the_daily_entry():
+    frame = make_frame()
+
+    total_pnl, journal = run(frame, frame.loc[str(START_DATE), "high"] * 2)
+
+    assert total_pnl != 0
+    assert total_pnl == pytest.approx(run(frame)[0])
+
+
+def test_raw_intraday_price_is_put_on_the_adjusted_basis(tmp_path):
+    """A 2-for-1 split after the entry: the daily bars are halved before it, the raw intraday price must be too."""
+    store = CorporateActionStore(str(tmp_path / "corporate_actions"))
+    store.save("ACME", pd.DataFrame({"date": [DATES[6]], "action": [ACTION_SPLIT], "value": [2.0]}))
+    frame = make_frame()
+    raw = frame.copy()
+    raw.iloc[:6, :4] *= 2
+    raw_entry_price = (frame.loc[str(START_DATE), "open"] + 1.25) * 2
+
+    adjusted = PriceAdjuster(store).adjust("ACME", raw, as_of=DATES[-1])
+    total_pnl, journal = run(adjusted, raw_entry_price)
+
+    assert total_pnl == pytest.approx(run(frame, raw_entry_price / 2)[0])
+    assert journal[journal["event"] == "order_executed"]["price"].iloc[0] == pytest.approx(raw_entry_price / 2)
@@ -0,0 +1,67 @@
+import asyncio
+import gc
+
+import pytest
+
+from embedding_kits.stock_news_embedding_plugin import RelatedNewsPlugin
+from ui.chatbot_sk import ChatbotSK, cancel_tasks
+
+
+@pytest.fixture
+def summary_search(monkeypatch):
+    """The summary search answers ["summary"] after the given delay."""
+    delay = {"seconds": 0.0}
+
+    async def search(news_summery: str, ticker: str = None):
+        await asyncio.sleep(delay["seconds"])
+        return ["summary"]
+
+    monkeypatch.setattr(RelatedNewsPlugin, "get_related_stock_news_wrapper", staticmethod(search))
+    return delay
+
+
+async def page_search():
+    return ["page"]
+
+
+def search_related_news(summary_timeout: float):
+    async def run():
+        raw_search = asyncio.create_task(page_search())
+        await asyncio.sleep(0)  # the page search finishes first
+        return await ChatbotSK._search_related_news("summary", raw_search, summary_timeout=summary_timeout)
+
+    return asyncio.run(run())
+
+
+def test_summary_search_is_preferred_over_the_earlier_page_search(summary_search):
+    summary_search["seconds"] = 0.05
+
+    assert search_related_news(summary_timeout=1) == ["summary"]
+
+
+def test_page_search_is_used_when_the_summary_search_misses_the_deadline(summary_search):
+    summary_search["seconds"] = 1
+
+    assert search_related_news(summary_timeout=0.05) == ["page"]
+
+
+def test_cancelled_tasks_errors_are_retrieved():
+    errors = []
+
+    async def fail():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            raise RuntimeError("pre-analysis failed while cancelled")
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        task = asyncio.create_task(fail())
+        await asyncio.sleep(0)
+        cancel_tasks(task, None)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    gc.collect()
+
+    assert errors == []
@@ -0,0 +1,110 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_price import back_tester, portfolio_back_tester, strategy_sweep
+from stock_price.back_tester import BacktestRunner
+from stock_price.corporate_actions import (ACTION_SPLIT, CorporateActionStore, PriceAdjuster, get_price_cache_format,
+                                           migrate_price_cache)
+from stock_price.portfolio_back_tester import PortfolioBacktestRunner
+from stock_price.price_panel import PricePanel
+from stock_price.strategy_sweep import HOLDING_RULES, SIZING_FUNCTIONS, SignalSet, StrategySweep
+from stock_price.trading_date_calculator import TradingHourStatus
+
+TICKER = "ACME"
+DATES = pd.bdate_range("2025-02-03", periods=15)
+SPLIT_POSITION = 7  # 2-for-1 ex-date 2025-02-12, inside the holding window of the signal below
+START_DATE, IMPACT_WEIGHT, IMPACT_DAYS_MIN, IMPACT_DAYS_MAX = "2025-02-06", 5, 4, 8
+
+
+def make_panel(split: bool) -> PricePanel:
+    """Bars on the post-split basis, raw bars before the ex-date are twice as high when split."""
+    opens = 100 + np.arange(len(DATES)) * np.array([1, -1, 2, -2, 3] * 3)
+    values = np.stack([opens, opens + 2, opens - 2, opens + 0.5, np.full(len(DATES), 1e6), opens + 0.5], axis=-1)
+    if split:
+        values[:SPLIT_POSITION, :4] *= 2
+        values[:SPLIT_POSITION, 5] *= 2
+        values[:SPLIT_POSITION, 4] /= 2
+    return PricePanel([TICKER], DATES.values.astype("datetime64[D]"), values[None, :, :])
+
+
+@pytest.fixture
+def price_adjuster(tmp_path, monkeypatch):
+    store = CorporateActionStore(str(tmp_path / "corporate_actions"))
+    store.save(TICKER, pd.DataFrame({"date": [DATES[SPLIT_POSITION]], "action": [ACTION_SPLIT], "value": [2.0]}))
+    adjuster = PriceAdjuster(store)
+    for module in (back_tester, strategy_sweep, portfolio_back_tester):
+        monkeypatch.setattr(module, "get_price_adjuster", lambda: adjuster)
+    return adjuster
+
+
+def run_backtest_runner(price_panel: PricePanel, adjusted: bool) -> float:
+    runner = BacktestRunner.from_price_panel(price_panel, TICKER, START_DATE, str(price_panel.dates[-1]), adjusted=adjusted)
+    status = TradingHourStatus(next_trading_open=datetime.datetime.fromisoformat(START_DATE).replace(hour=9, minute=30),
+                               is_in_trading_hour=False, is_same_day_before_trading_hour=True,
+                               is_same_day_after_trading_hour=False, is_in_weekend=False, is_in_holiday=False,
+                               hours_before_open=1)
+    return runner.run(impact_weight=IMPACT_WEIGHT, maximum_impact_days=IMPACT_DAYS_MAX, minimum_impact_days=IMPACT_DAYS_MIN,
+                      position_movement="long", start_trading_date=datetime.date.fromisoformat(START_DATE),
+                      trading_hour_status=status).total_pnl
+
+
+def make_signals() -> SignalSet:
+    return SignalSet(tickers=np.array([TICKER]), start_dates=np.array([START_DATE], dtype="datetime64[D]"),
+                     impact_weight=[IMPACT_WEIGHT], impact_days_min=[IMPACT_DAYS_MIN], impact_days_max=[IMPACT_DAYS_MAX],
+                     direction=[1.0])
+
+
+def test_split_inside_the_holding_window_is_not_a_price_move(price_adjuster):
+    raw_panel, reference_panel = make_panel(split=True), make_panel(split=False)
+    expected = run_backtest_runner(reference_panel, adjusted=False)
+
+    sweep = StrategySweep(raw_panel, holding_rules={"midpoint": HOLDING_RULES["midpoint"]}, entry_price_fields=["next_open"],
+                          sizing_functions={"impact_weight_x10": SIZING_FUNCTIONS["impact_weight_x10"]})
+    portfolio = PortfolioBacktestRunner(raw_panel, starting_cash=1e6, max_ticker_exposure=1.0)
+
+    assert expected != 0
+    assert run_backtest_runner(raw_panel, adjusted=True) == pytest.approx(expected)
+    assert sweep.run(make_signals()).iloc[0]["total_pnl"] == pytest.approx(expected)
+    assert portfolio.run(make_signals()).trades["pnl"].iloc[0] == pytest.approx(expected)
+
+
+def test_price_factor_is_exposed_per_date(price_adjuster):
+    raw_panel = make_panel(split=True)
+    adjusted = price_adjuster.adjust(TICKER, raw_panel.get_frame(TICKER, str(DATES[0].date()), str(DATES[-1].date())))
+    price_factors, _ = price_adjuster.get_panel_factors(raw_panel)
+
+    assert list(adjusted["price_factor"]) == [0.5] * SPLIT_POSITION + [1.0] * (len(DATES) - SPLIT_POSITION)
+    assert np.array_equal(price_factors[0], adjusted["price_factor"].to_numpy())
+    assert PriceAdjuster.get_price_factor(adjusted, DATES[SPLIT_POSITION - 1] + pd.Timedelta(hours=15)) == 0.5
+    assert PriceAdjuster.get_price_factor(raw_panel.get_frame(TICKER, "2025-02-03", "2025-02-21"), DATES[0]) == 1.0
+
+
+def write_legacy_cache(folder: str, ticker: str, panel: PricePanel) -> str:
+    frame = panel.get_frame(TICKER, str(DATES[0].date()), str(DATES[-1].date())).reset_index()
+    filename = os.path.join(folder, f"{ticker}.csv")
+    frame.to_csv(filename, index=False, date_format="%Y-%m-%d")
+    return filename
+
+
+def test_legacy_cache_is_converted_from_stored_events_without_downloading(tmp_path, price_adjuster, monkeypatch):
+    def download(self, ticker):
+        raise AssertionError("the read path must not download")
+
+    monkeypatch.setattr(CorporateActionStore, "download", download)
+    folder = str(tmp_path / "data_stock_price")
+    os.makedirs(folder)
+    # Yahoo's split-adjusted bars: the split shows no jump, so it was applied whatever the file time says
+    filename = write_legacy_cache(folder, TICKER, make_panel(split=False))
+    os.utime(filename, (0, 0))
+    write_legacy_cache(folder, "NOEVENTS", make_panel(split=False))
+
+    assert migrate_price_cache(folder, price_adjuster=price_adjuster) == [TICKER]
+
+    raw = pd.read_csv(filename)
+    assert raw["close"].to_numpy() == pytest.approx(make_panel(split=True).get_field("close")[0])
+    assert get_price_cache_format(folder).is_raw(TICKER)
+    assert not get_price_cache_format(folder).is_raw("NOEVENTS")
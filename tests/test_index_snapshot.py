@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from embedding_kits import index_snapshot
+from embedding_kits.index_snapshot import import_snapshot, read_manifest, write_snapshot
+from embedding_kits.index_versions import IndexRegistry, get_index_signature
+from embedding_kits.local_search_manager import LocalSearchManager
+
+ALIAS = "stock-news-index-dev"
+
+
+def make_pages() -> list[list[dict]]:
+    return [[{"id": f"doc-{part}-{row}", "ticker": "ACME", "title": f"title {part} {row}", "content": "content",
+              "combined_fields_vector": [float(part), float(row), 1.0]} for row in range(2)] for part in range(2)]
+
+
+class FakeSearchClient:
+    def __init__(self):
+        self.docs = {}
+
+    def upload_documents(self, documents):
+        self.docs.update({doc["id"]: doc for doc in documents})
+        return [SimpleNamespace(key=doc["id"], succeeded=True) for doc in documents]
+
+
+class FakeSearchManager:
+    """AzureSearchManager of a fresh index, registered with the current configuration when it was created."""
+
+    def __init__(self, registry: IndexRegistry, index_name: str, signature: dict):
+        self.alias, self.index_name, self.registry = ALIAS, index_name, registry
+        self.search_client = FakeSearchClient()
+        if signature is not None:
+            registry.register(ALIAS, index_name, signature)
+
+    def get_signature(self) -> dict:
+        version = self.registry.get_version(self.index_name)
+        return version["signature"] if version else get_index_signature()
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = IndexRegistry(":memory:")
+    monkeypatch.setattr(index_snapshot, "get_index_registry", lambda: registry)
+    return registry
+
+
+def test_manifest_records_the_index_signature(tmp_path):
+    signature = get_index_signature("mistral")
+
+    write_snapshot(iter(make_pages()), str(tmp_path), ALIAS, signature)
+
+    assert read_manifest(str(tmp_path))["signature"] == signature
+
+
+def test_snapshot_of_another_model_is_refused(tmp_path, registry):
+    write_snapshot(iter(make_pages()), str(tmp_path), ALIAS, get_index_signature("mistral"))
+    search_manager = FakeSearchManager(registry, f"{ALIAS}-v2", get_index_signature("nomic-embed-text"))
+
+    with pytest.raises(ValueError, match="signature|built with"):
+        import_snapshot(search_manager, str(tmp_path), workers=2)
+    with pytest.raises(ValueError):
+        import_snapshot(LocalSearchManager(SimpleNamespace(model_name="nomic-embed-text"), compression="none"), str(tmp_path))
+
+    assert search_manager.search_client.docs == {}
+
+
+def test_target_is_registered_with_the_snapshot_signature(tmp_path, registry):
+    signature = get_index_signature()
+    write_snapshot(iter(make_pages()), str(tmp_path), ALIAS, signature)
+    search_manager = FakeSearchManager(registry, f"{ALIAS}-v3", None)
+
+    assert import_snapshot(search_manager, str(tmp_path), batch_size=3, workers=2) == 4
+
+    assert registry.get_version(f"{ALIAS}-v3")["signature"] == signature
+    assert search_manager.search_client.docs["doc-1-0"]["combined_fields_vector"] == [1.0, 0.0, 1.0]
+
+
+def test_unsigned_snapshot_needs_the_signature_given(tmp_path):
+    write_snapshot(iter(make_pages()), str(tmp_path), ALIAS)
+    local = LocalSearchManager(SimpleNamespace(model_name="mistral"), compression="none")
+
+    with pytest.raises(ValueError, match="no index signature"):
+        import_snapshot(local, str(tmp_path))
+    assert import_snapshot(local, str(tmp_path), signature=local.get_signature()) == 4
+    assert np.asarray(local.vectors).shape == (4, 3)
@@ -0,0 +1,115 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+
+from embedding_kits import stock_news_embedding
+from embedding_kits.index_versions import IndexRegistry, SearchIndexRegistry, get_index_signature
+from embedding_kits.stock_news_embedding import AzureSearchManager
+
+ALIAS = "stock-news-index-dev"
+
+
+class FakeSearchService:
+    """Documents of the registry index and its schema, shared by the clients of every host."""
+
+    def __init__(self):
+        self.indexes = {}
+        self.docs = {}
+        self.uploads = 0
+
+
+class FakeIndexClient:
+    def __init__(self, service: FakeSearchService):
+        self.service = service
+
+    def get_index(self, name: str):
+        if name not in self.service.indexes:
+            raise ResourceNotFoundError(f"{name} not found")
+        return self.service.indexes[name]
+
+    def create_index(self, index):
+        self.service.indexes[index.name] = index
+
+
+class FakeSearchClient:
+    def __init__(self, service: FakeSearchService):
+        self.service = service
+
+    def get_document(self, key: str):
+        if key not in self.service.docs:
+            raise ResourceNotFoundError(f"{key} not found")
+        return dict(self.service.docs[key])
+
+    def upload_documents(self, documents):
+        self.service.uploads += 1
+        for doc in documents:
+            self.service.docs[doc["id"]] = dict(doc)
+        return [SimpleNamespace(key=doc["id"], succeeded=True) for doc in documents]
+
+    def merge_documents(self, documents):
+        for doc in documents:
+            self.service.docs[doc["id"]].update(doc)
+        return [SimpleNamespace(key=doc["id"], succeeded=True) for doc in documents]
+
+    def search(self, search_text: str, filter: str, order_by: list):
+        kind, alias = re.fullmatch(r"kind eq '(.*?)' and alias eq '(.*?)'", filter).groups()
+        docs = [doc for doc in self.service.docs.values() if doc.get("kind") == kind and doc.get("alias") == alias]
+        return sorted(docs, key=lambda doc: doc["version"])
+
+
+def make_registry(service: FakeSearchService, sqlite_db_path: str = ":memory:") -> SearchIndexRegistry:
+    return SearchIndexRegistry(search_client=FakeSearchClient(service), index_client=FakeIndexClient(service),
+                               sqlite_db_path=sqlite_db_path)
+
+
+def test_alias_swap_reaches_every_host():
+    service = FakeSearchService()
+    writer_host, reader_host = make_registry(service), make_registry(service)
+    writer_host.register(ALIAS, ALIAS, get_index_signature("mistral"))
+
+    target = writer_host.create_version(ALIAS, get_index_signature("nomic-embed-text"))
+    previous = writer_host.swap_alias(ALIAS, target)
+
+    assert (previous, target) == (ALIAS, f"{ALIAS}-v2")
+    assert reader_host.resolve(ALIAS) == target
+    assert [(version["index_name"], version["status"]) for version in reader_host.list_versions(ALIAS)] == \
+           [(ALIAS, "retired"), (target, "active")]
+
+
+def test_register_writes_only_unknown_indexes():
+    service = FakeSearchService()
+    registry = make_registry(service)
+
+    registry.register(ALIAS, ALIAS, get_index_signature("mistral"))
+    uploads = service.uploads
+    version = registry.register(ALIAS, ALIAS, get_index_signature("nomic-embed-text"))
+
+    assert service.uploads == uploads
+    assert version["signature"]["embedding_model"] == "mistral"
+
+
+def test_sqlite_registry_is_imported_when_the_registry_index_is_created(tmp_path):
+    sqlite_db_path = str(tmp_path / "index_versions.sqlite")
+    sqlite_registry = IndexRegistry(sqlite_db_path)
+    sqlite_registry.register(ALIAS, ALIAS, get_index_signature("mistral"))
+    sqlite_registry.swap_alias(ALIAS, sqlite_registry.create_version(ALIAS, get_index_signature("nomic-embed-text")))
+
+    registry = make_registry(FakeSearchService(), sqlite_db_path)
+
+    assert registry.resolve(ALIAS) == f"{ALIAS}-v2"
+    assert registry.list_versions(ALIAS) == sqlite_registry.list_versions(ALIAS)
+
+
+@pytest.mark.parametrize("registered_model, expected", [(None, "configured-model"), ("mistral", "mistral")])
+def test_query_embedding_model_follows_the_index_version(monkeypatch, registered_model, expected):
+    monkeypatch.setattr(stock_news_embedding.Config, "OLLAMA_MODEL_EMBEDDING", "configured-model")
+    registry = make_registry(FakeSearchService())
+    if registered_model:
+        registry.register(ALIAS, ALIAS, get_index_signature(registered_model))
+    monkeypatch.setattr(stock_news_embedding, "get_index_registry", lambda: registry)
+    search_manager = AzureSearchManager.__new__(AzureSearchManager)
+    search_manager.index_name = ALIAS
+
+    assert search_manager.get_embedding_model_name() == expected
@@ -0,0 +1,16 @@
+from common.instrumentation import Instrumentation
+
+
+def test_render_metrics_types_each_counter_family_once():
+    instrumentation = Instrumentation(enabled=True)
+    instrumentation.increment("related_news_search_total", mode="lexical")
+    instrumentation.increment("related_news_search_total", mode="vector_unavailable")
+    instrumentation.increment("chat_requests_queued_total")
+
+    lines = instrumentation.render_metrics().splitlines()
+
+    assert lines.count("# TYPE related_news_search_total counter") == 1
+    assert lines.count("# TYPE chat_requests_queued_total counter") == 1
+    type_line = lines.index("# TYPE related_news_search_total counter")
+    assert lines[type_line + 1:type_line + 3] == ['related_news_search_total{mode="lexical"} 1.0',
+                                                   'related_news_search_total{mode="vector_unavailable"} 1.0']
@@ -0,0 +1,83 @@
+import re
+
+import pytest
+
+from embedding_kits.lexical_index import BM25Index, reciprocal_rank_fusion
+from embedding_kits.model_news_impact_analysis import NewsAnalysisDoc
+
+
+class FakeSearchClient:
+    """Key-ordered paging ("id gt '...'") over an in-memory index."""
+
+    def __init__(self, docs: dict[str, dict]):
+        self.docs = docs
+
+    def search(self, search_text: str, filter: str = None, order_by: list = None, top: int = None, select: list = None):
+        docs = [self.docs[doc_id] for doc_id in sorted(self.docs)]
+        if filter:
+            after_id = re.fullmatch(r"id gt '(.*?)'", filter).group(1)
+            docs = [doc for doc in docs if doc["id"] > after_id]
+        return [{field: doc.get(field) for field in select} if select else dict(doc) for doc in docs[:top]]
+
+
+def make_doc(doc_id: str, title: str, content: str, ticker: str = "ACME") -> dict:
+    return {"id": doc_id, "ticker": ticker, "title": title, "content": content, "url": f"https://x/{doc_id}", "pnl_ratio": 0.01}
+
+
+@pytest.fixture
+def index():
+    index = BM25Index(":memory:")
+    index.add_documents([make_doc("a", "Acme beats earnings", "Quarterly revenue rose on strong demand."),
+                         make_doc("b", "Market wrap", "Stocks drifted, acme earnings were mentioned in passing.", ticker="SPY"),
+                         make_doc("c", "Globex recall", "Globex recalls its widgets after a safety review.", ticker="GBX")])
+    return index
+
+
+def test_bm25_ranks_title_and_ticker_matches_first(index):
+    matches = index.search_ids("acme earnings")
+
+    assert [doc_id for doc_id, _ in matches] == ["a", "b"]
+    assert matches[0][1] > matches[1][1] > 0
+    assert index.search_ids("the of and") == []
+
+
+def test_reindex_and_remove_keep_the_collection_statistics(index):
+    scores = index.search_ids("globex recall")
+    index.add_documents([make_doc("c", "Globex recall", "Globex recalls its widgets after a safety review.", ticker="GBX")])
+
+    assert index.get_document_count() == 3
+    assert index.search_ids("globex recall") == pytest.approx(scores)
+
+    index.remove_documents(["c", "missing"])
+
+    assert index.get_document_count() == 2
+    assert index.search_ids("globex") == []
+
+
+def test_rrf_fuses_ranks_without_changing_the_shared_results():
+    lexical = [NewsAnalysisDoc(id="a", **{"@search.score": 7.0}), NewsAnalysisDoc(id="b", **{"@search.score": 3.0})]
+    vector = [NewsAnalysisDoc(id="b", **{"@search.score": 0.9}), NewsAnalysisDoc(id="c", **{"@search.score": 0.8})]
+
+    fused = reciprocal_rank_fusion([lexical, vector], k=60)
+
+    assert [doc.id for doc in fused] == ["b", "a", "c"]
+    assert fused[0].search_score == pytest.approx(1 / 62 + 1 / 61)
+    assert [doc.search_score for doc in vector] == [0.9, 0.8]
+    assert [doc.search_score for doc in lexical] == [7.0, 3.0]
+
+
+def test_sync_pulls_documents_inserted_on_other_hosts(index):
+    service_docs = {doc_id: make_doc(doc_id, title, content)
+                    for doc_id, title, content in [("a", "Acme beats earnings", "Quarterly revenue rose on strong demand."),
+                                                   ("b", "Market wrap", "Stocks drifted, acme earnings were mentioned in passing."),
+                                                   ("d", "Initech merger", "Initech agrees to a merger with Acme.")]}
+    service_docs["b"]["ticker"] = "SPY"
+
+    assert index.sync(FakeSearchClient(service_docs), page_size=2) == (1, 1)
+    assert index.get_document_count() == 3
+    assert [doc_id for doc_id, _ in index.search_ids("initech merger")] == ["d"]
+    assert index.search_ids("globex") == []
+
+    service_docs["a"]["title"] = "Acme misses earnings"
+    assert index.sync(FakeSearchClient(service_docs), page_size=2) == (1, 0)
+    assert index.get_documents(["a"])["a"]["title"] == "Acme misses earnings"
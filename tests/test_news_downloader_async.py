@@ -0,0 +1,150 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+pytest.importorskip("newspaper")
+
+from news_downloader import news_downloader_plugin
+from news_downloader.news_downloader_async import AsyncNewsDownloader
+from news_downloader.news_downloader_plugin import NewsDownloader3kPlugin
+from news_downloader.news_page_cache import DomainSupportCache, NewsPageCache
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "news_pages")
+ARTICLE_URL = "https://news.example.com/markets/acme-beats-estimates"
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as file:
+        return file.read()
+
+
+class FixtureServer:
+    """MockTransport handler serving the fixture pages by path, with an ETag so revalidation can be observed."""
+
+    def __init__(self, pages: dict[str, str]):
+        self.pages = pages
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        name = self.pages.get(request.url.path)
+        if name is None:
+            return httpx.Response(404, text="Not Found")
+        etag = f'"{name}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304)
+        return httpx.Response(200, text=load_fixture(name), headers={"ETag": etag})
+
+
+@pytest.fixture
+def server():
+    return FixtureServer({"/markets/acme-beats-estimates": "article.html", "/premium/acme": "paywall.html"})
+
+
+@pytest.fixture
+def downloader(tmp_path, server):
+    return AsyncNewsDownloader(page_cache=NewsPageCache(str(tmp_path / "pages")),
+                               domain_support_cache=DomainSupportCache(str(tmp_path / "domain_support.json"), max_failures=2),
+                               transport=httpx.MockTransport(server))
+
+
+def run(downloader: AsyncNewsDownloader, coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await downloader.close()
+
+    return asyncio.run(main())
+
+
+def test_fetch_html_revalidates_cached_page(downloader, server):
+    async def fetch_twice():
+        first = await downloader.fetch_html(ARTICLE_URL)
+        second = await downloader.fetch_html(ARTICLE_URL)
+        return first, second
+
+    (first_status, first_html), (second_status, second_html) = run(downloader, fetch_twice())
+
+    assert first_status == second_status == 200
+    assert first_html == second_html == load_fixture("article.html")
+    assert "If-None-Match" not in server.requests[0].headers
+    assert server.requests[1].headers["If-None-Match"] == '"article.html"'
+
+
+def test_fetch_article_text_reports_status_of_missing_page(downloader):
+    text = run(downloader, downloader.fetch_article_text("https://news.example.com/missing"))
+
+    assert text == "Failed to fetch page: Status Code 404"
+
+
+def test_fetch_article_text_uses_newspaper3k_when_it_extracts(downloader, monkeypatch):
+    monkeypatch.setattr(AsyncNewsDownloader, "extract_with_newspaper3k", staticmethod(lambda url, html: "parsed article"))
+
+    text = run(downloader, downloader.fetch_article_text(ARTICLE_URL))
+
+    assert text == "parsed article"
+    assert downloader.domain_support_cache.get(ARTICLE_URL) is True
+
+
+def test_fetch_article_text_falls_back_to_bs4(downloader, monkeypatch):
+    monkeypatch.setattr(AsyncNewsDownloader, "extract_with_newspaper3k", staticmethod(lambda url, html: ""))
+
+    text = run(downloader, downloader.fetch_article_text(ARTICLE_URL))
+
+    assert text.startswith("Extracted using BeautifulSoup:")
+    assert "Revenue rose 12% to $8.1 billion" in text
+
+
+def test_domain_is_unsupported_only_after_repeated_failures(downloader, monkeypatch):
+    extracted_urls = []
+
+    def extract(url: str, html: str) -> str:
+        extracted_urls.append(url)
+        return ""
+
+    monkeypatch.setattr(AsyncNewsDownloader, "extract_with_newspaper3k", staticmethod(extract))
+    paywall_url = "https://news.example.com/premium/acme"
+
+    async def fetch_three_times():
+        for _ in range(3):
+            await downloader.fetch_article_text(paywall_url)
+
+    run(downloader, fetch_three_times())
+
+    # max_failures=2: the first two pages are still tried with newspaper3k, the third goes straight to bs4
+    assert extracted_urls == [paywall_url, paywall_url]
+    assert downloader.domain_support_cache.get(paywall_url) is False
+
+
+def test_success_resets_domain_failures(tmp_path):
+    cache = DomainSupportCache(str(tmp_path / "domain_support.json"), max_failures=2)
+
+    cache.set(ARTICLE_URL, False)
+    cache.set(ARTICLE_URL, True)
+    cache.set(ARTICLE_URL, False)
+
+    assert cache.get(ARTICLE_URL) is None
+    assert DomainSupportCache(cache.filename, max_failures=2).get(ARTICLE_URL) is None
+
+
+def test_plugin_creates_one_downloader_per_event_loop(tmp_path, monkeypatch, server):
+    monkeypatch.setattr(news_downloader_plugin, "AsyncNewsDownloader", lambda: AsyncNewsDownloader(
+        page_cache=NewsPageCache(str(tmp_path / "pages")),
+        domain_support_cache=DomainSupportCache(str(tmp_path / "domain_support.json")),
+        transport=httpx.MockTransport(server)))
+
+    async def get_downloaders():
+        try:
+            return NewsDownloader3kPlugin._get_downloader(), NewsDownloader3kPlugin._get_downloader()
+        finally:
+            await NewsDownloader3kPlugin.aclose()
+
+    first, same_loop = asyncio.run(get_downloaders())
+    other_loop, _ = asyncio.run(get_downloaders())
+
+    assert first is same_loop
+    assert first is not other_loop
+    assert first.executor._shutdown and other_loop.executor._shutdown
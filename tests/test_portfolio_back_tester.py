@@ -0,0 +1,74 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_price.back_tester import BacktestRunner
+from stock_price.portfolio_back_tester import PortfolioBacktestRunner
+from stock_price.price_panel import PricePanel
+from stock_price.strategy_sweep import SignalSet
+from stock_price.trading_date_calculator import TradingHourStatus
+
+
+def make_panel(gaps: dict = None) -> PricePanel:
+    """Two tickers over three weeks of business days, gaps maps a ticker row to the positions without a bar."""
+    dates = pd.bdate_range("2025-02-03", periods=15)
+    values = np.empty((2, len(dates), 6))
+    for row in range(2):
+        opens = 100 + 10 * row + np.arange(len(dates)) * np.array([1, -1, 2, -2, 3] * 3)
+        values[row] = np.stack([opens, opens + 2, opens - 2, opens + 0.5, np.full(len(dates), 1e6), opens + 0.5], axis=-1)
+    for row, positions in (gaps or {}).items():
+        values[row, positions] = np.nan
+    return PricePanel(["ACME", "BETA"], dates.values.astype("datetime64[D]"), values)
+
+
+def run_backtest_runner(price_panel: PricePanel, ticker: str, start_date: str, impact_weight: int,
+                        impact_days_min: int, impact_days_max: int, position_movement: str) -> float:
+    runner = BacktestRunner.from_price_panel(price_panel, ticker, start_date, str(price_panel.dates[-1]))
+    status = TradingHourStatus(next_trading_open=datetime.datetime.fromisoformat(start_date).replace(hour=9, minute=30),
+                               is_in_trading_hour=False, is_same_day_before_trading_hour=True,
+                               is_same_day_after_trading_hour=False, is_in_weekend=False, is_in_holiday=False,
+                               hours_before_open=1)
+    return runner.run(impact_weight=impact_weight, maximum_impact_days=impact_days_max, minimum_impact_days=impact_days_min,
+                      position_movement=position_movement, start_trading_date=datetime.date.fromisoformat(start_date),
+                      trading_hour_status=status).total_pnl
+
+
+def make_signals(ticker: str, start_date: str, impact_weight: int, impact_days_min: int, impact_days_max: int,
+                 position_movement: str) -> SignalSet:
+    return SignalSet(tickers=np.array([ticker]), start_dates=np.array([start_date], dtype="datetime64[D]"),
+                     impact_weight=[impact_weight], impact_days_min=[impact_days_min], impact_days_max=[impact_days_max],
+                     direction=[1.0 if position_movement == "long" else -1.0])
+
+
+@pytest.mark.parametrize("gaps", [None, {1: [6, 9]}])  # BETA has no bar on its scheduled entry and exit days
+@pytest.mark.parametrize("ticker, start_date, impact_weight, impact_days_min, impact_days_max, position_movement", [
+    ("ACME", "2025-02-03", 5, 2, 4, "long"),
+    ("BETA", "2025-02-06", 8, 3, 6, "short"),
+    ("BETA", "2025-02-05", 3, 1, 3, "long"),
+])
+def test_single_signal_matches_backtest_runner(gaps, ticker, start_date, impact_weight, impact_days_min,
+                                               impact_days_max, position_movement):
+    price_panel = make_panel(gaps)
+    runner = PortfolioBacktestRunner(price_panel, starting_cash=1e6, max_ticker_exposure=1.0)
+
+    result = runner.run(make_signals(ticker, start_date, impact_weight, impact_days_min, impact_days_max, position_movement))
+
+    assert list(result.trades["status"]) == ["closed"]
+    assert result.trades["pnl"].iloc[0] == pytest.approx(
+        run_backtest_runner(price_panel, ticker, start_date, impact_weight, impact_days_min, impact_days_max, position_movement))
+    assert np.isfinite(result.equity_curve).all()
+
+
+def test_position_without_exit_bar_is_valued_at_last_valid_close():
+    price_panel = make_panel({0: [13, 14]})
+    runner = PortfolioBacktestRunner(price_panel, starting_cash=1e6, max_ticker_exposure=1.0)
+
+    result = runner.run(make_signals("ACME", "2025-02-18", 5, 3, 5, "long"))
+
+    trade = result.trades.iloc[0]
+    assert trade["status"] == "open"
+    assert trade["exit_price"] == price_panel.get_field("close")[0, 12]
+    assert np.isfinite(result.equity_curve).all()
+    assert result.summary()["total_pnl"] == pytest.approx(trade["pnl"])
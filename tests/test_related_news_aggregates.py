@@ -0,0 +1,89 @@
+import json
+import re
+
+import numpy as np
+import pytest
+
+from embedding_kits.related_news_aggregates import RelatedNewsAggregateStore, RelatedNewsAggregator
+
+
+class FakeSearchClient:
+    """Key-ordered paging ("id gt '...'") and search.in lookups over an in-memory index."""
+
+    def __init__(self, docs: dict[str, dict]):
+        self.docs = docs
+
+    def search(self, search_text: str, filter: str = None, order_by: list = None, top: int = None, select: list = None):
+        docs = [self.docs[doc_id] for doc_id in sorted(self.docs)]
+        if filter and filter.startswith("id gt"):
+            after_id = re.fullmatch(r"id gt '(.*?)'", filter).group(1)
+            docs = [doc for doc in docs if doc["id"] > after_id]
+        elif filter:
+            doc_ids = set(re.fullmatch(r"search.in\(id, '(.*?)', ','\)", filter).group(1).split(","))
+            docs = [doc for doc in docs if doc["id"] in doc_ids]
+        return [{field: doc.get(field) for field in select} if select else dict(doc) for doc in docs[:top]]
+
+
+def make_doc(doc_id: str, vector: list[float], pnl_ratio: float = 0.01) -> dict:
+    return {"id": doc_id, "ticker": "ACME", "title": f"title {doc_id}", "content": f"content {doc_id}", "url": f"https://x/{doc_id}",
+            "impact_days_min": 1, "impact_days_max": 3, "impact_weight": 5, "pnl_ratio": pnl_ratio,
+            "combined_fields_vector": vector}
+
+
+@pytest.fixture
+def index_docs():
+    vectors = {"a": [1.0, 0.0, 0.0], "b": [0.9, 0.1, 0.0], "c": [0.0, 1.0, 0.0], "d": [0.0, 0.9, 0.1], "e": [0.5, 0.5, 0.0]}
+    return {doc_id: make_doc(doc_id, vector) for doc_id, vector in vectors.items()}
+
+
+@pytest.fixture
+def aggregator(tmp_path, index_docs):
+    search_manager = type("SearchManager", (), {"search_client": FakeSearchClient(index_docs)})()
+    return RelatedNewsAggregator(search_manager, RelatedNewsAggregateStore(str(tmp_path / "aggregates.sqlite")),
+                                 top_k=2, page_size=2, fetch_batch_size=2)
+
+
+def get_neighbor_ids(store: RelatedNewsAggregateStore) -> dict[str, list[str]]:
+    return {doc_id: [doc["id"] for doc in json.loads(neighbors)]
+            for doc_id, neighbors in store.connection.execute("SELECT doc_id, neighbors FROM related_news_aggregates")}
+
+
+def test_refresh_pulls_only_new_and_reindexed_documents(aggregator, index_docs):
+    assert aggregator.refresh() == 5
+    assert aggregator.refresh() == 0
+
+    index_docs["c"]["pnl_ratio"] = 0.5  # re-indexed with a new backtest
+    assert aggregator.refresh() == 1
+
+    assert aggregator.store.get_document("c").pnl_ratio == 0.5
+    neighbors = json.loads(aggregator.store.connection.execute(
+        "SELECT neighbors FROM related_news_aggregates WHERE doc_id = 'd'").fetchone()[0])
+    assert {doc["id"]: doc["pnl_ratio"] for doc in neighbors}["c"] == 0.5
+
+
+def test_refresh_prunes_documents_deleted_from_the_index(aggregator, index_docs):
+    aggregator.refresh()
+    assert "a" in get_neighbor_ids(aggregator.store)["b"]
+
+    del index_docs["a"]
+    aggregator.refresh()
+
+    neighbor_ids = get_neighbor_ids(aggregator.store)
+    assert "a" not in aggregator.store.get_known_doc_ids()
+    assert "a" not in neighbor_ids
+    assert all("a" not in ids for ids in neighbor_ids.values())
+    assert neighbor_ids["b"][0] == "e"
+
+
+def test_rows_match_a_full_rebuild_after_changes(aggregator, index_docs):
+    aggregator.refresh()
+    del index_docs["b"]
+    index_docs["f"] = make_doc("f", [1.0, 0.05, 0.0])
+    aggregator.refresh()
+    incremental = get_neighbor_ids(aggregator.store)
+
+    aggregator.rebuild()
+
+    assert incremental == get_neighbor_ids(aggregator.store)
+    assert np.isfinite([row[0] for row in aggregator.store.connection.execute(
+        "SELECT kth_score FROM related_news_aggregates")]).all()
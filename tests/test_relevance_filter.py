@@ -0,0 +1,25 @@
+import pytest
+
+from new_analyzer.relevance_filter import NON_MATERIAL_PATTERNS
+
+
+@pytest.mark.parametrize("title", [
+    "Amazon takes $4 billion stake in Anthropic",
+    "Microsoft boosts stake in OpenAI to 49%",
+    "Nvidia cuts its stake in Arm Holdings",
+    "Apple raises prices as tariffs bite shares of iPhone makers in China",
+    "Tesla shares fall on delivery miss (NASDAQ:TSLA)",
+])
+def test_material_titles_are_not_matched(title):
+    assert NON_MATERIAL_PATTERNS.search(title) is None
+
+
+@pytest.mark.parametrize("title", [
+    "Level Financial Advisors purchases 688 shares of Apple",
+    "Smith & Co buys 1,250 shares of Tesla",
+    "Vanguard Group Inc. Raises Stake in Apple Inc. (NASDAQ:AAPL)",
+    "Apple Inc. (NASDAQ:AAPL) Shares Sold by Kestra Advisory Services LLC",
+    "5 top dividend stocks to buy now",
+])
+def test_filings_and_listicles_are_matched(title):
+    assert NON_MATERIAL_PATTERNS.search(title) is not None
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from ui.response_cache import CachedResponse, ResponseCache, get_content_hash, normalize_url
+
+URL = "https://news.example.com/markets/acme-beats"
+
+
+def make_response(text: str, age_seconds: float = 0) -> CachedResponse:
+    return CachedResponse(text, None, None, created_at=time.time() - age_seconds)
+
+
+@pytest.mark.parametrize("url", [
+    "https://News.Example.com:443/markets/acme-beats/",
+    "https://news.example.com/markets/acme-beats#comments",
+    "https://news.example.com/markets/acme-beats?utm_source=x&utm_medium=social&fbclid=abc&gclid=def",
+])
+def test_tracking_variants_normalize_to_the_same_url(url):
+    assert normalize_url(url) == normalize_url(URL)
+
+
+def test_content_selecting_parameters_are_kept():
+    assert normalize_url(f"{URL}?ref=a") != normalize_url(f"{URL}?ref=b")
+    assert normalize_url(f"{URL}?src=rss") != normalize_url(URL)
+    assert normalize_url(f"{URL}?b=2&a=1&utm_campaign=x") == normalize_url(f"{URL}?a=1&b=2")
+
+
+def test_url_hit_returns_the_answer_of_the_last_content():
+    cache = ResponseCache(max_entries=4, ttl_seconds=60)
+    cache.put(URL, get_content_hash("page v1"), make_response("v1"))
+
+    assert cache.get(f"{URL}?utm_source=newsletter").final_response == "v1"
+    assert cache.get("https://news.example.com/other") is None
+
+
+def test_content_hit_points_another_url_to_the_answer():
+    cache = ResponseCache(max_entries=4, ttl_seconds=60)
+    content_hash = get_content_hash("syndicated page")
+    cache.put(URL, content_hash, make_response("answer"))
+    mirror = "https://mirror.example.com/acme"
+
+    assert cache.get(mirror) is None
+    assert cache.get_by_content(mirror, content_hash).final_response == "answer"
+    assert cache.get(mirror).final_response == "answer"
+    assert cache.get_by_content(URL, get_content_hash("changed page")) is None
+
+
+def test_entries_expire_after_the_ttl():
+    cache = ResponseCache(max_entries=4, ttl_seconds=60)
+    cache.put(URL, get_content_hash("old page"), make_response("old", age_seconds=61))
+
+    assert cache.get(URL) is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    for name in ("a", "b"):
+        cache.put(f"{URL}/{name}", get_content_hash(name), make_response(name))
+    cache.get(f"{URL}/a")
+    cache.put(f"{URL}/c", get_content_hash("c"), make_response("c"))
+
+    assert [cache.get(f"{URL}/{name}") is not None for name in ("a", "b", "c")] == [True, False, True]
+    assert len(cache) == 2
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+from common.single_flight import SingleFlight
+
+
+def test_concurrent_calls_are_coalesced():
+    flight, calls = SingleFlight("test"), []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["result"] * 5
+    assert len(calls) == 1
+
+
+def test_calls_on_different_event_loops_do_not_share_futures():
+    flight = SingleFlight("test")
+    both_started, results, errors = threading.Barrier(2), [], []
+
+    async def work():
+        both_started.wait(timeout=5)  # the other loop's call is in flight for the same key
+        await asyncio.sleep(0.01)
+        return "result"
+
+    def run_loop():
+        try:
+            results.append(asyncio.run(flight.do("key", work)))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run_loop) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert results == ["result", "result"]
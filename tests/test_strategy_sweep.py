@@ -0,0 +1,64 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_price.back_tester import BacktestRunner
+from stock_price.price_panel import PricePanel
+from stock_price.strategy_sweep import HOLDING_RULES, SIZING_FUNCTIONS, SignalSet, StrategySweep
+from stock_price.trading_date_calculator import TradingHourStatus
+
+TICKER = "ACME"
+
+
+@pytest.fixture
+def price_panel():
+    dates = pd.bdate_range("2025-02-03", periods=15)
+    opens = 100 + np.arange(len(dates)) * np.array([1, -1, 2, -2, 3] * 3)
+    values = np.stack([opens, opens + 2, opens - 2, opens + 0.5, np.full(len(dates), 1e6), opens + 0.5], axis=-1)
+    return PricePanel([TICKER], dates.values.astype("datetime64[D]"), values[None, :, :])
+
+
+def run_backtest_runner(price_panel: PricePanel, start_date: str, impact_weight: int, impact_days_min: int,
+                        impact_days_max: int, position_movement: str) -> float:
+    runner = BacktestRunner.from_price_panel(price_panel, TICKER, start_date, str(price_panel.dates[-1]))
+    status = TradingHourStatus(next_trading_open=datetime.datetime.fromisoformat(start_date).replace(hour=9, minute=30),
+                               is_in_trading_hour=False, is_same_day_before_trading_hour=True,
+                               is_same_day_after_trading_hour=False, is_in_weekend=False, is_in_holiday=False,
+                               hours_before_open=1)
+    result = runner.run(impact_weight=impact_weight, maximum_impact_days=impact_days_max,
+                        minimum_impact_days=impact_days_min, position_movement=position_movement,
+                        start_trading_date=datetime.date.fromisoformat(start_date), trading_hour_status=status)
+    return result.total_pnl
+
+
+@pytest.mark.parametrize("start_date, impact_weight, impact_days_min, impact_days_max, position_movement", [
+    ("2025-02-03", 5, 2, 4, "long"),
+    ("2025-02-05", 3, 1, 1, "short"),
+    ("2025-02-06", 8, 3, 6, "long"),  # the holding period spans a weekend
+    ("2025-02-12", 2, 1, 3, "short"),
+])
+def test_next_open_entry_matches_backtest_runner(price_panel, start_date, impact_weight, impact_days_min,
+                                                 impact_days_max, position_movement):
+    signals = SignalSet(tickers=np.array([TICKER]), start_dates=np.array([start_date], dtype="datetime64[D]"),
+                        impact_weight=[impact_weight], impact_days_min=[impact_days_min],
+                        impact_days_max=[impact_days_max], direction=[1.0 if position_movement == "long" else -1.0])
+    sweep = StrategySweep(price_panel, holding_rules={"midpoint": HOLDING_RULES["midpoint"]}, entry_price_fields=["next_open"],
+                          sizing_functions={"impact_weight_x10": SIZING_FUNCTIONS["impact_weight_x10"]})
+
+    result = sweep.run(signals).iloc[0]
+
+    assert result["trades"] == 1
+    assert result["total_pnl"] == pytest.approx(
+        run_backtest_runner(price_panel, start_date, impact_weight, impact_days_min, impact_days_max, position_movement))
+
+
+def test_entry_past_the_panel_is_left_out(price_panel):
+    last_date = price_panel.dates[-1]
+    signals = SignalSet(tickers=np.array([TICKER]), start_dates=np.array([last_date]), impact_weight=[5],
+                        impact_days_min=[1], impact_days_max=[1], direction=[1.0])
+
+    result = StrategySweep(price_panel, entry_price_fields=["next_open"]).run(signals)
+
+    assert (result["trades"] == 0).all()
@@ -1,41 +1,76 @@
-import json
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import List, Optional
 
-import semantic_kernel.connectors.ai.open_ai as sk_oai  # noqa: F401
 from semantic_kernel import Kernel
 from semantic_kernel.connectors.ai import PromptExecutionSettings, FunctionChoiceBehavior
 from semantic_kernel.contents import ChatHistory
 from semantic_kernel.planners import SequentialPlanner
 
+from common.instrumentation import instrumentation
 from config import Config
 from embedding_kits.model_news_impact_analysis import NewsAnalysisDoc
 from embedding_kits.stock_news_embedding_plugin import RelatedNewsPlugin
+from llm_backends.chat_completion_factory import create_chat_service_for_chat
+from llm_backends.text_preparation import prepare_for_llm, token_counter
 from new_analyzer.model_news_impact_analysis_result import NewsImpactAnalysisResult
 from new_analyzer.stock_news_analysis_plugin import StockNewsAnalysisPlugin
 from news_downloader.news_downloader_plugin import NewsDownloader3kPlugin
+from ui.response_cache import CachedResponse, ResponseCache, get_content_hash
 from ui.text_composer import LLMTextComposer
 
 
-class ChatbotSK:
+DEFAULT_SESSION = "default"
+_URL = re.compile(r"https?://[^\s<>\"'`]+")
+
+
+def extract_url(message: str) -> Optional[str]:
+    """First url of the message, without the punctuation that usually follows a pasted link."""
+    match = _URL.search(message)
+    return match.group(0).rstrip(".,;:!?)]}") if match else None
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+def cancel_tasks(*tasks: Optional[asyncio.Task]) -> None:
+    """Cancel tasks that are no longer needed, their errors are dropped instead of logged as never retrieved."""
+    for task in tasks:
+        if task is not None:
+            task.cancel()
+            task.add_done_callback(_retrieve_exception)
+
+
+class ChatSession:
+    """Conversation of one UI session. The pipeline prompts use their own histories, only the exchange is kept here."""
+
     def __init__(self):
-        self.gradio_chat_history = []
+        self.chat_history = ChatHistory()
+        self.last_used = time.monotonic()
 
+
+class ChatbotSK:
+    """
+    One instance serves every UI session: the kernel, its plugins and the chat service are shared, the conversation
+    is kept per session. At most max_concurrent_requests pipelines run at once, the others wait in line.
+    """
+
+    def __init__(self, max_concurrent_requests: int = Config.CHAT_MAX_CONCURRENT_REQUESTS, max_sessions: int = Config.CHAT_MAX_SESSIONS,
+                 session_ttl: float = Config.CHAT_SESSION_TTL_SECONDS):
         # SK initialization
         self.kernel = Kernel()
-        # self.chat_completion_service = OllamaChatCompletion(
-        #     service_id="ollama",
-        #     ai_model_id="llama3.2",
-        # )
-        self.chat_completion_service_open_ai = sk_oai.AzureChatCompletion(
-            service_id="default",
-
-            deployment_name=Config.aoi_deployment_name,
-            api_key=Config.aoi_api_key,
-            endpoint=Config.aoi_endpoint,
-            api_version=Config.aoi_api_version,
-        )
+        self.chat_completion_service_open_ai = create_chat_service_for_chat(service_id="default")
 
         # Message call settings
-        self.sk_chat_history = ChatHistory()
+        self._sessions: OrderedDict[str, ChatSession] = OrderedDict()  # least recently used first
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self._request_slots = asyncio.Semaphore(max_concurrent_requests)
+        self.response_cache = ResponseCache()  # shared by the sessions, popular links are pasted by many users
 
         # tool call settings
 
@@ -43,6 +78,22 @@ class ChatbotSK:
         self.kernel.add_plugin(StockNewsAnalysisPlugin(), "StockNewsAnalysisPlugin")
         self.kernel.add_plugin(RelatedNewsPlugin(), "RelatedNewsPlugin")
 
+    def get_session(self, session_id: str) -> ChatSession:
+        """Session of the id, created when new. Idle sessions expire, the least recently used go beyond max_sessions."""
+        now = time.monotonic()
+        session = self._sessions.pop(session_id, None)
+        if session is None or now - session.last_used > self.session_ttl:
+            session = ChatSession()
+        session.last_used = now
+        self._sessions[session_id] = session
+        while self._sessions and (len(self._sessions) > self.max_sessions
+                                  or now - next(iter(self._sessions.values())).last_used > self.session_ttl):
+            self._sessions.popitem(last=False)
+        return session
+
+    def get_session_count(self) -> int:
+        return len(self._sessions)
+
     # make a get setting funciton to get different setting with different plugins
     @staticmethod
     def _get_pe_settings(included_plugins: list[str], included_function: list[str], auto_invoke) -> PromptExecutionSettings:
@@ -75,79 +126,85 @@ class ChatbotSK:
         result = await sequential_plan.invoke(self.kernel)
         return result
 
-    async def get_response_from_chat_bot(self, input_message, history):
-        # Gradio history
-        self.gradio_chat_history = history
+    async def get_response_from_chat_bot(self, input_message, history, refresh: bool = False, session_id: str = DEFAULT_SESSION):
+        """refresh analyzes a pasted url again instead of answering from the response cache."""
+        session = self.get_session(session_id)
+        if not refresh and "http" in input_message:
+            news_url = extract_url(input_message)
+            cached = self.response_cache.get(news_url) if news_url else None
+            if cached is not None:
+                # answered without waiting for a pipeline slot
+                return self._answer_from_cache(input_message, session, cached)
+        if self._request_slots.locked():
+            instrumentation.increment("chat_requests_queued_total")
+        async with self._request_slots:
+            with instrumentation.span("chat.request"):
+                return await self._get_response_from_chat_bot(input_message, session, refresh)
 
+    @staticmethod
+    def _remember_exchange(session: ChatSession, input_message: str, final_response: str) -> None:
+        # the follow-up questions of the session are about this article
+        session.chat_history = ChatHistory()
+        session.chat_history.add_user_message(input_message)
+        session.chat_history.add_assistant_message(final_response)
+
+    def _answer_from_cache(self, input_message: str, session: ChatSession, cached: CachedResponse) -> str:
+        self._remember_exchange(session, input_message, cached.final_response)
+        minutes = int((time.time() - cached.created_at) // 60)
+        return (f"{cached.final_response}"
+                f"_Cached analysis from {minutes} min ago, tick \"Refresh analysis\" to analyze the news again._")
+
+    async def _get_response_from_chat_bot(self, input_message, session: ChatSession, refresh: bool = False):
         if "http://" in input_message or "https://" in input_message:
-            # SK chat history & response
-            self.sk_chat_history.add_user_message(input_message)
-
             ######################## work around due to semantic kernel not support sequence call in ollama  ########################
             ######## (1) download news
-            response_url = await self.chat_completion_service_open_ai.get_chat_message_content(
-                Temperature=0,
-                chat_history=self.sk_chat_history,
-                settings=self._get_pe_settings(included_plugins=["NewsDownloader3kPlugin"], included_function=["fetch_news_from_url"], auto_invoke=False),
-                kernel=self.kernel
-            )
-            # incoming_news_content = await NewsDownloader3kPlugin.fetch_news_from_url_wrapper(response_url.items[0].arguments["url"])
-            incoming_news_content = await NewsDownloader3kPlugin.fetch_news_from_url_wrapper(json.loads(response_url.items[0].arguments)["url"])
+            news_url = extract_url(input_message) or await self._extract_url_with_llm(input_message)
+            with instrumentation.span("chat.scrape"):
+                incoming_news_content = await NewsDownloader3kPlugin.fetch_news_from_url_wrapper(news_url)
+            content_hash = get_content_hash(incoming_news_content)
+            cached = None if refresh else self.response_cache.get_by_content(news_url, content_hash)
+            if cached is not None:
+                return self._answer_from_cache(input_message, session, cached)
+            # steps 1.5 and 2 prompt with the page, keep it within the chat model's context
+            incoming_news_content = prepare_for_llm(incoming_news_content, Config.CHAT_LLM_MODEL)
 
             print("News:", incoming_news_content[:100], "...\n\n--------\n\n")
-            self.sk_chat_history.clear()
-
-            ######## (1.5) check download news
-            self.sk_chat_history.add_user_message(
-                f"You are a network expert, based on the NEWS CONTENT, Check if this news is normal, everything is good\n\n"
-                f"--------\n\n"
-                f"NEWS CONTENT: {incoming_news_content}")
-            response_is_news_block = await self.chat_completion_service_open_ai.get_chat_message_content(
-                Temperature=0,
-                chat_history=self.sk_chat_history,
-                settings=self._get_pe_settings(included_plugins=["NewsDownloader3kPlugin"], included_function=["is_news_content_normal"], auto_invoke=False),
-                kernel=self.kernel
-            )
-
-            # is_news_blocked = response_is_news_block.items[0].arguments["is_news_blocked"]
 
-            if response_is_news_block.items[0].arguments.find('true') > 0:
-                return f"The news is blocked by network or provider. ERROR_MESSAGE: {incoming_news_content}"
-            self.sk_chat_history.clear()
-
-            ######## (2) analysis incoming news (pre-analysis)
-            self.sk_chat_history.add_user_message(
-                "Analysis of the news article is required to determine the impact on the stock price."
-                "\n\nProvide a JSON response with keys: "
-                "impact_weight (1~10), "
-                "position_movement (long or short), "
-                "impact_days_min (1~5), and impact_days_max(1~10)."
-                "--------"
-                "NEWS:\n\n" + incoming_news_content + "...")
-
-            pre_analysis_parameter_response = await self.chat_completion_service_open_ai.get_chat_message_content(
-                chat_history=self.sk_chat_history,
-                settings=self._get_pe_settings(included_plugins=["StockNewsAnalysisPlugin"], included_function=["analyze_stock_news"], auto_invoke=False),
-                kernel=self.kernel
-            )
-            pre_analysis_result_str = pre_analysis_parameter_response.items[0].arguments
-            pre_analysis_result = NewsImpactAnalysisResult.from_dict(json.loads(pre_analysis_result_str))
-
-            if not pre_analysis_result:
-                return "Can't analysis the news."
-
-            print("parameters:", pre_analysis_parameter_response.items[0].arguments, "--------\n\n")
-            self.sk_chat_history.clear()
-
-            ######## (3) retrieve related news analysis
-            index_search_result = await RelatedNewsPlugin.get_related_stock_news_wrapper(pre_analysis_result.news_summery)
-
-            related_news_pnl_ratio = LLMTextComposer.calculate_related_news_pnl_ratio(index_search_result)
+            precomputed_related_news = RelatedNewsPlugin.get_precomputed_related_news(news_url)
+            raw_search = content_check = pre_analysis = None
+            if Config.CHAT_SPECULATIVE_PIPELINE:
+                # (1.5) and (2) only need the page, and the related news are searched with the page text while
+                # the summary is being written
+                if not precomputed_related_news:
+                    raw_search = asyncio.create_task(RelatedNewsPlugin.get_related_stock_news_wrapper(
+                        token_counter.truncate(incoming_news_content, Config.EMBEDDING_CHUNK_TOKENS)))
+                content_check = asyncio.create_task(self._check_content(incoming_news_content))
+                pre_analysis = asyncio.create_task(self._pre_analyze(incoming_news_content))
+            try:
+                ######## (1.5) check download news
+                is_news_blocked = await (content_check or self._check_content(incoming_news_content))
+                if is_news_blocked:
+                    return f"The news is blocked by network or provider. ERROR_MESSAGE: {incoming_news_content}"
+
+                ######## (2) analysis incoming news (pre-analysis)
+                pre_analysis_result = await (pre_analysis or self._pre_analyze(incoming_news_content))
+                if not pre_analysis_result:
+                    return "Can't analysis the news."
+
+                ######## (3) retrieve related news analysis
+                with instrumentation.span("chat.related_news"):
+                    if precomputed_related_news:
+                        index_search_result, related_news_pnl_ratio = precomputed_related_news
+                    else:
+                        index_search_result = await self._search_related_news(pre_analysis_result.news_summery, raw_search)
+                        related_news_pnl_ratio = LLMTextComposer.calculate_related_news_pnl_ratio(index_search_result)
+            finally:
+                cancel_tasks(raw_search, content_check, pre_analysis)  # the unused search, and everything when the news is blocked
             related_news_suggestion = LLMTextComposer.compose_related_news_pnl_ratio_for_llm(index_search_result)
-            self.sk_chat_history.clear()
 
             ######## (4) analysis incoming news (final-analysis)
-            self.sk_chat_history.add_user_message(
+            chat_history = ChatHistory()
+            chat_history.add_user_message(
                 f"Analysis of the news article is required to determine the impact on the stock price. But not need to provide the summary."
                 f"\n\nProvide a text based analysis with: "
                 f"possible profit and loss ratio, "
@@ -160,13 +217,15 @@ class ChatbotSK:
                 f"{related_news_suggestion}"
             )
 
-            final_analysis = await self.chat_completion_service_open_ai.get_chat_message_content(
-                chat_history=self.sk_chat_history,
-                settings=self._get_pe_settings(included_plugins=["StockNewsAnalysisPlugin"], included_function=["analyze_stock_news"], auto_invoke=True),
-                kernel=self.kernel
-            )
+            with instrumentation.span("chat.final_analysis"):
+                final_analysis = await self.chat_completion_service_open_ai.get_chat_message_content(
+                    chat_history=chat_history,
+                    settings=self._get_pe_settings(included_plugins=["StockNewsAnalysisPlugin"], included_function=["analyze_stock_news"], auto_invoke=True),
+                    kernel=self.kernel
+                )
+                instrumentation.record_llm_usage("chat.final_analysis", final_analysis)
 
-            final_analysis_parameter = self.sk_chat_history.messages[-1].items[0].result
+            final_analysis_parameter = chat_history.messages[-1].items[0].result
             post_analysis_result = NewsImpactAnalysisResult.from_dict(final_analysis_parameter)
 
             final_response = (f"News Summary: {pre_analysis_result.news_summery}\n\n"
@@ -175,15 +234,101 @@ class ChatbotSK:
                               f"With related News Analysis: {final_analysis.content}\n\n"
                               f"Analysis Parameters: {LLMTextComposer.compose_analysis_for_response(post_analysis_result)}\n\n"
                               )
-            self.sk_chat_history.clear()
-            self.sk_chat_history.add_user_message(input_message)
-            self.sk_chat_history.add_assistant_message(final_response)
+            # the article, or the near duplicate it was syndicated from, was already analyzed and backtested by the feeder
+            indexed_analysis = RelatedNewsPlugin.get_precomputed_analysis(news_url)
+            if indexed_analysis is not None:
+                final_response += f"Indexed Backtest: {LLMTextComposer.compose_indexed_backtest_for_response(indexed_analysis)}\n\n"
+            if post_analysis_result:
+                self.response_cache.put(news_url, content_hash, CachedResponse(final_response, pre_analysis_result, post_analysis_result))
+            self._remember_exchange(session, input_message, final_response)
 
             return final_response
         else:
+            session.chat_history.add_user_message(input_message)
             other_chat = await self.chat_completion_service_open_ai.get_chat_message_content(
-                chat_history=self.sk_chat_history,
+                chat_history=session.chat_history,
                 settings=self._get_pe_settings(included_plugins=["StockNewsAnalysisPlugin"], included_function=["analyze_stock_news"], auto_invoke=True),
                 kernel=self.kernel
             )
+            session.chat_history.add_assistant_message(other_chat.content or "")
             return other_chat.content
+
+    async def _extract_url_with_llm(self, input_message: str) -> str:
+        """Fallback when the regex finds no url, e.g. a url split by spaces."""
+        chat_history = ChatHistory()
+        chat_history.add_user_message(input_message)
+        with instrumentation.span("chat.extract_url"):
+            response_url = await self.chat_completion_service_open_ai.get_chat_message_content(
+                Temperature=0,
+                chat_history=chat_history,
+                settings=self._get_pe_settings(included_plugins=["NewsDownloader3kPlugin"], included_function=["fetch_news_from_url"], auto_invoke=False),
+                kernel=self.kernel
+            )
+            instrumentation.record_llm_usage("chat.extract_url", response_url)
+        return response_url.items[0].parse_arguments()["url"]
+
+    async def _check_content(self, incoming_news_content: str) -> bool:
+        """(1.5) True when the page is blocked by the network or the provider."""
+        chat_history = ChatHistory()
+        chat_history.add_user_message(
+            f"You are a network expert, based on the NEWS CONTENT, Check if this news is normal, everything is good\n\n"
+            f"--------\n\n"
+            f"NEWS CONTENT: {incoming_news_content}")
+        with instrumentation.span("chat.content_check"):
+            response_is_news_block = await self.chat_completion_service_open_ai.get_chat_message_content(
+                Temperature=0,
+                chat_history=chat_history,
+                settings=self._get_pe_settings(included_plugins=["NewsDownloader3kPlugin"], included_function=["is_news_content_normal"], auto_invoke=False),
+                kernel=self.kernel
+            )
+            instrumentation.record_llm_usage("chat.content_check", response_is_news_block)
+        return str(response_is_news_block.items[0].parse_arguments().get("is_news_blocked")).lower() == 'true'
+
+    async def _pre_analyze(self, incoming_news_content: str) -> Optional[NewsImpactAnalysisResult]:
+        """(2) Impact parameters and summary of the incoming news, None when the answer can't be parsed."""
+        chat_history = ChatHistory()
+        chat_history.add_user_message(
+            "Analysis of the news article is required to determine the impact on the stock price."
+            "\n\nProvide a JSON response with keys: "
+            "impact_weight (1~10), "
+            "position_movement (long or short), "
+            "impact_days_min (1~5), and impact_days_max(1~10)."
+            "--------"
+            "NEWS:\n\n" + incoming_news_content + "...")
+
+        with instrumentation.span("chat.pre_analysis"):
+            pre_analysis_parameter_response = await self.chat_completion_service_open_ai.get_chat_message_content(
+                chat_history=chat_history,
+                settings=self._get_pe_settings(included_plugins=["StockNewsAnalysisPlugin"], included_function=["analyze_stock_news"], auto_invoke=False),
+                kernel=self.kernel
+            )
+            instrumentation.record_llm_usage("chat.pre_analysis", pre_analysis_parameter_response)
+        print("parameters:", pre_analysis_parameter_response.items[0].arguments, "--------\n\n")
+        return NewsImpactAnalysisResult.from_dict(pre_analysis_parameter_response.items[0].parse_arguments())
+
+    @staticmethod
+    async def _search_related_news(news_summery: str, raw_search: Optional[asyncio.Task],
+                                   summary_timeout: float = Config.CHAT_SUMMARY_SEARCH_TIMEOUT_SECONDS) -> List[NewsAnalysisDoc]:
+        """
+        Search with the summary. The search already running with the page text, when there is one, is only a fallback:
+        its results are used when the summary search takes longer than summary_timeout or fails, then the first
+        successful search wins.
+        """
+        summary_search = asyncio.create_task(RelatedNewsPlugin.get_related_stock_news_wrapper(news_summery))
+        if raw_search is None:
+            return await summary_search
+        pending = {raw_search, summary_search}
+        try:
+            await asyncio.wait({summary_search}, timeout=summary_timeout)
+            while pending:
+                done = {task for task in pending if task.done()}
+                if not done:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending -= done
+                for task in sorted(done, key=lambda task: task is raw_search):  # the summary search first
+                    if not task.cancelled() and task.exception() is None:
+                        instrumentation.increment("chat_related_news_search_total", query="page" if task is raw_search else "summary")
+                        return task.result()
+            return await summary_search  # both failed, raise the summary search error
+        finally:
+            cancel_tasks(*pending)
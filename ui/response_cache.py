@@ -0,0 +1,86 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from common.instrumentation import instrumentation
+from config import Config
+from new_analyzer.model_news_impact_analysis_result import NewsImpactAnalysisResult
+
+TRACKING_PREFIXES = ("utm_",)
+# click and campaign ids only, parameters like ref or src select the content on some sites
+TRACKING_PARAMETERS = frozenset({"fbclid", "gclid", "mc_cid", "mc_eid", "cmpid", "ncid", "guccounter"})
+
+
+def normalize_url(url: str) -> str:
+    """Cache key of a pasted url: lower-cased host, no fragment, default port, trailing slash or tracking parameters."""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if not key.lower().startswith(TRACKING_PREFIXES) and key.lower() not in TRACKING_PARAMETERS)
+    return urlunsplit((parts.scheme.lower(), host, parts.path.rstrip("/") or "/", urlencode(query), ""))
+
+
+def get_content_hash(content: str) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    final_response: str
+    pre_analysis_result: NewsImpactAnalysisResult
+    post_analysis_result: NewsImpactAnalysisResult
+    created_at: float = field(default_factory=time.time)
+
+
+class ResponseCache:
+    """
+    Composed answers of analyzed articles, keyed by the hash of the fetched content, with the normalized urls pointing
+    to the content they last had. A url hit skips the scrape, a content hit (page unchanged, or the same article
+    under another url) skips the LLM calls. Entries expire after ttl_seconds, the least recently used beyond max_entries
+    are evicted.
+    """
+
+    def __init__(self, max_entries: int = Config.CHAT_RESPONSE_CACHE_SIZE, ttl_seconds: float = Config.CHAT_RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()  # content hash -> answer, least recently used first
+        self._content_by_url: dict[str, str] = {}
+
+    def _get_fresh(self, content_hash: Optional[str]) -> Optional[CachedResponse]:
+        entry = self._entries.get(content_hash) if content_hash else None
+        if entry is not None and time.time() - entry.created_at > self.ttl_seconds:
+            del self._entries[content_hash]
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(content_hash)
+        return entry
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Answer of the content the url had when it was last analyzed."""
+        entry = self._get_fresh(self._content_by_url.get(normalize_url(url)))
+        instrumentation.record_cache("chat_response.url", entry is not None)
+        return entry
+
+    def get_by_content(self, url: str, content_hash: str) -> Optional[CachedResponse]:
+        entry = self._get_fresh(content_hash)
+        instrumentation.record_cache("chat_response.content", entry is not None)
+        if entry is not None:
+            self._content_by_url[normalize_url(url)] = content_hash
+        return entry
+
+    def put(self, url: str, content_hash: str, response: CachedResponse) -> None:
+        self._entries[content_hash] = response
+        self._entries.move_to_end(content_hash)
+        self._content_by_url[normalize_url(url)] = content_hash
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if len(self._content_by_url) > 4 * self.max_entries:
+            self._content_by_url = {url: content for url, content in self._content_by_url.items() if content in self._entries}
+
+    def __len__(self) -> int:
+        return len(self._entries)
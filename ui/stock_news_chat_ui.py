@@ -1,19 +1,29 @@
 import gradio as gr
 
-from ui.chatbot_sk import ChatbotSK
+from common.instrumentation import instrumentation
+from common.logger import configure_logging
+from embedding_kits.lexical_index import start_lexical_index_sync
+from ui.chatbot_sk import ChatbotSK, DEFAULT_SESSION
 
 
 class ChatBotUI:
     def __init__(self, chatbot: ChatbotSK):
         self.chatbot = chatbot
 
+    async def respond(self, message, history, refresh: bool, request: gr.Request):
+        """Chat handler, the conversation is kept per browser session."""
+        return await self.chatbot.get_response_from_chat_bot(message, history, refresh=refresh,
+                                                             session_id=request.session_hash or DEFAULT_SESSION)
 
     def launch(self):
         # with gr.Blocks() as demo:
         gr.Markdown("### Chat with Stock News Chatbot")
         chat_interface = gr.ChatInterface(
-            self.chatbot.get_response_from_chat_bot,
+            self.respond,
             type="messages",
+            concurrency_limit=None,  # ChatbotSK limits and queues the pipelines itself
+            additional_inputs=[gr.Checkbox(label="Refresh analysis", value=False,
+                                           info="Analyze an already analyzed url again instead of showing the cached answer")],
             flagging_mode="manual",
             flagging_options=["Like", "Spam", "Inappropriate", "Other"],
             save_history=True,
@@ -26,6 +36,9 @@ class ChatBotUI:
 
 
 if __name__ == "__main__":
+    configure_logging()
+    instrumentation.start_metrics_server()
+    start_lexical_index_sync()
     bot = ChatbotSK()
     ui = ChatBotUI(bot)
     ui.launch()
@@ -14,6 +14,17 @@ class LLMTextComposer:
         )
         return composed_response
 
+    @staticmethod
+    def compose_indexed_backtest_for_response(indexed_doc: NewsAnalysisDoc) -> str:
+        composed_response = (
+            f"Indexed as: {indexed_doc.title}\n"
+            f"Impact Weight: {indexed_doc.impact_weight}/10\n"
+            f"Position Movement: {indexed_doc.position_movement}\n"
+            f"Impact Duration: {indexed_doc.impact_days_min}-{indexed_doc.impact_days_max} days\n"
+            f"Backtest PNL Ratio: {indexed_doc.pnl_ratio}\n"
+        )
+        return composed_response
+
     @staticmethod
     def compose_related_news_pnl_ratio_for_llm(search_result: list[NewsAnalysisDoc]) -> str:
         composed_string = ("Please also consider the following related news, But don't analysis them"